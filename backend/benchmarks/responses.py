@@ -0,0 +1,68 @@
+"""
+Benchmark of the JSON response class and compression on a 100-post feed page.
+
+Reports the render time of the standard library based `JSONResponse` against
+`ORJSONResponse`, and the payload size with no compression, gzip and brotli.
+
+Run from the backend directory with:
+    uv run python -m benchmarks.responses
+"""
+
+import gzip
+import timeit
+
+import brotli
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+from benchmarks.serialization import make_rows
+from pixelgram.schemas.post import PostRead
+from pixelgram.settings import settings
+
+PAGE_SIZE = 100
+ROUNDS = 500
+
+
+def make_page() -> dict:
+    data = [
+        PostRead.serialize_row(
+            id=post.id,
+            description=post.description,
+            image_url=post.image_url,
+            user_id=post.user_id,
+            author_username=post.author.username,
+            author_email=post.author.email,
+            created_at=post.created_at,
+            likes_count=3,
+            liked_by_user=True,
+            comments_count=1,
+            commented_by_user=False,
+            saved_by_user=False,
+        )
+        for post in make_rows(PAGE_SIZE)
+    ]
+    return {"data": data, "nextPage": 2, "total": 1000}
+
+
+def main() -> None:
+    page = make_page()
+    json_response = JSONResponse(page)
+    orjson_response = ORJSONResponse(page)
+
+    for name, response in (("json", json_response), ("orjson", orjson_response)):
+        seconds = min(
+            timeit.repeat(lambda: response.render(page), number=ROUNDS, repeat=5)
+        )
+        print(f"{name:>8}: {seconds / ROUNDS * 1e6:8.1f} µs/page")
+
+    body = orjson_response.body
+    sizes = {
+        "identity": len(body),
+        "gzip": len(gzip.compress(body, settings.compression_gzip_level)),
+        "br": len(brotli.compress(body, quality=settings.compression_brotli_quality)),
+    }
+    for name, size in sizes.items():
+        print(f"{name:>8}: {size:8d} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Microbenchmark of the feed serialization path.
+
+Compares building a page of posts through `PostRead` models (validated per row,
+dumped, validated again by `PaginatedPostsResponse` and once more by FastAPI)
+with the trusted-row path that builds the camelCase payload once.
+
+Run from the backend directory with:
+    uv run python -m benchmarks.serialization
+"""
+
+import json
+import timeit
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from uuid import uuid4
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import HttpUrl
+
+from pixelgram.schemas.post import PaginatedPostsResponse, PostRead
+
+PAGE_SIZE = 100
+ROUNDS = 200
+
+
+def make_rows(count: int) -> list[SimpleNamespace]:
+    author = SimpleNamespace(username="catlover123", email="catlover123@example.com")
+    return [
+        SimpleNamespace(
+            id=uuid4(),
+            description=f"Pixel art number {i}",
+            image_url=f"https://example.supabase.co/storage/v1/object/public/posts/{uuid4()}.png",
+            user_id=uuid4(),
+            author=author,
+            created_at=datetime.now(timezone.utc),
+        )
+        for i in range(count)
+    ]
+
+
+def validated_page(rows: list[SimpleNamespace]) -> str:
+    data = []
+    for post in rows:
+        pr = PostRead(
+            id=post.id,
+            description=post.description,
+            image_url=HttpUrl(post.image_url),
+            user_id=post.user_id,
+            author_username=post.author.username,
+            author_email=post.author.email,
+            created_at=post.created_at,
+            likes_count=3,
+            liked_by_user=True,
+            comments_count=1,
+            commented_by_user=False,
+            saved_by_user=False,
+        )
+        data.append(pr.model_dump(by_alias=True))
+    response = PaginatedPostsResponse(data=data, nextPage=2, total=1000)  # type: ignore
+    # What FastAPI does with a returned model: validate it again, then encode it
+    validated = PaginatedPostsResponse.model_validate(response.model_dump())
+    return json.dumps(jsonable_encoder(validated, by_alias=True))
+
+
+def trusted_page(rows: list[SimpleNamespace]) -> str:
+    data = [
+        PostRead.serialize_row(
+            id=post.id,
+            description=post.description,
+            image_url=post.image_url,
+            user_id=post.user_id,
+            author_username=post.author.username,
+            author_email=post.author.email,
+            created_at=post.created_at,
+            likes_count=3,
+            liked_by_user=True,
+            comments_count=1,
+            commented_by_user=False,
+            saved_by_user=False,
+        )
+        for post in rows
+    ]
+    return json.dumps({"data": data, "nextPage": 2, "total": 1000})
+
+
+def main() -> None:
+    rows = make_rows(PAGE_SIZE)
+    assert json.loads(validated_page(rows)) == json.loads(trusted_page(rows))
+
+    for name, fn in (("validated", validated_page), ("trusted", trusted_page)):
+        seconds = min(timeit.repeat(lambda: fn(rows), number=ROUNDS, repeat=5))
+        per_row_us = seconds / ROUNDS / PAGE_SIZE * 1e6
+        print(f"{name:>10}: {per_row_us:7.2f} µs/row (page_size={PAGE_SIZE})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Benchmark of the queries issued to load users.
+
+Reports the statements, rows fetched and time of the user loads of a request:
+the lookup of the authenticated user and the authors of a 100-post feed page.
+Each load is run with the OAuth accounts joined to every user, as they used to
+be, and with the lean loading, which skips them and only selects the author
+columns the feed shows.
+
+Run from the backend directory with:
+    uv run python -m benchmarks.user_loading
+"""
+
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from uuid import UUID, uuid4
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.pool import StaticPool
+
+from pixelgram.models.base import Base
+from pixelgram.models.oauth_account import OAuthAccount
+from pixelgram.models.post import Post
+from pixelgram.models.user import User
+
+USERS = 100
+ACCOUNTS_PER_USER = 2
+PAGE_SIZE = 100
+ROUNDS = 200
+
+
+async def seed(session: AsyncSession) -> User:
+    users = [
+        User(
+            id=uuid4(),
+            email=f"user{i}@example.com",
+            username=f"user{i}",
+            hashed_password="!",
+        )
+        for i in range(USERS)
+    ]
+    session.add_all(users)
+    for user in users:
+        for provider in range(ACCOUNTS_PER_USER):
+            session.add(
+                OAuthAccount(
+                    user_id=user.id,
+                    oauth_name=f"provider{provider}",
+                    access_token="token",
+                    account_id=f"{user.id}-{provider}",
+                    account_email=user.email,
+                )
+            )
+    for i in range(PAGE_SIZE):
+        session.add(
+            Post(
+                id=uuid4(),
+                description=f"Pixel art number {i}",
+                image_url=f"https://example.supabase.co/storage/v1/object/public/posts/{i}.png",
+                user_id=users[i % USERS].id,
+            )
+        )
+    await session.commit()
+    return users[0]
+
+
+def auth_lookup(user_id: UUID, joined: bool):
+    async def load(session: AsyncSession) -> None:
+        statement = select(User).where(User.id == user_id)
+        if joined:
+            statement = statement.options(joinedload(User.oauth_accounts))
+        (await session.execute(statement)).unique().scalar_one()
+
+    return load
+
+
+def feed_authors(joined: bool):
+    async def load(session: AsyncSession) -> None:
+        if joined:
+            author = selectinload(Post.author).joinedload(User.oauth_accounts)
+        else:
+            author = selectinload(Post.author).load_only(User.username, User.email)
+        statement = select(Post).limit(PAGE_SIZE).options(author)
+        posts = (await session.execute(statement)).scalars().all()
+        assert all(post.author.username for post in posts)
+
+    return load
+
+
+async def measure(
+    session_maker: async_sessionmaker, load: Callable[[AsyncSession], Awaitable[None]]
+) -> tuple[int, int, float]:
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany) -> None:
+        executed.append((statement, parameters))
+
+    async with session_maker() as session:
+        connection = await session.connection()
+        event.listen(connection.sync_connection, "before_cursor_execute", record)
+        await load(session)
+        event.remove(connection.sync_connection, "before_cursor_execute", record)
+
+        # Run the statements again to count the rows they send back
+        rows = 0
+        for statement, parameters in executed:
+            result = await connection.exec_driver_sql(statement, parameters)
+            rows += len(result.all())
+
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        async with session_maker() as session:
+            await load(session)
+    seconds = (time.perf_counter() - started) / ROUNDS
+    return len(executed), rows, seconds
+
+
+async def main() -> None:
+    engine = create_async_engine(
+        "sqlite+aiosqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    async with session_maker() as session:
+        user = await seed(session)
+
+    for name, make_load in (
+        ("auth", lambda joined: auth_lookup(user.id, joined)),
+        ("feed", feed_authors),
+    ):
+        for label, joined in (("joined", True), ("lean", False)):
+            statements, rows, seconds = await measure(session_maker, make_load(joined))
+            print(
+                f"{name:>5} {label:>7}: {statements} queries, {rows:4} rows, "
+                f"{seconds * 1e6:8.1f} µs/request"
+            )
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,27 +1,76 @@
+import math
+import secrets
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from slowapi import _rate_limit_exceeded_handler
-from slowapi.errors import RateLimitExceeded
 
 from pixelgram.auth import (
+    auth_backend,
     fastapi_users,
 )
-from pixelgram.db import create_db_and_tables
-from pixelgram.limiter import limiter
+from pixelgram.bulkhead import (
+    DependencyUnavailableError,
+    dependency_unavailable_handler,
+)
+from pixelgram.compression import CompressionMiddleware
+from pixelgram.db import (
+    create_db_and_tables,
+    engine,
+    read_replica_router,
+    reader_engines,
+    sqlite_profile,
+    write_queue,
+    writer_engine,
+)
+from pixelgram.instrumentation import (
+    MetricsMiddleware,
+    instrument_engine,
+    metrics_exporter,
+)
+from pixelgram.invalidation import invalidation_bus
+from pixelgram.jobs.outbox import outbox_worker
+from pixelgram.jobs.purge import tombstone_purger
+from pixelgram.jobs.tokens import token_reaper
+from pixelgram.metrics import PROMETHEUS_CONTENT_TYPE, render_prometheus
 from pixelgram.routers.auth import auth_router
 from pixelgram.routers.captions import captions_router
 from pixelgram.routers.posts.posts import posts_router
 from pixelgram.routers.users import users_router
+from pixelgram.revocation import revocation_list
 from pixelgram.schemas.user import UserRead, UserUpdate
+from pixelgram.services.posts.live_counters import live_counter_hub
+from pixelgram.services.username_index import username_index
 from pixelgram.settings import settings
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await create_db_and_tables()
+    if sqlite_profile:
+        write_queue.start()
+    if settings.auth_strategy == "signed":
+        await revocation_list.load()
+    if settings.username_index_enabled:
+        await username_index.load()
+    invalidation_bus.start()
+    if settings.metrics_enabled:
+        metrics_exporter.start()
+    live_counter_hub.start()
+    if settings.outbox_worker_enabled:
+        outbox_worker.start()
+    if settings.purge_enabled:
+        tombstone_purger.start()
+    if settings.token_reaper_enabled:
+        token_reaper.start()
     yield
+    await token_reaper.stop()
+    await tombstone_purger.stop()
+    await outbox_worker.stop()
+    await live_counter_hub.stop()
+    await metrics_exporter.stop()
+    await invalidation_bus.stop()
+    await write_queue.stop()
 
 
 # App
@@ -40,10 +89,52 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.compression_minimum_size,
+    gzip_level=settings.compression_gzip_level,
+    brotli_quality=settings.compression_brotli_quality,
+)
+if settings.metrics_enabled:
+    # Added last so it is the outermost, measuring the compressed responses
+    app.add_middleware(MetricsMiddleware)
+# Also needed by the query budgets of the services
+for instrumented_engine in {engine, writer_engine, *reader_engines}:
+    instrument_engine(instrumented_engine)
+
+
+@app.middleware("http")
+async def pin_writers_to_primary(request: Request, call_next):
+    """Keep clients that just wrote on the primary database for their next reads."""
+    response = await call_next(request)
+    if request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+        # Signed rather than kept in memory, so every worker honors the pin
+        pin_token = read_replica_router.pin_token()
+        if pin_token is not None:
+            response.set_cookie(
+                settings.db_read_your_writes_cookie_name,
+                pin_token,
+                max_age=math.ceil(read_replica_router.read_your_writes_seconds),
+                secure=True,
+                httponly=True,
+                samesite="none",
+            )
+    return response
 
-# Rate limiter
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)  # type: ignore
+
+@app.middleware("http")
+async def refresh_auth_cookie(request: Request, call_next):
+    """Send back the access token refreshed while authenticating the request, if any."""
+    response = await call_next(request)
+    token = getattr(request.state, "refreshed_auth_token", None)
+    if token is not None:
+        login_response = await auth_backend.transport.get_login_response(token)
+        response.headers.append("set-cookie", login_response.headers["set-cookie"])
+    return response
+
+
+# External dependencies
+app.add_exception_handler(DependencyUnavailableError, dependency_unavailable_handler)
 
 # Routers
 app.include_router(auth_router)
@@ -63,3 +154,25 @@ async def health_check():
     Health check endpoint.
     """
     return {"status": "ok"}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request):
+    """
+    Metrics of the application, in the Prometheus text format.
+    Only served to scrapers presenting `settings.metrics_token` as a bearer token,
+    and not at all while no token is set.
+    """
+    if not settings.metrics_enabled or not settings.metrics_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    expected = f"Bearer {settings.metrics_token}"
+    if not secrets.compare_digest(
+        request.headers.get("Authorization", "").encode(), expected.encode()
+    ):
+        raise HTTPException(
+            status_code=401,
+            detail="Unauthorized",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    registry = await metrics_exporter.collect()
+    return Response(render_prometheus(registry), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,8 +1,12 @@
+import time
 import uuid
 from collections.abc import AsyncGenerator
-from typing import Optional, Union
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional, Union
 
+import jwt
 from fastapi import Depends, Request
+from fastapi.security import OAuth2PasswordRequestForm
 from fastapi_users import (
     BaseUserManager,
     FastAPIUsers,
@@ -10,24 +14,34 @@ from fastapi_users import (
     UUIDIDMixin,
     exceptions,
     models,
+    schemas,
 )
 from fastapi_users.authentication import (
     AuthenticationBackend,
     CookieTransport,
 )
-from fastapi_users.authentication.strategy.db import (
-    AccessTokenDatabase,
-    DatabaseStrategy,
-)
+from fastapi_users.authentication.strategy.db import DatabaseStrategy
 from fastapi_users.db import SQLAlchemyUserDatabase
+from fastapi_users.jwt import decode_jwt, generate_jwt
+from fastapi_users_db_sqlalchemy.access_token import SQLAlchemyAccessTokenDatabase
 from httpx_oauth.clients.google import GoogleOAuth2
+from sqlalchemy.orm import make_transient_to_detached
 
-from pixelgram.db import get_access_token_db, get_user_db
+from pixelgram.db import get_access_token_db, get_user_db, release_connection
+from pixelgram.invalidation import ENTITY_USER, invalidation_bus
 from pixelgram.models.access_token import AccessToken
 from pixelgram.models.user import User
+from pixelgram.passwords import (
+    UNUSABLE_PASSWORD,
+    ThreadedPasswordHelper,
+    is_usable_password,
+    password_helper,
+)
+from pixelgram.revocation import revocation_list
 from pixelgram.schemas.user import UserCreate
 from pixelgram.services.post_service import PostService, get_post_service
 from pixelgram.settings import settings
+from pixelgram.utils.signing import PURPOSE_AUTH, sign_payload, verify_signed_payload
 
 google_oauth_client = GoogleOAuth2(
     settings.google_auth_client_id,
@@ -39,15 +53,137 @@ google_oauth_client = GoogleOAuth2(
 class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
     reset_password_token_secret = settings.secret
     verification_token_secret = settings.secret
+    password_helper: ThreadedPasswordHelper
 
     def __init__(self, user_db: SQLAlchemyUserDatabase, post_service: PostService):
-        super().__init__(user_db)
+        super().__init__(user_db, password_helper)
         self.post_service = post_service
 
+    async def create(
+        self,
+        user_create: schemas.UC,
+        safe: bool = False,
+        request: Optional[Request] = None,
+    ) -> User:
+        # Same as fastapi-users, with the password hashed off the event loop
+        await self.validate_password(user_create.password, user_create)
+
+        existing_user = await self.user_db.get_by_email(user_create.email)
+        if existing_user is not None:
+            raise exceptions.UserAlreadyExists()
+
+        user_dict = (
+            user_create.create_update_dict()
+            if safe
+            else user_create.create_update_dict_superuser()
+        )
+        password = user_dict.pop("password")
+        user_dict["hashed_password"] = await self.password_helper.hash_async(password)
+
+        created_user = await self.user_db.create(user_dict)
+
+        await self.on_after_register(created_user, request)
+
+        return created_user
+
+    async def authenticate(
+        self, credentials: OAuth2PasswordRequestForm
+    ) -> Optional[User]:
+        # Same as fastapi-users, with the password verified off the event loop
+        try:
+            user = await self.get_by_email(credentials.username)
+        except exceptions.UserNotExists:
+            user = None
+        if user is None or not is_usable_password(user.hashed_password):
+            # Run the hasher anyway, so the response time does not tell users apart
+            await self.password_helper.hash_async(credentials.password)
+            return None
+
+        (
+            verified,
+            updated_password_hash,
+        ) = await self.password_helper.verify_and_update_async(
+            credentials.password, user.hashed_password
+        )
+        if not verified:
+            return None
+        # Update password hash to a more robust one if needed
+        if updated_password_hash is not None:
+            await self.user_db.update(user, {"hashed_password": updated_password_hash})
+
+        return user
+
+    async def _update(self, user: User, update_dict: dict[str, Any]) -> User:
+        password = update_dict.get("password")
+        if password is not None:
+            await self.validate_password(password, user)
+            update_dict = {k: v for k, v in update_dict.items() if k != "password"}
+            update_dict["hashed_password"] = await self.password_helper.hash_async(
+                password
+            )
+        return await super()._update(user, update_dict)
+
+    async def forgot_password(
+        self, user: User, request: Optional[Request] = None
+    ) -> None:
+        # Same as fastapi-users, with the password fingerprinted off the event loop
+        if not user.is_active:
+            raise exceptions.UserInactive()
+
+        token_data = {
+            "sub": str(user.id),
+            "password_fgpt": await self.password_helper.hash_async(
+                user.hashed_password
+            ),
+            "aud": self.reset_password_token_audience,
+        }
+        token = generate_jwt(
+            token_data,
+            self.reset_password_token_secret,
+            self.reset_password_token_lifetime_seconds,
+        )
+        await self.on_after_forgot_password(user, token, request)
+
+    async def reset_password(
+        self, token: str, password: str, request: Optional[Request] = None
+    ) -> User:
+        # Same as fastapi-users, with the fingerprint checked off the event loop
+        try:
+            data = decode_jwt(
+                token,
+                self.reset_password_token_secret,
+                [self.reset_password_token_audience],
+            )
+            user_id = data["sub"]
+            password_fingerprint = data["password_fgpt"]
+            parsed_id = self.parse_id(user_id)
+        except (jwt.PyJWTError, KeyError, exceptions.InvalidID):
+            raise exceptions.InvalidResetPasswordToken()
+
+        user = await self.get(parsed_id)
+
+        valid_fingerprint, _ = await self.password_helper.verify_and_update_async(
+            user.hashed_password, password_fingerprint
+        )
+        if not valid_fingerprint:
+            raise exceptions.InvalidResetPasswordToken()
+
+        if not user.is_active:
+            raise exceptions.UserInactive()
+
+        updated_user = await self._update(user, {"password": password})
+
+        await self.on_after_reset_password(user, request)
+
+        return updated_user
+
     async def delete(self, user: User, request: Optional[Request] = None) -> None:
         await self.post_service.delete_all_from(user)
-        if await self.user_db.get(user.id) is not None:
-            await super().delete(user, request)
+        # The user may come from a signed token rather than from this session
+        db_user = await self.user_db.get(user.id)
+        if db_user is not None:
+            await super().delete(db_user, request)
+        invalidation_bus.publish(ENTITY_USER, str(user.id))
 
     async def oauth_callback(
         self,
@@ -81,12 +217,11 @@ class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
                     raise exceptions.UserAlreadyExists()
                 user = await self.user_db.add_oauth_account(user, oauth_account_dict)  # type: ignore
             except exceptions.UserNotExists:
-                # Create account
-                password = self.password_helper.generate()
+                # Create account, without a password to log in with
                 user_dict = {
                     "email": account_email,
                     "username": account_email.split("@")[0],
-                    "hashed_password": self.password_helper.hash(password),
+                    "hashed_password": UNUSABLE_PASSWORD,
                     "is_verified": is_verified_by_default,
                 }
                 user = await self.user_db.create(user_dict)
@@ -122,7 +257,15 @@ class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
             )
 
     async def on_after_register(self, user: User, request: Optional[Request] = None):
-        pass
+        invalidation_bus.publish(ENTITY_USER, str(user.id))
+
+    async def on_after_update(
+        self,
+        user: User,
+        update_dict: dict[str, Any],
+        request: Optional[Request] = None,
+    ):
+        invalidation_bus.publish(ENTITY_USER, str(user.id))
 
     async def on_after_forgot_password(
         self, user: User, token: str, request: Optional[Request] = None
@@ -146,19 +289,190 @@ async def get_user_manager(
     yield UserManager(user_db, post_service)
 
 
+class ConnectionReleasingDatabaseStrategy(DatabaseStrategy):
+    """
+    Database strategy that returns the request's connection to the pool as soon
+    as the current user is loaded, so it is not held while the route awaits
+    slow external services.
+
+    Tokens expire once unused for `lifetime_seconds`: a token used with less
+    than half of its lifetime left is renewed for a full one, so active sessions
+    never expire while costing at most one write per half lifetime.
+    """
+
+    def __init__(
+        self,
+        database: SQLAlchemyAccessTokenDatabase[AccessToken],
+        lifetime_seconds: Optional[int] = None,
+    ):
+        super().__init__(database, lifetime_seconds)
+        self.session = database.session
+
+    async def read_token(
+        self,
+        token: Optional[str],
+        user_manager: BaseUserManager[User, uuid.UUID],
+    ) -> Optional[User]:
+        user = await self._read_token(token, user_manager)
+        await release_connection(self.session)
+        return user
+
+    async def _read_token(
+        self,
+        token: Optional[str],
+        user_manager: BaseUserManager[User, uuid.UUID],
+    ) -> Optional[User]:
+        if token is None:
+            return None
+        access_token = await self.database.get_by_token(token)
+        if access_token is None:
+            return None
+
+        if self.lifetime_seconds:
+            lifetime = timedelta(seconds=self.lifetime_seconds)
+            now = datetime.now(timezone.utc)
+            # Tokens issued before expiries existed expire a lifetime after creation
+            expires_at = access_token.expires_at or access_token.created_at + lifetime
+            if expires_at <= now:
+                return None
+            if expires_at - now < lifetime / 2:
+                await self.database.update(access_token, {"expires_at": now + lifetime})
+
+        try:
+            parsed_id = user_manager.parse_id(access_token.user_id)
+            return await user_manager.get(parsed_id)
+        except (exceptions.UserNotExists, exceptions.InvalidID):
+            return None
+
+    def _create_access_token_dict(self, user: User) -> dict[str, Any]:
+        token_dict = super()._create_access_token_dict(user)
+        if self.lifetime_seconds:
+            token_dict["expires_at"] = datetime.now(timezone.utc) + timedelta(
+                seconds=self.lifetime_seconds
+            )
+        return token_dict
+
+
+class SignedTokenStrategy(ConnectionReleasingDatabaseStrategy):
+    """
+    Strategy issuing short-lived signed access tokens, checked without the database.
+
+    Each login still creates a database token, used as the refresh token of the
+    session. The access token signs the session id along with the user's
+    account fields, so a request within `access_ttl_seconds` of the token's
+    issue is authenticated from the signature and the in-memory revocation list
+    alone. Older access tokens are refreshed from the database token, with its
+    sliding expiry, and the new access token is stored in `request.state` for
+    the `refresh_auth_cookie` middleware to send back.
+    """
+
+    def __init__(
+        self,
+        request: Request,
+        database: SQLAlchemyAccessTokenDatabase[AccessToken],
+        lifetime_seconds: Optional[int] = None,
+        access_ttl_seconds: int = 300,
+    ):
+        super().__init__(database, lifetime_seconds)
+        self.request = request
+        self.access_ttl_seconds = access_ttl_seconds
+
+    async def read_token(
+        self,
+        token: Optional[str],
+        user_manager: BaseUserManager[User, uuid.UUID],
+    ) -> Optional[User]:
+        claims = (
+            verify_signed_payload(token, settings.secret, PURPOSE_AUTH)
+            if token
+            else None
+        )
+        if claims is None:
+            return None
+
+        fresh = time.time() - claims["iat"] < self.access_ttl_seconds
+        if fresh and not revocation_list.is_revoked(
+            claims["sid"], claims["sub"], claims["iat"]
+        ):
+            return self._user_from_claims(claims)
+
+        user = await super().read_token(claims["sid"], user_manager)
+        if user is not None:
+            self.request.state.refreshed_auth_token = self._sign(user, claims["sid"])
+        return user
+
+    async def write_token(self, user: User) -> str:
+        session_id = await super().write_token(user)
+        return self._sign(user, session_id)
+
+    async def destroy_token(self, token: str, user: User) -> None:
+        claims = verify_signed_payload(token, settings.secret, PURPOSE_AUTH)
+        if claims is not None:
+            await super().destroy_token(claims["sid"], user)
+            await revocation_list.revoke(claims["sid"])
+
+    def _sign(self, user: User, session_id: str) -> str:
+        claims = {
+            "sub": str(user.id),
+            "sid": session_id,
+            "iat": time.time(),
+            "email": user.email,
+            "username": user.username,
+            "active": user.is_active,
+            "superuser": user.is_superuser,
+            "verified": user.is_verified,
+        }
+        # The signature outlives the access token, so stale tokens can still be refreshed
+        return sign_payload(
+            claims,
+            settings.secret,
+            self.lifetime_seconds or self.access_ttl_seconds,
+            PURPOSE_AUTH,
+        )
+
+    @staticmethod
+    def _user_from_claims(claims: dict[str, Any]) -> User:
+        user = User(
+            id=uuid.UUID(claims["sub"]),
+            email=claims["email"],
+            username=claims["username"],
+            is_active=claims["active"],
+            is_superuser=claims["superuser"],
+            is_verified=claims["verified"],
+        )
+        # Attaching it to a session later updates the existing row
+        make_transient_to_detached(user)
+        return user
+
+
 def get_database_strategy(
-    access_token_db: AccessTokenDatabase[AccessToken] = Depends(get_access_token_db),
+    request: Request,
+    access_token_db: SQLAlchemyAccessTokenDatabase[AccessToken] = Depends(
+        get_access_token_db
+    ),
 ) -> DatabaseStrategy:
     """
     Get database strategy for authentication.
     This function is used to create a database strategy for the authentication backend.
+    The signed token strategy is used instead when selected in the settings.
     """
-    return DatabaseStrategy(access_token_db, lifetime_seconds=None)
+    if settings.auth_strategy == "signed":
+        return SignedTokenStrategy(
+            request,
+            access_token_db,
+            lifetime_seconds=settings.auth_token_lifetime_seconds,
+            access_ttl_seconds=settings.auth_access_token_ttl_seconds,
+        )
+    return ConnectionReleasingDatabaseStrategy(
+        access_token_db, lifetime_seconds=settings.auth_token_lifetime_seconds
+    )
 
 
 auth_backend = AuthenticationBackend(
     name="cookie",
-    transport=CookieTransport(cookie_samesite="none"),
+    transport=CookieTransport(
+        cookie_name=settings.auth_cookie_name, cookie_samesite="none"
+    ),
     get_strategy=get_database_strategy,
 )
 """Authentication backend for cookie-based authentication."""
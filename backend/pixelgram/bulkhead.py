@@ -0,0 +1,99 @@
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from typing import TypeVar
+
+from fastapi import Request, status
+from fastapi.responses import ORJSONResponse
+
+from pixelgram.metrics import metrics
+
+T = TypeVar("T")
+
+
+class DependencyUnavailableError(Exception):
+    """Raised when an external dependency cannot take a call right now."""
+
+    def __init__(self, dependency: str, reason: str):
+        super().__init__(f"{dependency} is unavailable: {reason}.")
+        self.dependency = dependency
+        self.reason = reason
+
+
+class Bulkhead:
+    """
+    Bounds the calls made concurrently to an external dependency.
+
+    At most `max_concurrent` calls run at once and at most `max_queued` wait for
+    a free slot; further calls are rejected right away instead of piling up.
+    Each call gets `timeout` seconds overall, waiting for a slot included, so a
+    slow dependency fails fast rather than tying up workers and connections.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queued: int, timeout: float):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._queued = 0
+
+    async def run(self, call: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run a call to the dependency within the bulkhead.
+        Args:
+            call (Callable[[], Awaitable[T]]): A function starting the call.
+        Returns:
+            T: The result of the call.
+        Raises:
+            DependencyUnavailableError: If the bulkhead is saturated or the call
+                does not complete within the timeout.
+        """
+        if self._semaphore.locked() and self._queued >= self.max_queued:
+            metrics.increment(
+                "bulkhead_rejections_total", dependency=self.name, reason="saturated"
+            )
+            raise DependencyUnavailableError(self.name, "too many pending calls")
+
+        deadline = time.monotonic() + self.timeout
+        started = time.monotonic()
+        self._queued += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            metrics.increment(
+                "bulkhead_rejections_total",
+                dependency=self.name,
+                reason="queue_timeout",
+            )
+            raise DependencyUnavailableError(self.name, "timed out waiting for a slot")
+        finally:
+            self._queued -= 1
+        metrics.observe(
+            "bulkhead_queue_wait_seconds",
+            time.monotonic() - started,
+            dependency=self.name,
+        )
+
+        metrics.add_gauge("bulkhead_in_flight", 1, dependency=self.name)
+        try:
+            return await asyncio.wait_for(call(), deadline - time.monotonic())
+        except asyncio.TimeoutError:
+            metrics.increment(
+                "bulkhead_rejections_total", dependency=self.name, reason="timeout"
+            )
+            raise DependencyUnavailableError(self.name, "call timed out")
+        finally:
+            metrics.add_gauge("bulkhead_in_flight", -1, dependency=self.name)
+            self._semaphore.release()
+
+
+async def dependency_unavailable_handler(
+    request: Request, exc: Exception
+) -> ORJSONResponse:
+    """Answer requests failed by an unavailable dependency with a 503 error."""
+    return ORJSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": str(exc)},
+        headers={"Retry-After": "1"},
+    )
@@ -0,0 +1,172 @@
+import zlib
+from typing import Optional
+
+import brotli
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+COMPRESSIBLE_CONTENT_TYPES = (
+    "application/json",
+    "application/javascript",
+    "image/svg+xml",
+    "text/",
+)
+"""Content types worth compressing, images and other binary payloads already are"""
+
+NEVER_COMPRESSED_CONTENT_TYPES = ("text/event-stream",)
+"""Streamed content types that must reach the client without buffering"""
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Pick the best supported content coding from an Accept-Encoding header.
+    Brotli is preferred over gzip when both are equally acceptable.
+    Args:
+        accept_encoding (str): The value of the Accept-Encoding request header.
+    Returns:
+        Optional[str]: "br", "gzip", or None if neither is acceptable.
+    """
+    qualities: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[coding] = quality
+
+    wildcard = qualities.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for coding in ("br", "gzip"):
+        quality = qualities.get(coding, wildcard)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses with brotli or gzip, as negotiated with the client.
+    Only textual responses above `minimum_size` bytes are compressed, and
+    streamed responses are compressed incrementally.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.downstream = send
+        self.start_message: Optional[Message] = None
+        self.passthrough = False
+        self.compressor = None
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            # Headers depend on the body, so hold them until it arrives
+            self.start_message = message
+            return
+        if message["type"] != "http.response.body" or self.start_message is None:
+            await self.downstream(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.passthrough:
+            await self.downstream(message)
+            return
+
+        if self.compressor is None:
+            await self._start(message, body, more_body)
+            return
+
+        chunk = self._process(body)
+        if not more_body:
+            chunk += self._finish()
+        await self.downstream(
+            {"type": "http.response.body", "body": chunk, "more_body": more_body}
+        )
+
+    async def _start(self, message: Message, body: bytes, more_body: bool) -> None:
+        start_message = self.start_message
+        assert start_message is not None
+        headers = MutableHeaders(raw=start_message["headers"])
+        content_type = headers.get("content-type", "")
+        compressible = content_type.startswith(
+            COMPRESSIBLE_CONTENT_TYPES
+        ) and not content_type.startswith(NEVER_COMPRESSED_CONTENT_TYPES)
+
+        if compressible:
+            headers.add_vary_header("Accept-Encoding")
+        if (
+            not compressible
+            or "content-encoding" in headers
+            or start_message["status"] in (204, 304)
+            or (not more_body and len(body) < self.middleware.minimum_size)
+        ):
+            self.passthrough = True
+            await self.downstream(start_message)
+            await self.downstream(message)
+            return
+
+        if self.encoding == "br":
+            self.compressor = brotli.Compressor(quality=self.middleware.brotli_quality)
+        else:
+            self.compressor = zlib.compressobj(
+                self.middleware.gzip_level, zlib.DEFLATED, 31
+            )
+        headers["Content-Encoding"] = self.encoding
+
+        chunk = self._process(body)
+        if more_body:
+            del headers["Content-Length"]
+        else:
+            chunk += self._finish()
+            headers["Content-Length"] = str(len(chunk))
+
+        await self.downstream(start_message)
+        await self.downstream(
+            {"type": "http.response.body", "body": chunk, "more_body": more_body}
+        )
+
+    def _process(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self.compressor.process(data)  # type: ignore
+        return self.compressor.compress(data)  # type: ignore
+
+    def _finish(self) -> bytes:
+        if self.encoding == "br":
+            return self.compressor.finish()  # type: ignore
+        return self.compressor.flush()  # type: ignore
@@ -1,18 +1,79 @@
-from collections.abc import AsyncGenerator
-from typing import Coroutine
+import asyncio
+from collections.abc import AsyncGenerator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from typing import Any, Coroutine, Literal, Optional, TypeVar
+from uuid import UUID
 
-from fastapi import Depends
+from fastapi import Depends, Request
 from fastapi_users_db_sqlalchemy import SQLAlchemyUserDatabase
 from fastapi_users_db_sqlalchemy.access_token import (
     SQLAlchemyAccessTokenDatabase,
 )
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy import delete, event, select, update
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.orm import Session, SessionTransaction, selectinload
 
+from pixelgram.instrumentation import QueryStats, current_query_stats
+from pixelgram.migrations import upgrade_schema
 from pixelgram.models.access_token import AccessToken
 from pixelgram.models.base import Base
 from pixelgram.models.oauth_account import OAuthAccount
 from pixelgram.models.user import User
 from pixelgram.settings import settings
+from pixelgram.utils.signing import (
+    PURPOSE_PRIMARY_PIN,
+    sign_payload,
+    verify_signed_payload,
+)
+
+T = TypeVar("T")
+
+
+def configure_sqlite_engine(
+    engine: AsyncEngine, begin: str | None = None, query_only: bool = False
+) -> None:
+    """
+    Apply the SQLite production profile to an engine.
+    Every new connection gets WAL journaling, relaxed syncing, memory-mapped I/O,
+    a busy timeout and foreign key enforcement.
+    Args:
+        engine (AsyncEngine): The SQLite engine to configure.
+        begin (str | None): The statement used to open transactions, e.g. `BEGIN IMMEDIATE`
+            so writers take the write lock up front instead of failing with
+            "database is locked" when upgrading from a read lock. When omitted, the
+            driver keeps its default of opening transactions lazily before writes.
+        query_only (bool): Whether connections must reject any write.
+    """
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        if begin is not None:
+            # Let SQLAlchemy emit BEGIN itself, which also makes SAVEPOINT work
+            dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA mmap_size={settings.db_sqlite_mmap_size}")
+        cursor.execute(f"PRAGMA busy_timeout={settings.db_sqlite_busy_timeout_ms}")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        if query_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+    if begin is not None:
+
+        @event.listens_for(engine.sync_engine, "begin")
+        def on_begin(conn):
+            conn.exec_driver_sql(begin)
+
+
+sqlite_profile = settings.db_sqlite_profile and settings.db_uri.startswith("sqlite")
+"""Whether the SQLite production profile is enabled"""
 
 engine = create_async_engine(settings.db_uri)
 """Engine for the database"""
@@ -20,22 +81,475 @@ engine = create_async_engine(settings.db_uri)
 async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
 """Session maker for the database"""
 
+if sqlite_profile:
+    configure_sqlite_engine(engine)
+
+    # Queued writes go through a single connection, so they never compete for
+    # the write lock inside the worker
+    writer_engine = create_async_engine(settings.db_uri, pool_size=1, max_overflow=0)
+    configure_sqlite_engine(writer_engine, begin="BEGIN IMMEDIATE")
+
+    # Thanks to WAL, readers never wait on the writer
+    reader_engines = [create_async_engine(settings.db_uri)]
+    configure_sqlite_engine(reader_engines[0], query_only=True)
+else:
+    writer_engine = engine
+    reader_engines = [create_async_engine(uri) for uri in settings.db_replica_uris]
+
+
+class ReadReplicaRouter:
+    """
+    Routes read-only sessions to the configured read replicas.
+
+    Replicas are picked either in round-robin order or by the lowest number of
+    sessions currently open against them. Clients that performed a write in the
+    last `read_your_writes_seconds` are kept on the primary so they always see
+    their own changes, regardless of replication lag. They are given a signed pin
+    token, usually as a cookie, which every worker can check without sharing
+    any state.
+    """
+
+    def __init__(
+        self,
+        replicas: list[AsyncEngine],
+        selection: Literal["round_robin", "least_busy"] = "round_robin",
+        read_your_writes_seconds: float = 5,
+    ):
+        self.replicas = replicas
+        self.selection = selection
+        self.read_your_writes_seconds = read_your_writes_seconds
+        self._session_makers = [
+            async_sessionmaker(replica, expire_on_commit=False) for replica in replicas
+        ]
+        self._in_flight = [0] * len(replicas)
+        self._next = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    def pin_token(self) -> Optional[str]:
+        """
+        Sign a token pinning its bearer to the primary for the read-your-writes window.
+        Returns:
+            Optional[str]: The token, or None if reads never leave the primary or
+                replicas never lag behind it.
+        """
+        if not self.enabled or self.read_your_writes_seconds <= 0:
+            return None
+        return sign_payload(
+            {}, settings.secret, self.read_your_writes_seconds, PURPOSE_PRIMARY_PIN
+        )
+
+    def must_read_primary(self, pin_token: Optional[str]) -> bool:
+        """Whether the bearer of a pin token wrote recently and must read from the primary."""
+        if not pin_token:
+            return False
+        pin = verify_signed_payload(pin_token, settings.secret, PURPOSE_PRIMARY_PIN)
+        return pin is not None
+
+    def pick(self) -> int:
+        """Pick the index of the replica that should serve the next read."""
+        if self.selection == "least_busy":
+            # Ties are broken in round-robin order to spread idle load
+            count = len(self.replicas)
+            order = [(self._next + i) % count for i in range(count)]
+            index = min(order, key=lambda i: self._in_flight[i])
+        else:
+            index = self._next % len(self.replicas)
+        self._next = (index + 1) % len(self.replicas)
+        return index
+
+    @asynccontextmanager
+    async def session(self) -> AsyncGenerator[AsyncSession, None]:
+        """Open a session against the next replica picked by the router."""
+        index = self.pick()
+        self._in_flight[index] += 1
+        try:
+            async with self._session_makers[index]() as session:
+                yield session
+        finally:
+            self._in_flight[index] -= 1
+
+
+read_replica_router = ReadReplicaRouter(
+    reader_engines,
+    selection=settings.db_replica_selection,
+    # SQLite readers share the writer's file, so they never lag behind
+    read_your_writes_seconds=0
+    if sqlite_profile
+    else settings.db_read_your_writes_seconds,
+)
+"""Router for read-only sessions"""
+
+
+WriteOperation = Callable[[AsyncSession], Awaitable[T]]
+"""A unit of work that writes through the given session without committing it"""
+
+
+QueuedWrite = tuple[WriteOperation[Any], asyncio.Future[Any], QueryStats | None]
+"""A queued operation, the future of its result and the query stats of its caller"""
+
+
+class WriteQueue:
+    """
+    Funnels write operations through a single writer task.
+
+    Queued operations are drained in batches that share one transaction, so a
+    burst of small writes (likes, comments...) costs a single commit. Each
+    operation runs inside its own savepoint, so a failing operation only rolls
+    back its own changes and its exception is raised back to its submitter.
+    """
+
+    def __init__(
+        self,
+        session_maker: async_sessionmaker[AsyncSession],
+        max_batch_size: int = 64,
+    ):
+        self.session_maker = session_maker
+        self.max_batch_size = max_batch_size
+        self._queue: asyncio.Queue[QueuedWrite]
+        self._task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Start the writer task on the running event loop."""
+        if not self.running:
+            # The queue is bound to the event loop it is created in
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Flush the pending operations and stop the writer task."""
+        if not self.running:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def submit(self, operation: WriteOperation[T]) -> T:
+        """
+        Queue a write operation and wait until its batch is committed.
+        The statements of the operation count towards the query stats of the
+        caller, as if it had run them itself.
+        Args:
+            operation (WriteOperation): The operation to run in the writer session.
+        Returns:
+            The value returned by the operation.
+        Raises:
+            Any exception raised by the operation or by the batch commit.
+        """
+        future: asyncio.Future[T] = asyncio.get_running_loop().create_future()
+        await self._queue.put((operation, future, current_query_stats.get()))
+        return await future
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await self._execute(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _execute(self, batch: list[QueuedWrite]) -> None:
+        outcomes: list[tuple[asyncio.Future[Any], Any, BaseException | None]] = []
+        try:
+            async with self.session_maker() as session:
+                async with session.begin():
+                    for operation, future, stats in batch:
+                        try:
+                            async with session.begin_nested():
+                                result = await self._run_operation(
+                                    session, operation, stats
+                                )
+                            outcomes.append((future, result, None))
+                        except Exception as e:
+                            outcomes.append((future, None, e))
+        except Exception as e:
+            # The batch could not be committed, so every operation failed
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for future, result, error in outcomes:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    @staticmethod
+    async def _run_operation(
+        session: AsyncSession, operation: WriteOperation[T], stats: QueryStats | None
+    ) -> T:
+        # The savepoint and the batch commit are overhead of the queue, not of the
+        # operation, so the savepoint is emitted before crediting the caller
+        await session.connection()
+        token = current_query_stats.set(stats)
+        try:
+            result = await operation(session)
+            # Flushed now rather than on release, so the writes are credited too
+            await session.flush()
+            return result
+        finally:
+            current_query_stats.reset(token)
+
+
+write_queue = WriteQueue(
+    async_sessionmaker(writer_engine, expire_on_commit=False),
+    max_batch_size=settings.db_sqlite_write_batch_size,
+)
+"""Single writer queue, started by the application when the SQLite profile is enabled"""
+
+
+async def run_write(session: AsyncSession, operation: WriteOperation[T]) -> T:
+    """
+    Run a write operation and commit it.
+    The operation goes through the single writer queue when it is running,
+    otherwise it is run and committed directly on the given session.
+    Args:
+        session (AsyncSession): The request session to use when the queue is not running.
+        operation (WriteOperation): The operation to run.
+    Returns:
+        The value returned by the operation.
+    """
+    if write_queue.running:
+        return await write_queue.submit(operation)
+
+    result = await operation(session)
+    await session.commit()
+    return result
+
 
 async def create_db_and_tables() -> Coroutine | None:
-    """Create the database and tables if they do not exist."""
+    """Create the database and tables if they do not exist, and upgrade them."""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(upgrade_schema)
 
 
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     """
     Get an async session for the database.
+    The session only checks out a pooled connection on its first query, so
+    requests that never touch the database do not hold one.
     This function is a dependency that can be used in FastAPI routes.
     """
     async with async_session_maker() as session:
         yield session
 
 
+async def release_connection(session: AsyncSession) -> None:
+    """
+    Return the connection held by a read-only session to the pool, e.g. before
+    awaiting slow external I/O. The transaction is ended without writing
+    anything, and the loaded objects stay attached with their loaded attributes,
+    so they can still be changed and flushed. The session checks out a new
+    connection on its next query.
+    Sessions with pending or flushed but uncommitted changes are left untouched,
+    as releasing their connection would either discard or commit them.
+    Args:
+        session (AsyncSession): The session whose connection should be released.
+    """
+    if not session.in_transaction():
+        return
+    if session.new or session.dirty or session.deleted:
+        return
+    if session.info.get("flushed_writes"):
+        return
+    # Committing a transaction that wrote nothing only ends it, and unlike rolling
+    # back or closing, it can keep the loaded objects attached and unexpired
+    expire_on_commit = session.sync_session.expire_on_commit
+    session.sync_session.expire_on_commit = False
+    try:
+        await session.commit()
+    finally:
+        session.sync_session.expire_on_commit = expire_on_commit
+
+
+@event.listens_for(Session, "after_flush")
+def track_flushed_writes(session: Session, flush_context: Any) -> None:
+    """Remember that the transaction of a session wrote, for `release_connection`."""
+    session.info["flushed_writes"] = True
+
+
+@event.listens_for(Session, "after_transaction_end")
+def forget_flushed_writes(session: Session, transaction: SessionTransaction) -> None:
+    if transaction.parent is None:
+        session.info.pop("flushed_writes", None)
+
+
+async def get_read_session(
+    request: Request,
+    session: AsyncSession = Depends(get_async_session),
+) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Get an async session for read-only queries.
+    Reads are served by a replica when any is configured, unless the client wrote
+    recently and sends its pin cookie, in which case the primary request session
+    is reused.
+    This function is a dependency that can be used in FastAPI routes.
+    """
+    pin_token = request.cookies.get(settings.db_read_your_writes_cookie_name)
+    if not read_replica_router.enabled or read_replica_router.must_read_primary(
+        pin_token
+    ):
+        yield session
+        return
+
+    async with read_replica_router.session() as read_session:
+        yield read_session
+
+
+async def write_from_session(session: AsyncSession, operation: WriteOperation[T]) -> T:
+    """
+    Run a write operation with `run_write` on behalf of a request session, e.g.
+    for the writes of fastapi-users, which would otherwise upgrade a deferred
+    read transaction of the session and fail on a busy SQLite database.
+    The read-only transaction of the session is ended first, so the session
+    sees the write once it is committed.
+    Args:
+        session (AsyncSession): The request session writing.
+        operation (WriteOperation): The operation to run.
+    Returns:
+        The value returned by the operation.
+    """
+    await release_connection(session)
+    return await run_write(session, operation)
+
+
+class UserDatabase(SQLAlchemyUserDatabase[User, UUID]):
+    """
+    User database loading the OAuth accounts of a user only when the OAuth flow
+    needs them, so the other user loads are a single query on the user table.
+    Writes go through `write_from_session`, so they take the SQLite write lock
+    up front like the other writes.
+    """
+
+    async def get_by_oauth_account(self, oauth: str, account_id: str) -> Optional[User]:
+        statement = (
+            select(User)
+            .join(OAuthAccount)
+            .where(OAuthAccount.oauth_name == oauth)
+            .where(OAuthAccount.account_id == account_id)
+            .options(selectinload(User.oauth_accounts))
+        )
+        return await self._get_user(statement)
+
+    async def create(self, create_dict: dict[str, Any]) -> User:
+        async def insert_user(session: AsyncSession) -> User:
+            user = User(**create_dict)
+            session.add(user)
+            await session.flush()
+            return user
+
+        return await write_from_session(self.session, insert_user)
+
+    async def update(self, user: User, update_dict: dict[str, Any]) -> User:
+        async def update_user(session: AsyncSession) -> None:
+            await session.execute(
+                update(User).where(User.id == user.id).values(**update_dict)
+            )
+
+        await write_from_session(self.session, update_user)
+        # The user may come from a signed token rather than from this session
+        self.session.add(user)
+        await self.session.refresh(user)
+        return user
+
+    async def delete(self, user: User) -> None:
+        async def delete_user(session: AsyncSession) -> None:
+            # Loaded in the writing session, so the ORM cascades apply
+            db_user = await session.get(User, user.id)
+            if db_user is not None:
+                await session.delete(db_user)
+
+        await write_from_session(self.session, delete_user)
+        if user in self.session:
+            self.session.expunge(user)
+
+    async def add_oauth_account(self, user: User, create_dict: dict[str, Any]) -> User:
+        async def insert_oauth_account(session: AsyncSession) -> None:
+            session.add(OAuthAccount(user_id=user.id, **create_dict))
+
+        await write_from_session(self.session, insert_oauth_account)
+
+        # Reload the user, as its accounts were not loaded with it
+        statement = (
+            select(User)
+            .where(User.id == user.id)
+            .options(selectinload(User.oauth_accounts))
+            .execution_options(populate_existing=True)
+        )
+        return (await self.session.execute(statement)).scalar_one()
+
+    async def update_oauth_account(
+        self, user: User, oauth_account: OAuthAccount, update_dict: dict[str, Any]
+    ) -> User:
+        async def update_oauth_account(session: AsyncSession) -> None:
+            await session.execute(
+                update(OAuthAccount)
+                .where(OAuthAccount.id == oauth_account.id)
+                .values(**update_dict)
+            )
+
+        await write_from_session(self.session, update_oauth_account)
+        await self.session.refresh(oauth_account)
+        return user
+
+
+class AccessTokenDatabase(SQLAlchemyAccessTokenDatabase[AccessToken]):
+    """
+    Access token database writing through `write_from_session`, as tokens are
+    written on every login and renewed while they are used.
+    """
+
+    async def create(self, create_dict: dict[str, Any]) -> AccessToken:
+        async def insert_token(session: AsyncSession) -> AccessToken:
+            access_token = AccessToken(**create_dict)
+            session.add(access_token)
+            await session.flush()
+            return access_token
+
+        return await write_from_session(self.session, insert_token)
+
+    async def update(
+        self, access_token: AccessToken, update_dict: dict[str, Any]
+    ) -> AccessToken:
+        async def update_token(session: AsyncSession) -> None:
+            await session.execute(
+                update(AccessToken)
+                .where(AccessToken.token == access_token.token)
+                .values(**update_dict)
+            )
+
+        await write_from_session(self.session, update_token)
+        await self.session.refresh(access_token)
+        return access_token
+
+    async def delete(self, access_token: AccessToken) -> None:
+        async def delete_token(session: AsyncSession) -> None:
+            await session.execute(
+                delete(AccessToken).where(AccessToken.token == access_token.token)
+            )
+
+        await write_from_session(self.session, delete_token)
+        if access_token in self.session:
+            self.session.expunge(access_token)
+
+
 async def get_user_db(
     session: AsyncSession = Depends(get_async_session),
 ) -> AsyncGenerator[SQLAlchemyUserDatabase, None]:
@@ -43,10 +557,10 @@ async def get_user_db(
     Get user table from the database.
     This function is a dependency that can be used in FastAPI routes.
     """
-    yield SQLAlchemyUserDatabase(session, User, OAuthAccount)
+    yield UserDatabase(session, User, OAuthAccount)
 
 
 async def get_access_token_db(
     session: AsyncSession = Depends(get_async_session),
 ):
-    yield SQLAlchemyAccessTokenDatabase(session, AccessToken)
+    yield AccessTokenDatabase(session, AccessToken)
@@ -0,0 +1,382 @@
+import asyncio
+import functools
+import json
+import logging
+import sqlite3
+import time
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import ParamSpec, TypeVar
+from uuid import uuid4
+
+from sqlalchemy import Result, event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import ORMExecuteState, Session
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from pixelgram.metrics import MetricsRegistry, metrics
+from pixelgram.settings import settings
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+"""Histogram buckets of the number of queries of a request"""
+
+RESPONSE_SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+"""Histogram buckets of the size of a response, in bytes"""
+
+
+class QueryStats:
+    """
+    The database statements issued on behalf of a request or a service call,
+    the rows they fetched and the time they took. Statements also count towards
+    the stats of the enclosing request or call, if any.
+    """
+
+    __slots__ = ("statements", "rows", "seconds", "parent")
+
+    def __init__(self, parent: "QueryStats | None" = None):
+        self.statements = 0
+        self.rows = 0
+        self.seconds = 0.0
+        self.parent = parent
+
+
+current_query_stats: ContextVar[QueryStats | None] = ContextVar(
+    "current_query_stats", default=None
+)
+"""Query stats of the request or service call being handled, if any"""
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised when a service call runs more queries than its budget, in strict mode."""
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """
+    Count the statements run by an engine and time them, both overall and for
+    the request or service call being handled, through `current_query_stats`.
+    Args:
+        engine (AsyncEngine): The engine to instrument, once.
+    """
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, many):
+        seconds = time.perf_counter() - conn.info["query_started_at"].pop()
+        metrics.increment("db_queries_total")
+        metrics.observe("db_query_seconds", seconds)
+        stats = current_query_stats.get()
+        while stats is not None:
+            stats.statements += 1
+            stats.seconds += seconds
+            stats = stats.parent
+
+
+@event.listens_for(Session, "do_orm_execute")
+def count_fetched_rows(orm_execute_state: ORMExecuteState) -> Result | None:
+    """
+    Count the rows fetched by the selects of every session, towards the
+    `current_query_stats`. Cursors do not tell how many rows a select returns
+    before they are fetched, so results are buffered to count them, which the
+    async sessions do anyway.
+    """
+    stats = current_query_stats.get()
+    if stats is None or not orm_execute_state.is_select:
+        return None
+    frozen = orm_execute_state.invoke_statement().freeze()
+    rows = len(frozen.data)
+    while stats is not None:
+        stats.rows += rows
+        stats = stats.parent
+    return frozen()
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """Count the statements and rows of the enclosed block."""
+    stats = QueryStats(current_query_stats.get())
+    token = current_query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        current_query_stats.reset(token)
+
+
+def check_query_budget(
+    name: str,
+    stats: QueryStats,
+    statements: int,
+    rows: int | None = None,
+    strict: bool = False,
+) -> bool:
+    """
+    Check the queries of a request or service call against its budget.
+    Args:
+        name (str): The name of the request or call, for the logs and metrics.
+        stats (QueryStats): The queries it ran.
+        statements (int): The maximum number of statements.
+        rows (int | None, optional): The maximum number of rows fetched, if any.
+        strict (bool, optional): Whether to raise rather than log a warning.
+    Returns:
+        bool: Whether the queries were within the budget.
+    Raises:
+        QueryBudgetExceeded: If over budget, in strict mode.
+    """
+    if stats.statements <= statements and (rows is None or stats.rows <= rows):
+        return True
+    metrics.increment("query_budget_exceeded_total", call=name)
+    message = (
+        f"{name} ran {stats.statements} statements fetching {stats.rows} rows, "
+        f"over its budget of {statements} statements and {rows} rows"
+    )
+    if strict:
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+    return False
+
+
+def query_budget(
+    statements: int, rows: int | None = None
+) -> Callable[[Callable[P, Awaitable[T]]], Callable[P, Awaitable[T]]]:
+    """
+    Decorate a service method to check its queries against a budget on each call.
+    Depending on `settings.query_budget_mode`, calls over budget log a warning,
+    raise `QueryBudgetExceeded`, or are not checked at all.
+    Args:
+        statements (int): The maximum number of statements of a call.
+        rows (int | None, optional): The maximum number of rows fetched by a call.
+    """
+
+    def decorator(method: Callable[P, Awaitable[T]]) -> Callable[P, Awaitable[T]]:
+        @functools.wraps(method)
+        async def wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
+            if settings.query_budget_mode == "off":
+                return await method(*args, **kwargs)
+            with track_queries() as stats:
+                result = await method(*args, **kwargs)
+            check_query_budget(
+                method.__qualname__,
+                stats,
+                statements,
+                rows,
+                strict=settings.query_budget_mode == "raise",
+            )
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+class MetricsMiddleware:
+    """
+    Records the latency, status, response size and database queries of every
+    request, by route template so the number of series stays bounded.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        size = 0
+
+        async def send_and_measure(message: Message) -> None:
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        started = time.perf_counter()
+        metrics.add_gauge("http_requests_in_flight", 1)
+        try:
+            with track_queries() as stats:
+                await self.app(scope, receive, send_and_measure)
+        finally:
+            seconds = time.perf_counter() - started
+            metrics.add_gauge("http_requests_in_flight", -1)
+
+            # The router stores the matched route in the scope
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            if settings.query_budget_mode != "off":
+                # The response is already sent, so requests are never failed
+                check_query_budget(
+                    f"{method} {route}",
+                    stats,
+                    settings.query_budget_request_statements,
+                    settings.query_budget_request_rows,
+                )
+            metrics.increment(
+                "http_requests_total", method=method, route=route, status=status
+            )
+            metrics.observe(
+                "http_request_duration_seconds", seconds, method=method, route=route
+            )
+            metrics.observe(
+                "http_response_size_bytes",
+                size,
+                buckets=RESPONSE_SIZE_BUCKETS,
+                method=method,
+                route=route,
+            )
+            metrics.observe(
+                "http_request_db_queries",
+                stats.statements,
+                buckets=QUERY_COUNT_BUCKETS,
+                method=method,
+                route=route,
+            )
+            metrics.observe(
+                "http_request_db_seconds", stats.seconds, method=method, route=route
+            )
+
+
+class LocalMetricsExporter:
+    """
+    Exports the metrics of the current worker, which is enough when a single
+    worker serves the application.
+    """
+
+    def start(self) -> None:
+        """Start sharing the metrics with the other workers, if supported."""
+
+    async def stop(self) -> None:
+        """Stop sharing the metrics with the other workers."""
+
+    async def collect(self) -> MetricsRegistry:
+        """Get the metrics to export, those of every worker if supported."""
+        return metrics
+
+
+class SqliteMetricsExporter(LocalMetricsExporter):
+    """
+    Exports the metrics of all the workers of a host, through a SQLite file.
+
+    Recording a metric stays an in-memory update: every worker writes a
+    snapshot of its metrics to the file every `publish_interval` seconds, and
+    collecting sums the snapshots of every worker, its own being fresh.
+    Snapshots not updated for `stale_seconds` are left out, so stopped workers
+    eventually disappear, which Prometheus sees as a counter reset.
+    """
+
+    def __init__(
+        self, path: str, publish_interval: float = 5, stale_seconds: float = 60
+    ):
+        self.path = path
+        self.publish_interval = publish_interval
+        self.stale_seconds = stale_seconds
+        self._connection: sqlite3.Connection | None = None
+        self._worker_id = ""
+        self._task: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def open(self) -> None:
+        """Open the snapshot table."""
+        if self._connection is not None:
+            return
+        # The id is drawn per process, as workers may be forked after import
+        self._worker_id = uuid4().hex
+        self._connection = sqlite3.connect(
+            self.path, isolation_level=None, check_same_thread=False
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("PRAGMA busy_timeout=5000")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS worker_metrics ("
+            "worker TEXT PRIMARY KEY, snapshot TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def start(self) -> None:
+        if not self.running:
+            self.open()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self.running:
+            self._task.cancel()  # type: ignore
+            try:
+                await self._task  # type: ignore
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._connection is not None:
+            self._connection.execute(
+                "DELETE FROM worker_metrics WHERE worker = ?", (self._worker_id,)
+            )
+            self._connection.close()
+            self._connection = None
+
+    async def collect(self) -> MetricsRegistry:
+        self.open()
+        snapshot = metrics.snapshot()
+        # The connection is not safe to share between threads at once
+        async with self._lock:
+            snapshots = await asyncio.to_thread(self._exchange, snapshot)
+        registry = MetricsRegistry()
+        for snapshot in snapshots:
+            registry.merge(snapshot)
+        return registry
+
+    async def publish(self) -> None:
+        """Write the snapshot of the metrics of the current worker."""
+        snapshot = metrics.snapshot()
+        async with self._lock:
+            await asyncio.to_thread(self._exchange, snapshot, False)
+
+    def _exchange(self, snapshot: dict, read: bool = True) -> list[dict]:
+        connection = self._connection
+        assert connection is not None
+        now = time.time()
+        connection.execute(
+            "INSERT INTO worker_metrics (worker, snapshot, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (worker) DO UPDATE SET "
+            "snapshot = excluded.snapshot, updated_at = excluded.updated_at",
+            (self._worker_id, json.dumps(snapshot), now),
+        )
+        if not read:
+            return []
+        rows = connection.execute(
+            "SELECT snapshot FROM worker_metrics WHERE updated_at >= ?",
+            (now - self.stale_seconds,),
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.publish_interval)
+            try:
+                await self.publish()
+            except Exception:
+                # A failed publish must not stop the exporter, the next one retries
+                logger.exception("Failed to publish the metrics")
+
+
+metrics_exporter: LocalMetricsExporter = (
+    SqliteMetricsExporter(
+        settings.metrics_sqlite_path,
+        publish_interval=settings.metrics_publish_interval_seconds,
+    )
+    if settings.metrics_aggregation == "sqlite"
+    else LocalMetricsExporter()
+)
+"""Exporter of the metrics of the application, started by the application"""
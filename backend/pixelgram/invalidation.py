@@ -0,0 +1,219 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from collections.abc import Callable
+from uuid import uuid4
+
+from pixelgram.settings import settings
+
+logger = logging.getLogger(__name__)
+
+ENTITY_POST = "post"
+"""Entity of a post, its counters or its comments, identified by the post id"""
+
+ENTITY_SAVED = "saved"
+"""Entity of the saved posts of a user, identified by the user id"""
+
+ENTITY_USER = "user"
+"""Entity of a user's account, identified by the user id"""
+
+ENTITY_SESSION = "session"
+"""Entity of a login session, identified by the id of its refresh token"""
+
+ChangeHandler = Callable[[str, str], None]
+"""Callback invoked with the entity and the id of every change"""
+
+
+class LocalInvalidationBus:
+    """
+    Bus carrying entity change events from the services to the cache layers.
+
+    This implementation only reaches subscribers of the current process, which
+    is enough when a single worker serves the application. Handlers are called
+    synchronously on publish, so they must be cheap, e.g. dropping a cache entry.
+    """
+
+    def __init__(self):
+        self._handlers: list[ChangeHandler] = []
+
+    def subscribe(self, handler: ChangeHandler) -> None:
+        """
+        Register a handler called for every change, whichever worker made it.
+        Args:
+            handler (ChangeHandler): The callback taking the entity and its id.
+        """
+        self._handlers.append(handler)
+
+    def publish(self, entity: str, entity_id: str) -> None:
+        """
+        Announce that an entity changed, once the change is committed.
+        Args:
+            entity (str): The kind of entity that changed, one of the `ENTITY_*` constants.
+            entity_id (str): The id of the entity that changed.
+        """
+        self._dispatch(entity, entity_id)
+
+    def start(self) -> None:
+        """Start delivering changes from other workers, if the bus supports it."""
+
+    async def stop(self) -> None:
+        """Stop delivering changes from other workers."""
+
+    def _dispatch(self, entity: str, entity_id: str) -> None:
+        for handler in self._handlers:
+            handler(entity, entity_id)
+
+
+class SqliteInvalidationBus(LocalInvalidationBus):
+    """
+    Bus shared by the workers of a host through a change table in a SQLite file.
+
+    Changes are delivered to local subscribers right away, then appended to the
+    table, which every worker polls for changes made by the others. Publishing
+    never touches the file: changes are written in batches by the poller, so
+    the other workers see them within about one polling interval. Rows older
+    than `retention_seconds` are pruned, and a worker starting up only sees the
+    changes made after it joined.
+    """
+
+    def __init__(
+        self, path: str, poll_interval: float = 0.5, retention_seconds: float = 60
+    ):
+        super().__init__()
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+        self._outbox: list[tuple[str, str]] = []
+        self._connection: sqlite3.Connection | None = None
+        self._worker_id = ""
+        self._last_id = 0
+        self._task: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def publish(self, entity: str, entity_id: str) -> None:
+        super().publish(entity, entity_id)
+        self._outbox.append((entity, entity_id))
+
+    def open(self) -> None:
+        """Open the change table and skip the changes made before joining."""
+        if self._connection is not None:
+            return
+        # The id is drawn per process, as workers may be forked after import
+        self._worker_id = uuid4().hex
+        self._connection = sqlite3.connect(
+            self.path, isolation_level=None, check_same_thread=False
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("PRAGMA busy_timeout=5000")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS entity_change ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, worker TEXT NOT NULL, "
+            "entity TEXT NOT NULL, entity_id TEXT NOT NULL, changed_at REAL NOT NULL)"
+        )
+        row = self._connection.execute("SELECT MAX(id) FROM entity_change").fetchone()
+        self._last_id = row[0] or 0
+
+    def close(self) -> None:
+        """Close the change table."""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def start(self) -> None:
+        if not self.running:
+            self.open()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self.running:
+            self._task.cancel()  # type: ignore
+            try:
+                await self._task  # type: ignore
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._connection is not None:
+            # Hand the last changes over to the other workers
+            await self.sync()
+            self.close()
+
+    async def sync(self) -> None:
+        """Write the pending local changes and deliver the ones made by other workers."""
+        # The connection is not safe to share between threads at once
+        async with self._lock:
+            outbox, self._outbox = self._outbox, []
+            exchange = asyncio.ensure_future(asyncio.to_thread(self._exchange, outbox))
+            cancelled = False
+            while not exchange.done():
+                try:
+                    await asyncio.wait([exchange])
+                except asyncio.CancelledError:
+                    # The thread keeps using the connection, wait for it anyway
+                    cancelled = True
+            try:
+                changes = exchange.result()
+            except Exception:
+                # Keep the local changes so the next sync retries them
+                self._outbox[:0] = outbox
+                raise
+        for entity, entity_id in changes:
+            self._dispatch(entity, entity_id)
+        if cancelled:
+            raise asyncio.CancelledError
+
+    def _exchange(self, outbox: list[tuple[str, str]]) -> list[tuple[str, str]]:
+        connection = self._connection
+        assert connection is not None
+        now = time.time()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.executemany(
+                "INSERT INTO entity_change (worker, entity, entity_id, changed_at) "
+                "VALUES (?, ?, ?, ?)",
+                [
+                    (self._worker_id, entity, entity_id, now)
+                    for entity, entity_id in outbox
+                ],
+            )
+            rows = connection.execute(
+                "SELECT id, worker, entity, entity_id FROM entity_change WHERE id > ? "
+                "ORDER BY id",
+                (self._last_id,),
+            ).fetchall()
+            connection.execute(
+                "DELETE FROM entity_change WHERE changed_at < ?",
+                (now - self.retention_seconds,),
+            )
+        if rows:
+            self._last_id = rows[-1][0]
+        return [
+            (entity, entity_id)
+            for _, worker, entity, entity_id in rows
+            if worker != self._worker_id
+        ]
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.sync()
+            except Exception:
+                # A failed sync must not stop the bus, the next one retries
+                logger.exception("Failed to sync the invalidation bus")
+
+
+invalidation_bus: LocalInvalidationBus = (
+    SqliteInvalidationBus(
+        settings.invalidation_bus_path,
+        poll_interval=settings.invalidation_bus_poll_interval_seconds,
+    )
+    if settings.invalidation_bus == "sqlite"
+    else LocalInvalidationBus()
+)
+"""Invalidation bus of the application, started by the application"""
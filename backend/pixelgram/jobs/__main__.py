@@ -0,0 +1,109 @@
+import argparse
+import asyncio
+
+from pixelgram.db import async_session_maker, create_db_and_tables
+from pixelgram.jobs.outbox import outbox_worker
+from pixelgram.jobs.purge import tombstone_purger
+from pixelgram.jobs.reconcile import reconcile_images
+from pixelgram.jobs.tokens import token_reaper
+from pixelgram.services.supabase_client import SupabaseStorageClient
+
+
+async def run_outbox(args: argparse.Namespace) -> None:
+    await create_db_and_tables()
+    if args.once:
+        count = await outbox_worker.drain()
+        print(f"Handled {count} outbox messages.")
+        return
+    outbox_worker.start()
+    try:
+        # Runs until interrupted
+        await asyncio.Event().wait()
+    finally:
+        await outbox_worker.stop()
+
+
+async def run_purge(args: argparse.Namespace) -> None:
+    await create_db_and_tables()
+    count = await tombstone_purger.purge()
+    print(f"Purged {count} deleted posts and comments.")
+    if args.drain_outbox:
+        count = await outbox_worker.drain()
+        print(f"Handled {count} outbox messages.")
+
+
+async def run_reap_tokens(args: argparse.Namespace) -> None:
+    await create_db_and_tables()
+    count = await token_reaper.reap()
+    print(f"Deleted {count} expired access tokens.")
+
+
+async def run_reconcile_images(args: argparse.Namespace) -> None:
+    report = await reconcile_images(
+        async_session_maker,
+        SupabaseStorageClient(),
+        page_size=args.page_size,
+        min_age_seconds=args.min_age_seconds,
+        delete=args.delete,
+        on_orphan=lambda path: print(f"Orphan: {path}"),
+    )
+    print(
+        f"Scanned {report.scanned} objects, found {report.orphans} orphans, "
+        f"deleted {report.deleted}."
+    )
+    if not args.delete and report.orphans:
+        print("Dry run, rerun with --delete to delete the orphans.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="python -m pixelgram.jobs",
+        description="Run the background jobs outside of the API workers.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    outbox = commands.add_parser("outbox", help="drain the outbox")
+    outbox.add_argument(
+        "--once",
+        action="store_true",
+        help="handle the due messages, then exit instead of polling",
+    )
+    outbox.set_defaults(run=run_outbox)
+
+    purge = commands.add_parser(
+        "purge", help="remove the deleted posts and comments past their grace period"
+    )
+    purge.add_argument(
+        "--drain-outbox",
+        action="store_true",
+        help="also delete the images of the purged posts before exiting",
+    )
+    purge.set_defaults(run=run_purge)
+
+    reap_tokens = commands.add_parser(
+        "reap-tokens", help="delete the expired access tokens"
+    )
+    reap_tokens.set_defaults(run=run_reap_tokens)
+
+    reconcile = commands.add_parser(
+        "reconcile-images", help="find the stored images no post references"
+    )
+    reconcile.add_argument(
+        "--delete",
+        action="store_true",
+        help="delete the orphans instead of listing them",
+    )
+    reconcile.add_argument("--page-size", type=int, default=1000)
+    reconcile.add_argument(
+        "--min-age-seconds",
+        type=float,
+        default=3600,
+        help="skip the objects created more recently, as their post may not exist yet",
+    )
+    reconcile.set_defaults(run=run_reconcile_images)
+
+    args = parser.parse_args()
+    try:
+        asyncio.run(args.run(args))
+    except KeyboardInterrupt:
+        pass
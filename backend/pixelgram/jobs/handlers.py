@@ -0,0 +1,28 @@
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from pydantic import HttpUrl
+
+from pixelgram.services.supabase_client import SupabaseStorageClient
+
+OutboxHandler = Callable[[dict[str, Any]], Awaitable[None]]
+"""Coroutine performing the side effect of an outbox message from its payload"""
+
+STORAGE_DELETE = "storage.delete"
+"""Outbox message deleting an image from storage, with payload `{"image_url": ...}`"""
+
+
+async def delete_stored_image(payload: dict[str, Any]) -> None:
+    """
+    Delete an image from storage. Deleting a missing image succeeds, so the
+    message can safely be delivered more than once.
+    Args:
+        payload (dict[str, Any]): The message payload, holding the image URL.
+    """
+    await SupabaseStorageClient().delete(HttpUrl(payload["image_url"]))
+
+
+OUTBOX_HANDLERS: dict[str, OutboxHandler] = {
+    STORAGE_DELETE: delete_stored_image,
+}
+"""Handlers of the outbox messages, by message kind"""
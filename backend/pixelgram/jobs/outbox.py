@@ -0,0 +1,256 @@
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Any
+from uuid import uuid4
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from pixelgram.db import async_session_maker
+from pixelgram.jobs.handlers import OUTBOX_HANDLERS, STORAGE_DELETE, OutboxHandler
+from pixelgram.metrics import metrics
+from pixelgram.models.outbox import OutboxMessage
+from pixelgram.settings import settings
+
+
+async def enqueue(
+    session: AsyncSession, kind: str, payload: dict[str, Any], idempotency_key: str
+) -> None:
+    """
+    Add a message to the outbox, as part of the session's current transaction.
+    The message is only delivered if the transaction commits, and a message
+    with the same idempotency key is never enqueued twice.
+    Args:
+        session (AsyncSession): The session making the change the message follows from.
+        kind (str): The kind of message, one of the keys of `OUTBOX_HANDLERS`.
+        payload (dict[str, Any]): The JSON payload passed to the handler.
+        idempotency_key (str): The key identifying the side effect.
+    """
+    existing = await session.scalar(
+        select(OutboxMessage.id).where(OutboxMessage.idempotency_key == idempotency_key)
+    )
+    if existing is None:
+        session.add(
+            OutboxMessage(kind=kind, payload=payload, idempotency_key=idempotency_key)
+        )
+
+
+async def enqueue_image_deletion(session: AsyncSession, image_url: str) -> None:
+    """
+    Queue the deletion of an image from storage, as part of the session's current
+    transaction, e.g. the one deleting the post it belongs to.
+    Args:
+        session (AsyncSession): The session deleting the image's post.
+        image_url (str): The public URL of the image.
+    """
+    await enqueue(
+        session,
+        STORAGE_DELETE,
+        {"image_url": image_url},
+        idempotency_key=f"{STORAGE_DELETE}:{image_url}",
+    )
+
+
+class OutboxWorker:
+    """
+    Drains the outbox, performing the side effects of the committed messages.
+
+    Due messages are claimed in batches with a lease: claiming sets a token and
+    pushes their availability `lease_seconds` ahead, so several workers can
+    drain the same outbox without running a message twice, and the messages of
+    a worker that dies are picked up again once the lease expires. Handlers run
+    concurrently, outside of any transaction. A failed message is retried with
+    jittered exponential backoff, up to `max_attempts` attempts, after which it
+    is left in the table with its last error for inspection.
+    """
+
+    def __init__(
+        self,
+        session_maker: async_sessionmaker[AsyncSession],
+        handlers: dict[str, OutboxHandler],
+        batch_size: int = 32,
+        poll_interval: float = 5,
+        max_attempts: int = 8,
+        lease_seconds: float = 60,
+        retry_base_delay: float = 1,
+        retry_max_delay: float = 300,
+        retention_seconds: float = 7 * 24 * 3600,
+    ):
+        self.session_maker = session_maker
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.retention_seconds = retention_seconds
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Start draining the outbox on the running event loop."""
+        if not self.running:
+            # The event is bound to the event loop it is created in
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Stop draining the outbox. Messages being handled are abandoned and
+        picked up again once their lease expires.
+        """
+        if self.running:
+            self._task.cancel()  # type: ignore
+            try:
+                await self._task  # type: ignore
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def wake(self) -> None:
+        """Drain the outbox now rather than at the next poll, e.g. after enqueuing."""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def run_once(self) -> int:
+        """
+        Claim a batch of due messages and handle them.
+        Returns:
+            int: The number of messages claimed.
+        """
+        messages = await self._claim()
+        if not messages:
+            return 0
+
+        results = await asyncio.gather(
+            *(self._handle(message) for message in messages), return_exceptions=True
+        )
+        now = datetime.now(timezone.utc)
+        async with self.session_maker() as session:
+            async with session.begin():
+                for message, result in zip(messages, results):
+                    await session.execute(
+                        update(OutboxMessage)
+                        .where(
+                            OutboxMessage.id == message.id,
+                            OutboxMessage.claim_token == message.claim_token,
+                        )
+                        .values(self._outcome(message, result, now))
+                    )
+        return len(messages)
+
+    async def drain(self) -> int:
+        """
+        Handle the due messages until there are none left.
+        Returns:
+            int: The number of messages handled.
+        """
+        total = 0
+        while count := await self.run_once():
+            total += count
+        return total
+
+    async def prune(self) -> None:
+        """Delete the messages handled more than `retention_seconds` ago."""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.retention_seconds)
+        async with self.session_maker() as session:
+            async with session.begin():
+                await session.execute(
+                    delete(OutboxMessage).where(OutboxMessage.processed_at < cutoff)
+                )
+
+    async def _claim(self) -> list[OutboxMessage]:
+        now = datetime.now(timezone.utc)
+        token = uuid4().hex
+        async with self.session_maker() as session:
+            async with session.begin():
+                due = (
+                    select(OutboxMessage.id)
+                    .where(
+                        OutboxMessage.processed_at.is_(None),
+                        OutboxMessage.attempts < self.max_attempts,
+                        OutboxMessage.available_at <= now,
+                    )
+                    .order_by(OutboxMessage.id)
+                    .limit(self.batch_size)
+                )
+                ids = list((await session.scalars(due)).all())
+                if not ids:
+                    return []
+                # Re-checking availability lets a single worker win each message
+                await session.execute(
+                    update(OutboxMessage)
+                    .where(
+                        OutboxMessage.id.in_(ids),
+                        OutboxMessage.processed_at.is_(None),
+                        OutboxMessage.available_at <= now,
+                    )
+                    .values(
+                        claim_token=token,
+                        available_at=now + timedelta(seconds=self.lease_seconds),
+                    )
+                )
+                claimed = await session.scalars(
+                    select(OutboxMessage).where(OutboxMessage.claim_token == token)
+                )
+                return list(claimed.all())
+
+    async def _handle(self, message: OutboxMessage) -> None:
+        handler = self.handlers.get(message.kind)
+        if handler is None:
+            raise LookupError(f"No handler for outbox messages of kind {message.kind}")
+        await handler(message.payload)
+
+    def _outcome(
+        self, message: OutboxMessage, result: BaseException | None, now: datetime
+    ) -> dict[str, Any]:
+        if result is None:
+            metrics.increment("outbox_messages_total", kind=message.kind, outcome="ok")
+            return {"processed_at": now, "claim_token": None, "last_error": None}
+
+        attempts = message.attempts + 1
+        outcome = "dead" if attempts >= self.max_attempts else "retry"
+        metrics.increment("outbox_messages_total", kind=message.kind, outcome=outcome)
+        delay = random.uniform(
+            0, min(self.retry_max_delay, self.retry_base_delay * 2**attempts)
+        )
+        return {
+            "attempts": attempts,
+            "available_at": now + timedelta(seconds=delay),
+            "claim_token": None,
+            "last_error": f"{type(result).__name__}: {result}"[:1000],
+        }
+
+    async def _run(self) -> None:
+        assert self._wake is not None
+        while True:
+            self._wake.clear()
+            try:
+                count = await self.run_once()
+                if not count:
+                    await self.prune()
+            except Exception:
+                # A failed batch must not stop the worker, its leases expire and it is retried
+                count = 0
+            if count < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+
+outbox_worker = OutboxWorker(
+    async_session_maker,
+    OUTBOX_HANDLERS,
+    batch_size=settings.outbox_batch_size,
+    poll_interval=settings.outbox_poll_interval_seconds,
+    max_attempts=settings.outbox_max_attempts,
+    lease_seconds=settings.outbox_lease_seconds,
+)
+"""Outbox worker of the application, started by the application if enabled"""
@@ -0,0 +1,153 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from pixelgram.db import async_session_maker
+from pixelgram.jobs.outbox import enqueue_image_deletion, outbox_worker
+from pixelgram.models.post import Post
+from pixelgram.models.post_comment import PostComment
+from pixelgram.models.post_like import PostLike
+from pixelgram.models.post_saved import PostSaved
+from pixelgram.settings import settings
+
+
+async def purge_tombstones(session: AsyncSession, cutoff: datetime, limit: int) -> int:
+    """
+    Remove for good a batch of the posts and comments tombstoned before `cutoff`,
+    within the session's current transaction. The likes, comments and saves of
+    the posts are removed with them, and the deletion of their images is queued
+    in the outbox.
+    Args:
+        session (AsyncSession): The session to delete with.
+        cutoff (datetime): Only rows tombstoned before this time are removed.
+        limit (int): The maximum number of posts, and of comments, to remove.
+    Returns:
+        int: The number of posts and comments removed.
+    """
+    posts = (
+        await session.execute(
+            select(Post.id, Post.image_url)
+            .where(Post.deleted_at < cutoff)
+            .order_by(Post.deleted_at)
+            .limit(limit)
+        )
+    ).all()
+    post_ids = [post.id for post in posts]
+    if post_ids:
+        for post in posts:
+            await enqueue_image_deletion(session, post.image_url)
+        # Children are deleted explicitly, as SQLite may not enforce the cascades
+        for model in (PostLike, PostComment, PostSaved):
+            await session.execute(delete(model).where(model.post_id.in_(post_ids)))
+        await session.execute(delete(Post).where(Post.id.in_(post_ids)))
+
+    comment_ids = list(
+        await session.scalars(
+            select(PostComment.id)
+            .where(PostComment.deleted_at < cutoff)
+            .order_by(PostComment.deleted_at)
+            .limit(limit)
+        )
+    )
+    if comment_ids:
+        await session.execute(
+            delete(PostComment).where(PostComment.id.in_(comment_ids))
+        )
+
+    return len(post_ids) + len(comment_ids)
+
+
+class TombstonePurger:
+    """
+    Removes the tombstoned posts and comments in the background.
+
+    User-facing deletes only set a tombstone, so the expensive part, i.e. the
+    cascades and the storage calls, is done here in small batches, each in its
+    own short transaction with a pause in between, so the purge never holds
+    locks for long. Rows are kept `grace_seconds` after their deletion. When
+    `hours` is set, the purger only runs during these hours (UTC), typically the
+    low traffic ones.
+    """
+
+    def __init__(
+        self,
+        session_maker: async_sessionmaker[AsyncSession],
+        interval: float = 15 * 60,
+        grace_seconds: float = 60 * 60,
+        batch_size: int = 100,
+        batch_pause: float = 1,
+        hours: list[int] | None = None,
+    ):
+        self.session_maker = session_maker
+        self.interval = interval
+        self.grace_seconds = grace_seconds
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.hours = set(hours or [])
+        self._task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Start purging periodically on the running event loop."""
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop purging, the batch in progress is rolled back."""
+        if self.running:
+            self._task.cancel()  # type: ignore
+            try:
+                await self._task  # type: ignore
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def is_purge_time(self, now: datetime) -> bool:
+        """Whether the purger may run at the given time."""
+        return not self.hours or now.hour in self.hours
+
+    async def purge(self) -> int:
+        """
+        Remove the rows tombstoned for longer than the grace period, batch by batch.
+        Returns:
+            int: The number of posts and comments removed.
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.grace_seconds)
+        total = 0
+        while True:
+            async with self.session_maker() as session:
+                async with session.begin():
+                    count = await purge_tombstones(session, cutoff, self.batch_size)
+            total += count
+            if count:
+                outbox_worker.wake()
+            if count < self.batch_size:
+                return total
+            await asyncio.sleep(self.batch_pause)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            if not self.is_purge_time(datetime.now(timezone.utc)):
+                continue
+            try:
+                await self.purge()
+            except Exception:
+                # A failed purge must not stop the purger, the next one retries
+                pass
+
+
+tombstone_purger = TombstonePurger(
+    async_session_maker,
+    interval=settings.purge_interval_seconds,
+    grace_seconds=settings.purge_grace_seconds,
+    batch_size=settings.purge_batch_size,
+    batch_pause=settings.purge_batch_pause_seconds,
+    hours=settings.purge_hours,
+)
+"""Purger of the application, started by the application if enabled"""
@@ -0,0 +1,86 @@
+from collections.abc import Callable
+from datetime import datetime, timedelta, timezone
+from typing import Any, NamedTuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from pixelgram.models.post import Post
+from pixelgram.services.supabase_client import SupabaseStorageClient
+
+
+class ReconcileReport(NamedTuple):
+    """Outcome of a reconciliation of the stored images against the posts"""
+
+    scanned: int
+    orphans: int
+    deleted: int
+
+
+def _is_old_enough(obj: dict[str, Any], cutoff: datetime) -> bool:
+    # Folders have no id, and recent objects may belong to a post being created
+    if obj.get("id") is None or not obj.get("created_at"):
+        return False
+    return datetime.fromisoformat(obj["created_at"]) < cutoff
+
+
+async def reconcile_images(
+    session_maker: async_sessionmaker[AsyncSession],
+    storage: SupabaseStorageClient,
+    page_size: int = 1000,
+    min_age_seconds: float = 3600,
+    delete: bool = False,
+    on_orphan: Callable[[str], None] | None = None,
+) -> ReconcileReport:
+    """
+    Find the images of the bucket that no post references, and optionally delete them.
+
+    The bucket is listed page by page, and each page is diffed against the posts
+    with a single indexed `IN` query, so memory stays bounded by the page size
+    however large the bucket is. Orphans of a page are deleted in one request.
+    Objects younger than `min_age_seconds` are skipped, as they may belong to an
+    upload that is not finalized yet.
+    Args:
+        session_maker (async_sessionmaker[AsyncSession]): The factory of database sessions.
+        storage (SupabaseStorageClient): The storage client.
+        page_size (int, optional): The number of objects listed at once. Defaults to 1000.
+        min_age_seconds (float, optional): The minimum age of an orphan. Defaults to 3600.
+        delete (bool, optional): Whether to delete the orphans, or only report them.
+            Defaults to False.
+        on_orphan (Callable[[str], None] | None, optional): Called with the path
+            of every orphan found.
+    Returns:
+        ReconcileReport: The number of objects scanned, of orphans and of deletions.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=min_age_seconds)
+    scanned = orphans = deleted = 0
+    offset = 0
+    while True:
+        page = await storage.list_objects(page_size, offset)
+        scanned += len(page)
+
+        urls = {
+            str(storage.public_url(obj["name"])): obj["name"]
+            for obj in page
+            if _is_old_enough(obj, cutoff)
+        }
+        async with session_maker() as session:
+            referenced = set(
+                await session.scalars(
+                    select(Post.image_url).where(Post.image_url.in_(list(urls)))
+                )
+            )
+        page_orphans = [path for url, path in urls.items() if url not in referenced]
+
+        orphans += len(page_orphans)
+        if on_orphan is not None:
+            for path in page_orphans:
+                on_orphan(path)
+        if delete and page_orphans:
+            await storage.delete_many(page_orphans)
+            deleted += len(page_orphans)
+
+        if len(page) < page_size:
+            return ReconcileReport(scanned, orphans, deleted)
+        # Deleted objects no longer take part in the listing offsets
+        offset += len(page) - (len(page_orphans) if delete else 0)
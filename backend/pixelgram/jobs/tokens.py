@@ -0,0 +1,116 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, delete, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from pixelgram.db import async_session_maker
+from pixelgram.metrics import metrics
+from pixelgram.models.access_token import AccessToken
+from pixelgram.revocation import revocation_list
+from pixelgram.settings import settings
+
+
+class TokenReaper:
+    """
+    Deletes the expired access tokens in the background.
+
+    Expired tokens are deleted in batches, each in its own short transaction,
+    so the table, and with it every authenticated lookup, stays as small as the
+    number of live sessions. The size of the table is reported in the
+    `access_tokens` gauge after each run.
+    """
+
+    def __init__(
+        self,
+        session_maker: async_sessionmaker[AsyncSession],
+        lifetime_seconds: float,
+        interval: float = 60 * 60,
+        batch_size: int = 1000,
+    ):
+        self.session_maker = session_maker
+        self.lifetime_seconds = lifetime_seconds
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Start reaping periodically on the running event loop."""
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop reaping."""
+        if self.running:
+            self._task.cancel()  # type: ignore
+            try:
+                await self._task  # type: ignore
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def reap(self) -> int:
+        """
+        Delete the expired tokens, batch by batch.
+        Returns:
+            int: The number of tokens deleted.
+        """
+        now = datetime.now(timezone.utc)
+        expired = or_(
+            AccessToken.expires_at <= now,
+            # Tokens issued before expiries existed expire a lifetime after creation
+            and_(
+                AccessToken.expires_at.is_(None),
+                AccessToken.created_at
+                <= now - timedelta(seconds=self.lifetime_seconds),
+            ),
+        )
+        total = 0
+        while True:
+            async with self.session_maker() as session:
+                async with session.begin():
+                    tokens = list(
+                        await session.scalars(
+                            select(AccessToken.token)
+                            .where(expired)
+                            .limit(self.batch_size)
+                        )
+                    )
+                    if tokens:
+                        await session.execute(
+                            delete(AccessToken).where(AccessToken.token.in_(tokens))
+                        )
+            total += len(tokens)
+            if len(tokens) < self.batch_size:
+                break
+
+        # Revocations of signed access tokens are only needed until these expire
+        await revocation_list.prune_stored()
+
+        metrics.increment("access_tokens_reaped_total", total)
+        async with self.session_maker() as session:
+            size = await session.scalar(select(func.count()).select_from(AccessToken))
+        metrics.set_gauge("access_tokens", size or 0)
+        return total
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.reap()
+            except Exception:
+                # A failed run must not stop the reaper, the next one retries
+                pass
+            await asyncio.sleep(self.interval)
+
+
+token_reaper = TokenReaper(
+    async_session_maker,
+    lifetime_seconds=settings.auth_token_lifetime_seconds,
+    interval=settings.token_reaper_interval_seconds,
+    batch_size=settings.token_reaper_batch_size,
+)
+"""Expired token reaper of the application, started by the application if enabled"""
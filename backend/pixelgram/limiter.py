@@ -1,4 +1,274 @@
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+import asyncio
+import math
+import sqlite3
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
 
-limiter = Limiter(key_func=get_remote_address)
+from fastapi import Depends, HTTPException, status
+
+from pixelgram.auth import current_active_user
+from pixelgram.models.user import User
+from pixelgram.settings import settings
+
+
+def refill_bucket(
+    tokens: float, updated_at: float, now: float, rate: float, capacity: float
+) -> float:
+    """
+    Compute the tokens of a bucket at `now`, from its last stored state.
+    Args:
+        tokens (float): The tokens left at the last update.
+        updated_at (float): The time of the last update, in seconds.
+        now (float): The current time, in seconds.
+        rate (float): The number of tokens added per second.
+        capacity (float): The maximum number of tokens of the bucket.
+    Returns:
+        float: The tokens currently in the bucket.
+    """
+    return min(capacity, tokens + max(0.0, now - updated_at) * rate)
+
+
+def take_from_bucket(
+    tokens: float, rate: float, cost: float
+) -> tuple[float, bool, float]:
+    """
+    Try to take `cost` tokens from a bucket holding `tokens`.
+    Returns:
+        tuple[float, bool, float]: The tokens left, whether the request is allowed
+            and, if not, the number of seconds until enough tokens are available.
+    """
+    if tokens >= cost:
+        return tokens - cost, True, 0.0
+    return tokens, False, (cost - tokens) / rate
+
+
+class MemoryBucketStorage:
+    """
+    Token buckets held in the memory of the current worker.
+    Limits are enforced per worker, so this is only accurate with a single worker.
+    """
+
+    def __init__(self, max_buckets: int = 10_000):
+        self.max_buckets = max_buckets
+        # Tokens, last update, rate and capacity of each bucket, the limits of
+        # a bucket being needed to tell whether it is full when pruning
+        self._buckets: dict[str, tuple[float, float, float, float]] = {}
+
+    async def take(
+        self, key: str, rate: float, capacity: float, cost: float = 1
+    ) -> tuple[bool, float]:
+        """
+        Try to take tokens from the bucket of a key, creating it full if missing.
+        Args:
+            key (str): The key of the bucket.
+            rate (float): The number of tokens added per second.
+            capacity (float): The maximum number of tokens of the bucket.
+            cost (float, optional): The number of tokens to take. Defaults to 1.
+        Returns:
+            tuple[bool, float]: Whether the request is allowed and, if not, the
+                number of seconds to wait before retrying.
+        """
+        now = time.monotonic()
+        tokens, updated_at, _, _ = self._buckets.get(
+            key, (capacity, now, rate, capacity)
+        )
+        tokens = refill_bucket(tokens, updated_at, now, rate, capacity)
+        tokens, allowed, retry_after = take_from_bucket(tokens, rate, cost)
+        self._buckets[key] = (tokens, now, rate, capacity)
+
+        # Full buckets carry no state, drop them once in a while so the map stays small
+        if len(self._buckets) > self.max_buckets:
+            self._buckets = {
+                k: (t, u, r, c)
+                for k, (t, u, r, c) in self._buckets.items()
+                if refill_bucket(t, u, now, r, c) < c
+            }
+        return allowed, retry_after
+
+
+class SqliteBucketStorage:
+    """
+    Token buckets stored in a SQLite file, shared by all the workers of a host.
+    Each take is a single immediate transaction on the bucket's row. Rows store
+    when their bucket will be full again, and full buckets carry no state, so
+    they are deleted every `prune_interval_seconds`.
+    """
+
+    def __init__(self, path: str, prune_interval_seconds: float = 60):
+        self.path = path
+        self.prune_interval_seconds = prune_interval_seconds
+        self._connection: sqlite3.Connection | None = None
+        self._lock = asyncio.Lock()
+        self._pruned_at = 0.0
+
+    async def take(
+        self, key: str, rate: float, capacity: float, cost: float = 1
+    ) -> tuple[bool, float]:
+        """See `MemoryBucketStorage.take`."""
+        # The connection is not safe to share between threads at once
+        async with self._lock:
+            return await asyncio.to_thread(self._take, key, rate, capacity, cost)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            connection = sqlite3.connect(
+                self.path, isolation_level=None, check_same_thread=False
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA busy_timeout=5000")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS token_bucket ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, "
+                "full_at REAL NOT NULL DEFAULT 0)"
+            )
+            columns = [
+                row[1] for row in connection.execute("PRAGMA table_info(token_bucket)")
+            ]
+            if "full_at" not in columns:
+                # Buckets from before are pruned on the next pass, as if full
+                connection.execute(
+                    "ALTER TABLE token_bucket ADD COLUMN full_at REAL NOT NULL DEFAULT 0"
+                )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_token_bucket_full_at "
+                "ON token_bucket (full_at)"
+            )
+            self._connection = connection
+        return self._connection
+
+    def _take(
+        self, key: str, rate: float, capacity: float, cost: float
+    ) -> tuple[bool, float]:
+        connection = self._connect()
+        # Wall clock time, as the monotonic clock is not shared between processes
+        now = time.time()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute(
+                "SELECT tokens, updated_at FROM token_bucket WHERE key = ?", (key,)
+            ).fetchone()
+            tokens, updated_at = row if row else (capacity, now)
+            tokens = refill_bucket(tokens, updated_at, now, rate, capacity)
+            tokens, allowed, retry_after = take_from_bucket(tokens, rate, cost)
+            full_at = now + (capacity - tokens) / rate
+            connection.execute(
+                "INSERT INTO token_bucket (key, tokens, updated_at, full_at) "
+                "VALUES (?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+                "tokens = excluded.tokens, updated_at = excluded.updated_at, "
+                "full_at = excluded.full_at",
+                (key, tokens, now, full_at),
+            )
+            if now - self._pruned_at >= self.prune_interval_seconds:
+                connection.execute(
+                    "DELETE FROM token_bucket WHERE full_at <= ?", (now,)
+                )
+                self._pruned_at = now
+        return allowed, retry_after
+
+
+REDIS_TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(bucket[1]) or capacity
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return {allowed, tostring(retry_after)}
+"""
+"""Atomic token bucket take, run server-side so concurrent workers never race"""
+
+
+class RedisBucketStorage:
+    """
+    Token buckets stored in a Redis-protocol server, shared by all the workers
+    of every host. Requires the `redis` extra of the package.
+    """
+
+    def __init__(self, url: str):
+        try:
+            from redis.asyncio import Redis
+        except ImportError as e:
+            raise ImportError(
+                "The redis rate limit storage requires the `redis` extra, "
+                "e.g. `uv sync --extra redis`."
+            ) from e
+        self._client: Any = Redis.from_url(url)
+        self._script = self._client.register_script(REDIS_TAKE_SCRIPT)
+
+    async def take(
+        self, key: str, rate: float, capacity: float, cost: float = 1
+    ) -> tuple[bool, float]:
+        """See `MemoryBucketStorage.take`."""
+        allowed, retry_after = await self._script(
+            keys=[f"pixelgram:bucket:{key}"], args=[rate, capacity, cost]
+        )
+        return bool(allowed), float(retry_after)
+
+
+BucketStorage = MemoryBucketStorage | SqliteBucketStorage | RedisBucketStorage
+
+
+def create_bucket_storage() -> BucketStorage:
+    """Create the token bucket storage configured in the settings."""
+    if settings.rate_limit_storage == "sqlite":
+        return SqliteBucketStorage(settings.rate_limit_sqlite_path)
+    if settings.rate_limit_storage == "redis":
+        return RedisBucketStorage(settings.rate_limit_redis_url)
+    return MemoryBucketStorage()
+
+
+bucket_storage = create_bucket_storage()
+"""Storage of the token buckets of the per-user rate limits"""
+
+
+def user_rate_limit(
+    name: str, capacity: int, period_seconds: float
+) -> Callable[..., Awaitable[None]]:
+    """
+    Create a dependency limiting a route per authenticated user with a token bucket.
+    Users may burst up to `capacity` requests, then get `capacity` more requests
+    spread over every `period_seconds`.
+    Args:
+        name (str): The name of the limit, so different routes use different buckets.
+        capacity (int): The size of the bucket.
+        period_seconds (float): The time it takes to refill an empty bucket.
+    Returns:
+        The dependency, raising a 429 error with a Retry-After header when exceeded.
+    """
+    rate = capacity / period_seconds
+
+    async def check_rate_limit(user: User = Depends(current_active_user)) -> None:
+        allowed, retry_after = await bucket_storage.take(
+            f"{name}:{user.id}", rate, capacity
+        )
+        if not allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"Rate limit exceeded: {capacity} per {int(period_seconds)} seconds",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+
+    return check_rate_limit
+
+
+caption_rate_limit = user_rate_limit(
+    "captions",
+    capacity=settings.caption_rate_limit_capacity,
+    period_seconds=settings.caption_rate_limit_period_seconds,
+)
+"""Rate limit of the caption generation, the most expensive route"""
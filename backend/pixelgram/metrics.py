@@ -0,0 +1,192 @@
+from bisect import bisect_left
+from collections.abc import Iterator
+from typing import Any
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+"""Default histogram buckets, in seconds"""
+
+LabelSet = tuple[tuple[str, str], ...]
+"""Sorted label names and values identifying a series of a metric"""
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+"""Content type of the Prometheus text exposition format"""
+
+
+class Histogram:
+    """Distribution of observed values over cumulative buckets."""
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    In-process registry of counters, gauges and histograms.
+    Series are identified by the metric name and a set of labels, e.g.
+    `metrics.increment("bulkhead_rejections_total", dependency="supabase")`.
+    """
+
+    def __init__(self):
+        self.counters: dict[str, dict[LabelSet, float]] = {}
+        self.gauges: dict[str, dict[LabelSet, float]] = {}
+        self.histograms: dict[str, dict[LabelSet, Histogram]] = {}
+
+    def increment(self, name: str, value: float = 1, **labels: Any) -> None:
+        """Increase a counter."""
+        series = self.counters.setdefault(name, {})
+        key = _label_set(labels)
+        series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels: Any) -> None:
+        """Set a gauge to the given value."""
+        self.gauges.setdefault(name, {})[_label_set(labels)] = value
+
+    def add_gauge(self, name: str, value: float, **labels: Any) -> None:
+        """Move a gauge up or down by the given value."""
+        series = self.gauges.setdefault(name, {})
+        key = _label_set(labels)
+        series[key] = series.get(key, 0) + value
+
+    def observe(
+        self,
+        name: str,
+        value: float,
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+        **labels: Any,
+    ) -> None:
+        """
+        Record an observation, e.g. a duration in seconds, in a histogram.
+        The buckets are only used by the first observation of a series.
+        """
+        series = self.histograms.setdefault(name, {})
+        key = _label_set(labels)
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram(buckets)
+        histogram.observe(value)
+
+    def get(self, name: str, **labels: Any) -> float:
+        """Get the value of a counter or gauge, 0 if it was never recorded."""
+        key = _label_set(labels)
+        for kind in (self.counters, self.gauges):
+            if name in kind and key in kind[name]:
+                return kind[name][key]
+        return 0
+
+    def get_histogram(self, name: str, **labels: Any) -> Histogram | None:
+        """Get a histogram, if any value was observed in it."""
+        return self.histograms.get(name, {}).get(_label_set(labels))
+
+    def snapshot(self) -> dict[str, Any]:
+        """Get a JSON serializable copy of every series, to merge in another registry."""
+        return {
+            "counters": _snapshot_series(self.counters),
+            "gauges": _snapshot_series(self.gauges),
+            "histograms": {
+                name: [
+                    [key, [h.buckets, h.counts, h.sum, h.count]]
+                    for key, h in series.items()
+                ]
+                for name, series in self.histograms.items()
+            },
+        }
+
+    def merge(self, snapshot: dict[str, Any]) -> None:
+        """
+        Add the series of a snapshot to this registry, e.g. to sum the metrics of
+        several workers. Counters, gauges and histograms are all summed.
+        """
+        for kind, name, key, value in _iter_snapshot(snapshot, "counters", "gauges"):
+            series = getattr(self, kind).setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+        for _, name, key, value in _iter_snapshot(snapshot, "histograms"):
+            buckets, counts, total, count = value
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(tuple(buckets))
+            histogram.counts = [a + b for a, b in zip(histogram.counts, counts)]
+            histogram.sum += total
+            histogram.count += count
+
+
+def render_prometheus(registry: MetricsRegistry) -> str:
+    """
+    Render the metrics of a registry in the Prometheus text exposition format.
+    Args:
+        registry (MetricsRegistry): The registry to render.
+    Returns:
+        str: The metrics, one sample per line.
+    """
+    lines = []
+    for kind, metrics_of_kind in (
+        ("counter", registry.counters),
+        ("gauge", registry.gauges),
+    ):
+        for name, series in sorted(metrics_of_kind.items()):
+            lines.append(f"# TYPE {name} {kind}")
+            for key, value in sorted(series.items()):
+                lines.append(f"{name}{_render_labels(key)} {_render_value(value)}")
+
+    for name, series in sorted(registry.histograms.items()):
+        lines.append(f"# TYPE {name} histogram")
+        for key, histogram in sorted(series.items(), key=lambda item: item[0]):
+            cumulative = 0
+            bounds = [*map(_render_value, histogram.buckets), "+Inf"]
+            for bound, count in zip(bounds, histogram.counts):
+                cumulative += count
+                labels = _render_labels(key + (("le", bound),))
+                lines.append(f"{name}_bucket{labels} {cumulative}")
+            labels = _render_labels(key)
+            lines.append(f"{name}_sum{labels} {_render_value(histogram.sum)}")
+            lines.append(f"{name}_count{labels} {histogram.count}")
+    return "\n".join(lines) + "\n"
+
+
+def _label_set(labels: dict[str, Any]) -> LabelSet:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _snapshot_series(
+    metrics_of_kind: dict[str, dict[LabelSet, float]],
+) -> dict[str, list[list[Any]]]:
+    return {
+        name: [[key, value] for key, value in series.items()]
+        for name, series in metrics_of_kind.items()
+    }
+
+
+def _iter_snapshot(
+    snapshot: dict[str, Any], *kinds: str
+) -> Iterator[tuple[str, str, LabelSet, Any]]:
+    for kind in kinds:
+        for name, series in snapshot.get(kind, {}).items():
+            for key, value in series:
+                yield kind, name, tuple(tuple(label) for label in key), value
+
+
+def _render_labels(key: LabelSet) -> str:
+    if not key:
+        return ""
+    labels = ",".join(f'{name}="{_escape(value)}"' for name, value in key)
+    return "{" + labels + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _render_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+metrics = MetricsRegistry()
+"""Metrics of the current worker"""
@@ -0,0 +1,113 @@
+import logging
+
+from sqlalchemy import (
+    Column,
+    Connection,
+    and_,
+    delete,
+    exists,
+    inspect,
+    or_,
+    select,
+    text,
+)
+from sqlalchemy.schema import CreateColumn
+
+from pixelgram.models.access_token import AccessToken
+from pixelgram.models.post import Post
+from pixelgram.models.post_comment import PostComment
+from pixelgram.models.post_like import PostLike
+from pixelgram.models.post_saved import PostSaved
+from pixelgram.models.user import User
+
+logger = logging.getLogger(__name__)
+
+ADDED_COLUMNS: list[Column] = [
+    Post.__table__.c.deleted_at,
+    PostComment.__table__.c.deleted_at,
+    AccessToken.__table__.c.expires_at,
+    User.__table__.c.updated_at,
+]
+"""Nullable columns added to existing tables, which `create_all` leaves alone"""
+
+
+def upgrade_schema(connection: Connection) -> None:
+    """
+    Bring a database created by an older version up to the current schema.
+    Every step checks the database first, so this runs on each startup, after
+    `create_all` has created the missing tables.
+
+    Args:
+        connection: The connection to upgrade the database with.
+    """
+
+    for column in ADDED_COLUMNS:
+        _add_column(connection, column)
+    _make_image_urls_unique(connection)
+    _collate_username_search_keys(connection)
+
+
+def _add_column(connection: Connection, column: Column) -> None:
+    table = column.table
+    existing = {c["name"] for c in inspect(connection).get_columns(table.name)}
+    if column.name not in existing:
+        logger.info("Adding column %s.%s", table.name, column.name)
+        preparer = connection.dialect.identifier_preparer
+        definition = CreateColumn(column).compile(dialect=connection.dialect)
+        connection.exec_driver_sql(
+            f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {definition}"
+        )
+
+    # The indexes of the column are created along with it
+    for index in table.indexes:
+        if column in index.columns.values():
+            index.create(connection, checkfirst=True)
+
+
+def _make_image_urls_unique(connection: Connection) -> None:
+    index = next(i for i in Post.__table__.indexes if i.name == "ix_post_image_url")
+    existing = {i["name"]: i for i in inspect(connection).get_indexes("post")}
+    if existing.get(index.name, {}).get("unique"):
+        return
+
+    # Posts sharing an image with an older post are duplicates of the same upload
+    post = Post.__table__
+    older = post.alias("older")
+    duplicates = select(post.c.id).where(
+        exists().where(
+            older.c.image_url == post.c.image_url,
+            or_(
+                older.c.created_at < post.c.created_at,
+                and_(older.c.created_at == post.c.created_at, older.c.id < post.c.id),
+            ),
+        )
+    )
+    duplicate_ids = connection.execute(duplicates).scalars().all()
+    logger.info("Removing %d posts with a duplicate image", len(duplicate_ids))
+    for model in (PostLike, PostComment, PostSaved):
+        connection.execute(delete(model).where(model.post_id.in_(duplicate_ids)))
+    connection.execute(delete(Post).where(Post.id.in_(duplicate_ids)))
+
+    if index.name in existing:
+        index.drop(connection)
+    index.create(connection)
+
+
+def _collate_username_search_keys(connection: Connection) -> None:
+    # Only PostgreSQL indexes the keys with the collation of the database
+    if connection.dialect.name != "postgresql":
+        return
+    index = next(
+        i for i in User.__table__.indexes if i.name == "ix_user_username_lower"
+    )
+    definition = connection.execute(
+        text("SELECT indexdef FROM pg_indexes WHERE indexname = :name"),
+        {"name": index.name},
+    ).scalar()
+    if definition is not None and "COLLATE" in definition:
+        return
+
+    logger.info("Rebuilding index %s with the C collation", index.name)
+    if definition is not None:
+        index.drop(connection)
+    index.create(connection)
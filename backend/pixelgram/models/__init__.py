@@ -1,6 +1,9 @@
 from pixelgram.models.oauth_account import OAuthAccount  # noqa: F401
+from pixelgram.models.outbox import OutboxMessage  # noqa: F401
 from pixelgram.models.post import Post  # noqa: F401
+from pixelgram.models.post_change import PostChange  # noqa: F401
 from pixelgram.models.post_comment import PostComment  # noqa: F401
 from pixelgram.models.post_like import PostLike  # noqa: F401
 from pixelgram.models.post_saved import PostSaved  # noqa: F401
+from pixelgram.models.revoked_token import RevokedToken  # noqa: F401
 from pixelgram.models.user import User  # noqa: F401
@@ -1,4 +1,9 @@
+from datetime import datetime
+from typing import Optional
+
 from fastapi_users_db_sqlalchemy.access_token import SQLAlchemyBaseAccessTokenTableUUID
+from fastapi_users_db_sqlalchemy.generics import TIMESTAMPAware
+from sqlalchemy.orm import Mapped, mapped_column
 
 from pixelgram.models.base import Base
 
@@ -6,4 +11,7 @@ from pixelgram.models.base import Base
 class AccessToken(SQLAlchemyBaseAccessTokenTableUUID, Base):
     """Access token table for the database."""
 
-    pass
+    # Pushed back as the token is used, tokens from before expiries have none
+    expires_at: Mapped[Optional[datetime]] = mapped_column(
+        TIMESTAMPAware(timezone=True), index=True, nullable=True
+    )
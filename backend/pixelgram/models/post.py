@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from datetime import datetime, timezone
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Optional
 from uuid import UUID, uuid4
 
 from sqlalchemy import DateTime, ForeignKey, String
@@ -23,7 +23,9 @@ class Post(Base):
 
     id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
     description: Mapped[str] = mapped_column(String, nullable=False)
-    image_url: Mapped[str] = mapped_column(String, nullable=False)
+    image_url: Mapped[str] = mapped_column(
+        String, nullable=False, unique=True, index=True
+    )
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         default=lambda: datetime.now(timezone.utc),
@@ -32,6 +34,10 @@ class Post(Base):
     user_id: Mapped[UUID] = mapped_column(
         ForeignKey("user.id", ondelete="CASCADE"), nullable=False
     )
+    # Tombstone of a deleted post, hidden from every read until it is purged
+    deleted_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True, index=True
+    )
     author: Mapped[User] = relationship(back_populates="posts")
     post_likes: Mapped[list[PostLike]] = relationship(
         "PostLike",
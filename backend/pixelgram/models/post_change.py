@@ -0,0 +1,38 @@
+from datetime import datetime, timezone
+from uuid import UUID
+
+from sqlalchemy import DateTime, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from pixelgram.models.base import Base
+
+POST_CREATED = "created"
+"""Change kind of a post that was published"""
+
+POST_COUNTERS_CHANGED = "counters"
+"""Change kind of a post whose likes or comments changed"""
+
+POST_DELETED = "deleted"
+"""Change kind of a post that was deleted"""
+
+
+class PostChange(Base):
+    """
+    Represents an entry of the post change log polled by clients.
+    The auto-incremented id doubles as the token clients resume from, held
+    back while recent entries may still be overtaken by transactions committing
+    out of id order. The log is kept compact: a post has at most one entry per
+    kind, and deleting a post replaces all of its entries with a single tombstone.
+    """
+
+    __tablename__ = "post_change"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    # Not a foreign key, as tombstones outlive the posts they refer to
+    post_id: Mapped[UUID] = mapped_column(index=True, nullable=False)
+    kind: Mapped[str] = mapped_column(String(16), nullable=False)
+    changed_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
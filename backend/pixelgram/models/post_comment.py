@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from datetime import datetime, timezone
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Optional
 from uuid import UUID, uuid4
 
 from sqlalchemy import DateTime, ForeignKey, Text
@@ -37,6 +37,10 @@ class PostComment(Base):
         default=lambda: datetime.now(timezone.utc),
         nullable=False,
     )
+    # Tombstone of a deleted comment, hidden from every read until it is purged
+    deleted_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True, index=True
+    )
 
     post: Mapped[Post] = relationship("Post", back_populates="post_comments")
     user: Mapped[User] = relationship("User", back_populates="post_comments")
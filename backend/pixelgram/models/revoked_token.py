@@ -0,0 +1,24 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import DateTime, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from pixelgram.models.base import Base
+
+
+class RevokedToken(Base):
+    """
+    Represents a logged out session of the signed token strategy, whose access
+    tokens must be rejected until they expire. Rows are only needed for the
+    lifetime of an access token, so the table stays small.
+    """
+
+    __tablename__ = "revoked_token"
+
+    token_id: Mapped[str] = mapped_column(String(43), primary_key=True)
+    revoked_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        index=True,
+        nullable=False,
+    )
@@ -1,11 +1,15 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Optional
 
 from fastapi_users.db import (
     SQLAlchemyBaseUserTableUUID,
 )
+from sqlalchemy import DateTime, Index, String, func
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.sql.functions import FunctionElement
 
 from pixelgram.models.base import Base
 from pixelgram.models.oauth_account import OAuthAccount
@@ -21,9 +25,17 @@ class User(SQLAlchemyBaseUserTableUUID, Base):
     """User model for FastAPI Users."""
 
     username: Mapped[str] = mapped_column(index=True)
+    # Version stamp of the account fields shown along the user's posts and comments
+    updated_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+        nullable=True,
+    )
     oauth_accounts: Mapped[list[OAuthAccount]] = relationship(
         "OAuthAccount",
-        lazy="joined",
+        # Only the OAuth callback needs them, it loads them explicitly
+        lazy="raise",
         cascade="all, delete-orphan",
         passive_deletes=True,
     )
@@ -51,3 +63,28 @@ class User(SQLAlchemyBaseUserTableUUID, Base):
     @property
     def liked_posts(self) -> list[Post]:
         return [pl.post for pl in self.post_likes]
+
+
+class Bytewise(FunctionElement):
+    """Text compared and sorted by code point, whatever the database's collation."""
+
+    type = String()
+    inherit_cache = True
+
+
+@compiles(Bytewise)
+def _compile_bytewise(element: Bytewise, compiler, **kw) -> str:
+    return f'({compiler.process(element.clauses, **kw)} COLLATE "C")'
+
+
+@compiles(Bytewise, "sqlite")
+def _compile_bytewise_sqlite(element: Bytewise, compiler, **kw) -> str:
+    # SQLite compares text with memcmp unless told otherwise
+    return compiler.process(element.clauses, **kw)
+
+
+username_search_key = Bytewise(func.lower(User.username))
+"""Key of the prefix searches, which ignore case and range over code points"""
+
+# Prefix searches range over the search keys, which a collation could reorder
+Index("ix_user_username_lower", username_search_key)
@@ -0,0 +1,114 @@
+import asyncio
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import TypeVar
+
+from fastapi_users.password import PasswordHelper
+from pwdlib import PasswordHash
+from pwdlib.hashers.argon2 import Argon2Hasher
+from pwdlib.hashers.bcrypt import BcryptHasher
+
+from pixelgram.metrics import metrics
+from pixelgram.settings import settings
+
+T = TypeVar("T")
+
+UNUSABLE_PASSWORD = "!"
+"""Stored in place of a hash for users without a password, e.g. created through OAuth"""
+
+
+def is_usable_password(hashed_password: str) -> bool:
+    """Whether a stored password hash can match any password."""
+    return not hashed_password.startswith(UNUSABLE_PASSWORD)
+
+
+def create_password_hash() -> PasswordHash:
+    """
+    Create the password hashing scheme configured in the settings.
+    New passwords are hashed with the configured hasher, while hashes made by the
+    other one are still verified, and upgraded on the next successful login.
+    """
+    bcrypt = BcryptHasher(rounds=settings.password_bcrypt_rounds)
+    argon2 = Argon2Hasher()
+    if settings.password_hasher == "bcrypt":
+        return PasswordHash((bcrypt, argon2))
+    return PasswordHash((argon2, bcrypt))
+
+
+class ThreadedPasswordHelper(PasswordHelper):
+    """
+    Password helper hashing in a bounded thread pool, off the event loop.
+
+    Hashing takes tens of milliseconds of CPU on purpose, which would stall every
+    other request of the worker if done on the event loop. The hashers release
+    the GIL, so the pool runs them in parallel with the loop, and at most
+    `max_workers` of them at once. The synchronous methods refuse to run on an
+    event loop, so a code path of fastapi-users that is not overridden fails
+    loudly rather than stalling the worker.
+    """
+
+    def __init__(self, password_hash: PasswordHash, max_workers: int = 2):
+        super().__init__(password_hash)
+        self._executor = ThreadPoolExecutor(
+            max_workers, thread_name_prefix="password-hash"
+        )
+
+    def hash(self, password: str) -> str:
+        _ensure_off_event_loop("hash")
+        return super().hash(password)
+
+    def verify_and_update(
+        self, plain_password: str, hashed_password: str
+    ) -> tuple[bool, str | None]:
+        _ensure_off_event_loop("verify_and_update")
+        return super().verify_and_update(plain_password, hashed_password)
+
+    async def hash_async(self, password: str) -> str:
+        """Hash a password in the thread pool."""
+        return await self._run("hash", self.hash, password)
+
+    async def verify_and_update_async(
+        self, plain_password: str, hashed_password: str
+    ) -> tuple[bool, str | None]:
+        """
+        Verify a password against its hash in the thread pool.
+        Returns:
+            tuple[bool, str | None]: Whether the password matches and, if the hash
+                is outdated, a new hash to store.
+        """
+        return await self._run(
+            "verify", self.verify_and_update, plain_password, hashed_password
+        )
+
+    async def _run(self, operation: str, function: Callable[..., T], *args) -> T:
+        queued = time.monotonic()
+
+        def timed() -> tuple[T, float, float]:
+            started = time.monotonic()
+            result = function(*args)
+            return result, started - queued, time.monotonic() - started
+
+        result, waited, took = await asyncio.get_running_loop().run_in_executor(
+            self._executor, timed
+        )
+        # Recorded from the loop, as the registry is not thread-safe
+        metrics.observe("password_hash_queue_wait_seconds", waited)
+        metrics.observe("password_hash_seconds", took, operation=operation)
+        return result
+
+
+def _ensure_off_event_loop(operation: str) -> None:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    raise RuntimeError(
+        f"Password {operation} would block the event loop, use {operation}_async"
+    )
+
+
+password_helper = ThreadedPasswordHelper(
+    create_password_hash(), max_workers=settings.password_hash_max_workers
+)
+"""Password helper of the application"""
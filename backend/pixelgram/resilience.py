@@ -0,0 +1,220 @@
+import asyncio
+import random
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from typing import TypeVar
+
+from pixelgram.bulkhead import DependencyUnavailableError
+from pixelgram.metrics import metrics
+
+T = TypeVar("T")
+
+CIRCUIT_CLOSED = 0
+"""Circuit state letting every call through"""
+
+CIRCUIT_HALF_OPEN = 1
+"""Circuit state letting a single trial call through"""
+
+CIRCUIT_OPEN = 2
+"""Circuit state failing every call fast"""
+
+
+class CircuitBreaker:
+    """
+    Fails calls to an external dependency fast while it is failing.
+
+    The outcomes of the last `window_size` calls are tracked. Once at least
+    `min_calls` of them are known and the share of failures reaches
+    `failure_rate_threshold`, the circuit opens and calls are rejected without
+    reaching the dependency. After `reset_timeout` seconds, a single trial call
+    is let through: it closes the circuit if it succeeds, or opens it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = 0.5,
+        window_size: int = 20,
+        min_calls: int = 10,
+        reset_timeout: float = 30,
+        is_failure: Callable[[BaseException], bool] = lambda e: True,
+    ):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self.is_failure = is_failure
+        self._outcomes: deque[bool] = deque(maxlen=window_size)
+        self._state = CIRCUIT_CLOSED
+        self._opened_at = 0.0
+        self._trial_running = False
+
+    @property
+    def state(self) -> int:
+        if (
+            self._state == CIRCUIT_OPEN
+            and time.monotonic() - self._opened_at >= self.reset_timeout
+        ):
+            self._set_state(CIRCUIT_HALF_OPEN)
+        return self._state
+
+    async def call(self, call: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run a call to the dependency through the circuit breaker.
+        Args:
+            call (Callable[[], Awaitable[T]]): A function starting the call.
+        Returns:
+            T: The result of the call.
+        Raises:
+            DependencyUnavailableError: If the circuit is open.
+        """
+        state = self.state
+        if state == CIRCUIT_OPEN or (
+            state == CIRCUIT_HALF_OPEN and self._trial_running
+        ):
+            metrics.increment("circuit_rejections_total", dependency=self.name)
+            raise DependencyUnavailableError(self.name, "circuit open")
+
+        trial = state == CIRCUIT_HALF_OPEN
+        self._trial_running = trial
+        try:
+            result = await call()
+        except Exception as e:
+            self._record(not self.is_failure(e), trial)
+            raise
+        except BaseException:
+            # A cancelled call tells nothing about the dependency
+            self._trial_running = False
+            raise
+        self._record(True, trial)
+        return result
+
+    def _record(self, success: bool, trial: bool) -> None:
+        if trial:
+            self._trial_running = False
+            if success:
+                self._outcomes.clear()
+                self._set_state(CIRCUIT_CLOSED)
+            else:
+                self._open()
+            return
+
+        self._outcomes.append(success)
+        if len(self._outcomes) < self.min_calls:
+            return
+        failure_rate = self._outcomes.count(False) / len(self._outcomes)
+        if failure_rate >= self.failure_rate_threshold:
+            self._open()
+
+    def _open(self) -> None:
+        self._opened_at = time.monotonic()
+        self._set_state(CIRCUIT_OPEN)
+
+    def _set_state(self, state: int) -> None:
+        self._state = state
+        metrics.set_gauge("circuit_state", state, dependency=self.name)
+
+
+class LatencyTracker:
+    """Rolling window of the latencies of a dependency, to estimate its quantiles."""
+
+    def __init__(self, size: int = 100, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: deque[float] = deque(maxlen=size)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def quantile(self, q: float) -> float | None:
+        """
+        Estimate a quantile of the recent latencies.
+        Returns:
+            float | None: The latency, or None while there are too few samples.
+        """
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def retry_with_backoff(
+    call: Callable[[], Awaitable[T]],
+    name: str,
+    attempts: int = 3,
+    base_delay: float = 0.1,
+    max_delay: float = 2,
+    is_retryable: Callable[[BaseException], bool] = lambda e: True,
+) -> T:
+    """
+    Run an idempotent call, retrying transient failures with jittered exponential backoff.
+    The delay before retry `n` is drawn uniformly between 0 and
+    `min(max_delay, base_delay * 2**n)`, so callers failing together do not
+    retry together.
+    Args:
+        call (Callable[[], Awaitable[T]]): A function starting the call.
+        name (str): The name of the dependency, for the metrics.
+        attempts (int, optional): The maximum number of attempts. Defaults to 3.
+        base_delay (float, optional): The base delay in seconds. Defaults to 0.1.
+        max_delay (float, optional): The maximum delay in seconds. Defaults to 2.
+        is_retryable (Callable[[BaseException], bool], optional): Whether a failure is transient.
+    Returns:
+        T: The result of the first successful attempt.
+    Raises:
+        The exception of the last attempt, or of the first non retryable failure.
+    """
+    for attempt in range(attempts):
+        try:
+            return await call()
+        except Exception as e:
+            if attempt == attempts - 1 or not is_retryable(e):
+                raise
+            metrics.increment("dependency_retries_total", dependency=name)
+            await asyncio.sleep(
+                random.uniform(0, min(max_delay, base_delay * 2**attempt))
+            )
+    raise AssertionError("unreachable")
+
+
+async def hedged(call: Callable[[], Awaitable[T]], name: str, delay: float | None) -> T:
+    """
+    Run an idempotent call, sending a second identical one if the first is slow.
+    The first successful response wins and the other call is cancelled.
+    Args:
+        call (Callable[[], Awaitable[T]]): A function starting the call.
+        name (str): The name of the dependency, for the metrics.
+        delay (float | None): The seconds to wait before hedging, typically the
+            p95 latency of the dependency. No second call is sent when None.
+    Returns:
+        T: The result of the first successful call.
+    Raises:
+        The exception of the first call, if both fail.
+    """
+    if delay is None:
+        return await call()
+
+    tasks = [asyncio.ensure_future(call())]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            metrics.increment("dependency_hedged_requests_total", dependency=name)
+            tasks.append(asyncio.ensure_future(call()))
+
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    if task is not tasks[0]:
+                        metrics.increment(
+                            "dependency_hedge_wins_total", dependency=name
+                        )
+                    return task.result()
+        return tasks[0].result()
+    finally:
+        # Also reached when the caller gives up, e.g. on a timeout
+        for task in tasks:
+            if not task.done():
+                task.cancel()
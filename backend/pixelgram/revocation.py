@@ -0,0 +1,103 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from pixelgram.db import async_session_maker
+from pixelgram.invalidation import ENTITY_SESSION, ENTITY_USER, invalidation_bus
+from pixelgram.models.revoked_token import RevokedToken
+from pixelgram.settings import settings
+
+
+class RevocationList:
+    """
+    In-memory list of the signed access tokens that must be rejected before they expire.
+
+    Access tokens are checked without touching the database, so logouts and
+    account changes are spread to every worker through the invalidation bus:
+    a revoked session rejects all of its access tokens, and a changed user
+    rejects the ones issued before the change, forcing a refresh that reloads
+    the account. Entries are only kept for the lifetime of an access token,
+    after which the token would be refreshed against the database anyway.
+    """
+
+    def __init__(
+        self, session_maker: async_sessionmaker[AsyncSession], retention_seconds: float
+    ):
+        self.session_maker = session_maker
+        self.retention_seconds = retention_seconds
+        self._sessions: dict[str, float] = {}
+        self._users: dict[str, float] = {}
+        self._pruned_at = 0.0
+
+    def is_revoked(self, session_id: str, user_id: str, issued_at: float) -> bool:
+        """
+        Whether an access token must be rejected.
+        Args:
+            session_id (str): The id of the session the token belongs to.
+            user_id (str): The id of the user the token was issued to.
+            issued_at (float): When the token was issued, in seconds since the epoch.
+        """
+        self._prune()
+        return session_id in self._sessions or self._users.get(user_id, 0) >= issued_at
+
+    async def revoke(self, session_id: str) -> None:
+        """
+        Revoke a session on every worker, e.g. on logout.
+        Args:
+            session_id (str): The id of the session, i.e. of its refresh token.
+        """
+        async with self.session_maker() as session:
+            await session.merge(RevokedToken(token_id=session_id))
+            await session.commit()
+        invalidation_bus.publish(ENTITY_SESSION, session_id)
+
+    async def load(self) -> None:
+        """Load the revocations still relevant, e.g. when a worker starts."""
+        since = datetime.now(timezone.utc) - timedelta(seconds=self.retention_seconds)
+        async with self.session_maker() as session:
+            rows = await session.execute(
+                select(RevokedToken.token_id, RevokedToken.revoked_at).where(
+                    RevokedToken.revoked_at >= since
+                )
+            )
+            for token_id, revoked_at in rows:
+                self._sessions[token_id] = revoked_at.timestamp()
+
+    async def prune_stored(self) -> int:
+        """
+        Delete the stored revocations no longer relevant.
+        Returns:
+            int: The number of revocations deleted.
+        """
+        since = datetime.now(timezone.utc) - timedelta(seconds=self.retention_seconds)
+        async with self.session_maker() as session:
+            result = await session.execute(
+                delete(RevokedToken).where(RevokedToken.revoked_at < since)
+            )
+            await session.commit()
+        return result.rowcount  # type: ignore
+
+    def on_change(self, entity: str, entity_id: str) -> None:
+        """Invalidation bus handler recording revoked sessions and changed users."""
+        if entity == ENTITY_SESSION:
+            self._sessions[entity_id] = time.time()
+        elif entity == ENTITY_USER:
+            self._users[entity_id] = time.time()
+
+    def _prune(self) -> None:
+        now = time.time()
+        if now - self._pruned_at < 60:
+            return
+        self._pruned_at = now
+        cutoff = now - self.retention_seconds
+        self._sessions = {k: t for k, t in self._sessions.items() if t >= cutoff}
+        self._users = {k: t for k, t in self._users.items() if t >= cutoff}
+
+
+revocation_list = RevocationList(
+    async_session_maker, retention_seconds=settings.auth_access_token_ttl_seconds
+)
+"""Revocation list of the signed access tokens"""
+invalidation_bus.subscribe(revocation_list.on_change)
@@ -1,10 +1,10 @@
 from io import BytesIO
 
-from fastapi import APIRouter, Depends, File, HTTPException, Request, UploadFile
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
 from PIL import Image
 
 from pixelgram.auth import current_active_user
-from pixelgram.limiter import limiter
+from pixelgram.limiter import caption_rate_limit
 from pixelgram.models.user import User
 from pixelgram.schemas.caption import Caption
 from pixelgram.services.captions_service import CaptionsService, get_captions_service
@@ -36,11 +36,11 @@ captions_router = APIRouter(
             },
         },
         401: {"description": "Unauthorized"},
+        429: {"description": "Rate limit exceeded"},
     },
+    dependencies=[Depends(caption_rate_limit)],
 )
-@limiter.limit("30/15minutes")
 async def get_caption(
-    request: Request,
     user: User = Depends(current_active_user),
     file: UploadFile = File(...),
     captions_service: CaptionsService = Depends(get_captions_service),
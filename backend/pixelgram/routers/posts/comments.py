@@ -7,9 +7,11 @@ from fastapi import (
     HTTPException,
     Path,
     Query,
+    Request,
     Response,
     status,
 )
+from fastapi.responses import ORJSONResponse
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -27,16 +29,20 @@ from pixelgram.services.posts.comment_service import (
     CommentService,
     get_comment_service,
 )
+from pixelgram.utils.constants import REVALIDATE_CACHE_CONTROL
+from pixelgram.utils.etag import etag_matches, not_modified
 
 posts_comments_router = APIRouter(
     prefix="/{post_id}/comments",
     tags=["posts"],
+    default_response_class=ORJSONResponse,
 )
 
 
 @posts_comments_router.get(
     "/",
     summary="Retrieve paginated comments for a post",
+    response_model=PaginatedCommentsResponse,
     description="Returns a paginated list of comments on a given post.",
     responses={
         status.HTTP_200_OK: {
@@ -62,11 +68,15 @@ posts_comments_router = APIRouter(
                 }
             },
         },
+        status.HTTP_304_NOT_MODIFIED: {
+            "description": "Comments not modified since the given ETag"
+        },
         status.HTTP_401_UNAUTHORIZED: {"description": "Unauthorized"},
         status.HTTP_404_NOT_FOUND: {"description": "Post not found"},
     },
 )
 async def get_post_comments(
+    request: Request,
     post_id: UUID = Path(..., description="The ID of the post to fetch comments for"),
     user: User = Depends(current_active_user),
     page: int = Query(1, ge=1, description="The page number to retrieve."),
@@ -75,20 +85,34 @@ async def get_post_comments(
     ),
     db: AsyncSession = Depends(get_async_session),
     comment_service: CommentService = Depends(get_comment_service),
-) -> PaginatedCommentsResponse:
+) -> Response:
     # Check if post exists
     post = await db.get(Post, post_id)
-    if not post:
+    if not post or post.deleted_at is not None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Post not found"
         )
 
-    return await comment_service.get_by_post_id(
+    # Answer conditional requests from the version stamps before building the page
+    etag = await comment_service.get_etag(
+        post_id=post_id,
+        page=page,
+        page_size=page_size,
+        solicitor_id=user.id,
+    )
+    if etag_matches(request, etag):
+        return not_modified(etag, REVALIDATE_CACHE_CONTROL)
+
+    payload = await comment_service.get_by_post_id(
         post_id=post_id,
         page=page,
         page_size=page_size,
         solicitor_id=user.id,
     )
+    # The payload is built from trusted rows, so it is returned without re-validation
+    return ORJSONResponse(
+        payload, headers={"ETag": etag, "Cache-Control": REVALIDATE_CACHE_CONTROL}
+    )
 
 
 @posts_comments_router.post(
@@ -112,7 +136,7 @@ async def post_comment(
 ) -> CommentResponse:
     # Check if post exists
     post = await db.get(Post, post_id)
-    if not post:
+    if not post or post.deleted_at is not None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Post not found"
         )
@@ -142,14 +166,16 @@ async def delete_comment(
 ):
     # Check if post exists
     post = await db.get(Post, post_id)
-    if not post:
+    if not post or post.deleted_at is not None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Post not found"
         )
 
     # Check if comment exists
     stmt = select(PostComment).where(
-        PostComment.id == comment_id, PostComment.post_id == post_id
+        PostComment.id == comment_id,
+        PostComment.post_id == post_id,
+        PostComment.deleted_at.is_(None),
     )
     result = await db.execute(stmt)
     comment = result.scalar_one_or_none()
@@ -41,7 +41,7 @@ async def like_post(
 ):
     # Check if post exists
     post = await db.get(Post, post_id)
-    if not post:
+    if not post or post.deleted_at is not None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Post not found"
         )
@@ -69,7 +69,7 @@ async def unlike_post(
 ):
     # Check if post exists
     post = await db.get(Post, post_id)
-    if not post:
+    if not post or post.deleted_at is not None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Post not found"
         )
@@ -1,18 +1,23 @@
+from collections.abc import AsyncGenerator
 from io import BytesIO
 from uuid import UUID
 
+import orjson
 from fastapi import (
     APIRouter,
+    Body,
     Depends,
     File,
     Form,
     HTTPException,
     Path,
     Query,
+    Request,
     Response,
     UploadFile,
     status,
 )
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from PIL import Image
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -25,19 +30,29 @@ from pixelgram.routers.posts.likes import post_likes_router
 from pixelgram.routers.posts.saved import saved_posts_router
 from pixelgram.schemas.post import (
     PaginatedPostsResponse,
+    PostChangesResponse,
+    PostUploadCreate,
+    PostUploadFinalize,
     PostResponse,
+    PostUploadResponse,
 )
 from pixelgram.services.post_service import PostService, get_post_service
+from pixelgram.services.posts.live_counters import (
+    CounterSubscription,
+    live_counter_hub,
+)
 from pixelgram.services.supabase_client import (
     SupabaseStorageClient,
     get_supabase_client,
 )
 from pixelgram.settings import Settings, get_settings
-from pixelgram.utils.constants import REQUIRED_IMAGE_SIZE
+from pixelgram.utils.constants import REQUIRED_IMAGE_SIZE, REVALIDATE_CACHE_CONTROL
+from pixelgram.utils.etag import etag_matches, not_modified
 
 posts_router = APIRouter(
     prefix="/posts",
     tags=["posts"],
+    default_response_class=ORJSONResponse,
 )
 
 posts_router.include_router(posts_comments_router)
@@ -88,7 +103,6 @@ async def post_pixelart(
     description: str = Form(...),
     supabase_client: SupabaseStorageClient = Depends(get_supabase_client),
     settings: Settings = Depends(get_settings),
-    db: AsyncSession = Depends(get_async_session),
     post_service: PostService = Depends(get_post_service),
 ) -> PostResponse:
     # Check if file is an image
@@ -126,9 +140,59 @@ async def post_pixelart(
     )
 
 
+@posts_router.post(
+    "/uploads",
+    status_code=status.HTTP_201_CREATED,
+    summary="Request a signed URL to upload a post image",
+    response_model=PostUploadResponse,
+    description="Issues a short-lived signed URL to PUT the image of a new post straight to "
+    "storage, given the SHA-256 hash and size of the image. Once uploaded, create the post "
+    "with the returned token through `/posts/uploads/finalize`.",
+    responses={
+        status.HTTP_400_BAD_REQUEST: {"description": "Image too large"},
+        status.HTTP_401_UNAUTHORIZED: {"description": "Unauthorized"},
+    },
+)
+async def create_post_upload(
+    payload: PostUploadCreate = Body(...),
+    user: User = Depends(current_active_user),
+    post_service: PostService = Depends(get_post_service),
+) -> ORJSONResponse:
+    upload = await post_service.create_upload(
+        user=user, sha256=payload.sha256, size=payload.size
+    )
+    return ORJSONResponse(upload, status_code=status.HTTP_201_CREATED)
+
+
+@posts_router.post(
+    "/uploads/finalize",
+    status_code=status.HTTP_201_CREATED,
+    summary="Create a post from an uploaded image",
+    response_model=PostResponse,
+    description="Verifies the image uploaded with a signed URL against its announced size "
+    "and hash and its dimensions (must be 128x128 pixels), then creates the post.",
+    responses={
+        status.HTTP_400_BAD_REQUEST: {
+            "description": "Invalid token, or missing or invalid image"
+        },
+        status.HTTP_401_UNAUTHORIZED: {"description": "Unauthorized"},
+        status.HTTP_409_CONFLICT: {"description": "Post already created"},
+    },
+)
+async def finalize_post_upload(
+    payload: PostUploadFinalize = Body(...),
+    user: User = Depends(current_active_user),
+    post_service: PostService = Depends(get_post_service),
+) -> PostResponse:
+    return await post_service.finalize_upload(
+        user=user, upload_token=payload.upload_token, description=payload.description
+    )
+
+
 @posts_router.get(
     "/",
     summary="Retrieve paginated posts",
+    response_model=PaginatedPostsResponse,
     description="Returns a paginated list of posts for infinite scrolling. "
     "Use query parameters to control the page and page size. You can filter by userId.",
     responses={
@@ -158,25 +222,162 @@ async def post_pixelart(
                 }
             },
         },
+        status.HTTP_304_NOT_MODIFIED: {
+            "description": "Posts not modified since the given ETag"
+        },
         status.HTTP_401_UNAUTHORIZED: {"description": "Unauthorized"},
     },
 )
 async def get_posts(
+    request: Request,
     user: User = Depends(current_active_user),
     page: int = Query(1, ge=1, description="The page number to retrieve."),
     page_size: int = Query(
         10, ge=1, le=100, description="The number of posts per page."
     ),
     user_id: str | None = Query(None, description="The user ID to filter posts by."),
-    db: AsyncSession = Depends(get_async_session),
     post_service: PostService = Depends(get_post_service),
-) -> PaginatedPostsResponse:
-    return await post_service.get_posts(
+) -> Response:
+    # Answer conditional requests from the version stamps before building the page
+    etag = await post_service.get_posts_etag(
         user=user,
         page=page,
         page_size=page_size,
         user_id=user_id,
     )
+    if etag_matches(request, etag):
+        return not_modified(etag, REVALIDATE_CACHE_CONTROL)
+
+    payload = await post_service.get_posts(
+        user=user,
+        page=page,
+        page_size=page_size,
+        user_id=user_id,
+    )
+    # The payload is built from trusted rows, so it is returned without re-validation
+    return ORJSONResponse(
+        payload, headers={"ETag": etag, "Cache-Control": REVALIDATE_CACHE_CONTROL}
+    )
+
+
+@posts_router.get(
+    "/changes",
+    summary="Retrieve feed changes since a token",
+    response_model=PostChangesResponse,
+    description="Returns the posts created, the posts whose counters changed and the ids "
+    "of the posts deleted since the given token, read from the post change log. "
+    "Poll again with the returned `nextToken`; omit `since` to get the current token.",
+    responses={
+        status.HTTP_200_OK: {
+            "description": "The changes since the token",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "created": [],
+                        "updated": [
+                            {
+                                "id": "00000000-0000-0000-0000-000000000001",
+                                "likesCount": 24,
+                                "likedByUser": False,
+                                "commentsCount": 5,
+                                "commentedByUser": True,
+                            }
+                        ],
+                        "deleted": ["00000000-0000-0000-0000-000000000002"],
+                        "nextToken": 1042,
+                        "hasMore": False,
+                    }
+                }
+            },
+        },
+        status.HTTP_401_UNAUTHORIZED: {"description": "Unauthorized"},
+    },
+)
+async def get_post_changes(
+    user: User = Depends(current_active_user),
+    since: int | None = Query(
+        None, ge=0, description="The token returned by the previous poll."
+    ),
+    limit: int = Query(
+        100, ge=1, le=500, description="The maximum number of changes to read."
+    ),
+    post_service: PostService = Depends(get_post_service),
+) -> ORJSONResponse:
+    payload = await post_service.get_changes(user=user, since=since, limit=limit)
+    # The payload is built from trusted rows, so it is returned without re-validation
+    return ORJSONResponse(payload)
+
+
+@posts_router.get(
+    "/live",
+    summary="Stream live post counters",
+    description="Opens a Server-Sent Events stream with the likes and comments counters "
+    "of the given posts. The current counters are sent first, then a `counters` event "
+    "whenever a post changes, at most once per post per interval.",
+    response_class=StreamingResponse,
+    responses={
+        status.HTTP_200_OK: {
+            "description": "A stream of `counters` events",
+            "content": {
+                "text/event-stream": {
+                    "example": "event: counters\n"
+                    'data: {"id":"00000000-0000-0000-0000-000000000001",'
+                    '"likesCount":24,"commentsCount":5}\n\n'
+                }
+            },
+        },
+        status.HTTP_400_BAD_REQUEST: {"description": "Too many posts"},
+        status.HTTP_401_UNAUTHORIZED: {"description": "Unauthorized"},
+        status.HTTP_503_SERVICE_UNAVAILABLE: {"description": "Too many subscribers"},
+    },
+)
+async def stream_post_counters(
+    request: Request,
+    user: User = Depends(current_active_user),
+    ids: list[UUID] = Query(..., description="The IDs of the posts to watch."),
+    settings: Settings = Depends(get_settings),
+) -> StreamingResponse:
+    if len(ids) > settings.live_counters_max_posts:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Cannot watch more than {settings.live_counters_max_posts} posts.",
+        )
+    if live_counter_hub.full:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many live subscribers, try again later.",
+        )
+
+    async def events() -> AsyncGenerator[bytes, None]:
+        async with live_counter_hub.subscribe(ids) as subscription:
+            async for event in _counter_events(
+                request, subscription, settings.live_counters_keepalive_seconds
+            ):
+                yield event
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _counter_events(
+    request: Request, subscription: CounterSubscription, keepalive: float
+) -> AsyncGenerator[bytes, None]:
+    """
+    Format the updates of a subscription as Server-Sent Events until the client leaves.
+    A comment is sent when nothing changed for `keepalive` seconds, so idle
+    connections are not dropped by proxies.
+    """
+    while not await request.is_disconnected():
+        updates = await subscription.get(timeout=keepalive)
+        if not updates:
+            yield b": keepalive\n\n"
+            continue
+        # Sending waits for the client, meanwhile newer updates are coalesced
+        for counters in updates.values():
+            yield b"event: counters\ndata: " + orjson.dumps(counters) + b"\n\n"
 
 
 @posts_router.delete(
@@ -198,7 +399,7 @@ async def delete_post(
 ):
     # Check if post exists
     post = await db.get(Post, post_id)
-    if not post:
+    if not post or post.deleted_at is not None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Post not found"
         )
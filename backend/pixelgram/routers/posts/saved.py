@@ -9,6 +9,7 @@ from fastapi import (
     Response,
     status,
 )
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from pixelgram.auth import current_active_user
@@ -22,6 +23,7 @@ from pixelgram.services.posts.saved_service import SavedService, get_saved_servi
 
 saved_posts_router = APIRouter(
     tags=["posts"],
+    default_response_class=ORJSONResponse,
 )
 
 
@@ -47,7 +49,7 @@ async def save_post(
 
     # Check if post exists
     post = await db.get(Post, post_id)
-    if not post:
+    if not post or post.deleted_at is not None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Post not found"
         )
@@ -77,7 +79,7 @@ async def unsave_post(
     """
     # Check if post exists
     post = await db.get(Post, post_id)
-    if not post:
+    if not post or post.deleted_at is not None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Post not found"
         )
@@ -88,6 +90,7 @@ async def unsave_post(
 @saved_posts_router.get(
     "/saved/",
     summary="Get all saved posts",
+    response_model=PaginatedPostsResponse,
     description="Retrieves all posts saved by the current user.",
     responses={
         status.HTTP_200_OK: {
@@ -117,9 +120,8 @@ async def get_saved_posts(
     page_size: int = Query(
         10, ge=1, le=100, description="The number of posts per page."
     ),
-    db: AsyncSession = Depends(get_async_session),
     saved_service: SavedService = Depends(get_saved_service),
-) -> PaginatedPostsResponse:
+) -> ORJSONResponse:
     """
     Get all saved posts for the current user.
     """
@@ -129,6 +131,8 @@ async def get_saved_posts(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid user ID"
         )
 
-    return await saved_service.get_saved_posts(
+    payload = await saved_service.get_saved_posts(
         user_id=user.id, page=page, page_size=page_size
     )
+    # The payload is built from trusted rows, so it is returned without re-validation
+    return ORJSONResponse(payload)
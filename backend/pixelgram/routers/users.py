@@ -1,20 +1,102 @@
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, Response, status
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import ORJSONResponse
 
 from pixelgram.auth import UserManager, current_active_user, get_user_manager
-from pixelgram.db import get_async_session
 from pixelgram.models.user import User
 from pixelgram.schemas.user import UserPublicInfo
 from pixelgram.services.user_service import UserService, get_user_service
+from pixelgram.settings import Settings, get_settings
+from pixelgram.utils.etag import etag_matches, not_modified
 
 users_router = APIRouter(
     prefix="/users",
     tags=["users"],
+    default_response_class=ORJSONResponse,
 )
 
 
+@users_router.get(
+    "/info",
+    summary="Get usernames by user IDs",
+    description="Returns the usernames associated with the given user IDs, "
+    "leaving out the unknown ones.",
+    response_model=list[UserPublicInfo],
+    responses={
+        200: {
+            "description": "Usernames successfully retrieved",
+            "content": {
+                "application/json": {
+                    "example": [
+                        {
+                            "id": "123e4567-e89b-12d3-a456-426614174000",
+                            "username": "john_doe",
+                        }
+                    ]
+                }
+            },
+        },
+        400: {"description": "Too many user IDs"},
+        401: {"description": "Unauthorized"},
+    },
+)
+async def get_users_info(
+    ids: list[UUID] = Query(..., description="The IDs of the users."),
+    user: User = Depends(current_active_user),
+    user_service: UserService = Depends(get_user_service),
+    settings: Settings = Depends(get_settings),
+):
+    """
+    Get the usernames of several users, e.g. the authors of a page of posts.
+    """
+    if len(ids) > settings.user_info_max_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.user_info_max_ids} user IDs can be requested.",
+        )
+    return await user_service.get_users_info(ids)
+
+
+@users_router.get(
+    "/search",
+    summary="Search users by username prefix",
+    description="Returns the users whose username starts with the given prefix, "
+    "ignoring case, sorted by username.",
+    response_model=list[UserPublicInfo],
+    responses={
+        200: {
+            "description": "Users successfully retrieved",
+            "content": {
+                "application/json": {
+                    "example": [
+                        {
+                            "id": "123e4567-e89b-12d3-a456-426614174000",
+                            "username": "john_doe",
+                        }
+                    ]
+                }
+            },
+        },
+        401: {"description": "Unauthorized"},
+    },
+)
+async def search_users(
+    prefix: str = Query(
+        ..., min_length=1, max_length=64, description="The start of the username."
+    ),
+    limit: int = Query(
+        10, ge=1, le=20, description="The maximum number of users to return."
+    ),
+    user: User = Depends(current_active_user),
+    user_service: UserService = Depends(get_user_service),
+):
+    """
+    Search users by username prefix, for autocompletion.
+    """
+    return await user_service.search_users(prefix, limit)
+
+
 @users_router.get(
     "/{id}/info",
     summary="Get username by user ID",
@@ -32,6 +114,7 @@ users_router = APIRouter(
                 }
             },
         },
+        304: {"description": "User info not modified since the given ETag"},
         404: {
             "description": "User not found",
             "content": {"application/json": {"example": {"detail": "User not found."}}},
@@ -40,15 +123,27 @@ users_router = APIRouter(
     },
 )
 async def get_username_by_id(
+    request: Request,
+    response: Response,
     id: UUID,
     user: User = Depends(current_active_user),
-    db: AsyncSession = Depends(get_async_session),
     user_service: UserService = Depends(get_user_service),
+    settings: Settings = Depends(get_settings),
 ):
     """
     Get username by user ID.
     """
-    return await user_service.get_username_by_id(id)
+    info = await user_service.get_username_by_id(id)
+
+    # Usernames rarely change, so clients may reuse the info for a while
+    etag = user_service.get_user_info_etag(info)
+    cache_control = f"private, max-age={settings.user_info_max_age_seconds}"
+    if etag_matches(request, etag):
+        return not_modified(etag, cache_control)
+
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+    return info
 
 
 @users_router.delete(
@@ -1,10 +1,11 @@
 from datetime import datetime
-from typing import Optional
+from typing import Any, Optional
 from uuid import UUID
 
-from pydantic import HttpUrl, field_validator
+from pydantic import Field, HttpUrl, field_validator
 
 from pixelgram.schemas.camel_model import CamelModel
+from pixelgram.utils.serialization import serialize_datetime
 
 
 class PostBase(CamelModel):
@@ -62,6 +63,71 @@ class PostRead(PostBase):
     commented_by_user: bool
     saved_by_user: bool
 
+    @staticmethod
+    def serialize_row(
+        id: UUID,
+        description: str,
+        image_url: str,
+        user_id: UUID,
+        author_username: str,
+        author_email: str,
+        created_at: datetime,
+        likes_count: int,
+        liked_by_user: bool,
+        comments_count: int,
+        commented_by_user: bool,
+        saved_by_user: bool,
+    ) -> dict[str, Any]:
+        """
+        Builds the camelCase JSON payload of a post straight from trusted database
+        values, skipping validation. The result is the same as dumping a `PostRead`
+        in JSON mode by alias.
+        """
+        return {
+            "description": description,
+            "imageUrl": image_url,
+            "id": str(id),
+            "userId": str(user_id),
+            "authorUsername": author_username,
+            "authorEmail": author_email,
+            "createdAt": serialize_datetime(created_at),
+            "likesCount": likes_count,
+            "likedByUser": liked_by_user,
+            "commentsCount": comments_count,
+            "commentedByUser": commented_by_user,
+            "savedByUser": saved_by_user,
+        }
+
+
+class PostCounters(CamelModel):
+    """Post schema for the counters of a post and the user's interactions with it."""
+
+    id: UUID
+    likes_count: int
+    liked_by_user: bool
+    comments_count: int
+    commented_by_user: bool
+
+    @staticmethod
+    def serialize_row(
+        id: UUID,
+        likes_count: int,
+        liked_by_user: bool,
+        comments_count: int,
+        commented_by_user: bool,
+    ) -> dict[str, Any]:
+        """
+        Builds the camelCase JSON payload of post counters straight from trusted
+        database values, skipping validation.
+        """
+        return {
+            "id": str(id),
+            "likesCount": likes_count,
+            "likedByUser": liked_by_user,
+            "commentsCount": comments_count,
+            "commentedByUser": commented_by_user,
+        }
+
 
 class PaginatedPostsResponse(CamelModel):
     data: list[PostRead]
@@ -71,3 +137,35 @@ class PaginatedPostsResponse(CamelModel):
 
 class PostResponse(CamelModel):
     post: PostRead
+
+
+class PostChangesResponse(CamelModel):
+    """Changes to the feed since a token of the post change log."""
+
+    created: list[PostRead]
+    updated: list[PostCounters]
+    deleted: list[UUID]
+    next_token: int
+    has_more: bool
+
+
+class PostUploadCreate(CamelModel):
+    """Announcement of a post image about to be uploaded straight to storage."""
+
+    sha256: str = Field(pattern=r"^[0-9a-fA-F]{64}$")
+    size: int = Field(gt=0)
+
+
+class PostUploadResponse(CamelModel):
+    """Signed URL to upload a post image to, and the token to finalize the post with."""
+
+    upload_url: str
+    upload_token: str
+    expires_in: int
+
+
+class PostUploadFinalize(CamelModel):
+    """Request to create a post from an image uploaded with a signed URL."""
+
+    upload_token: str
+    description: str = Field(min_length=1, max_length=1000)
@@ -1,10 +1,11 @@
 from datetime import datetime
-from typing import Optional
+from typing import Any, Optional
 from uuid import UUID
 
 from pydantic import field_validator
 
 from pixelgram.schemas.camel_model import CamelModel
+from pixelgram.utils.serialization import serialize_datetime
 
 
 class PostCommentBase(CamelModel):
@@ -44,6 +45,33 @@ class PostCommentRead(PostCommentBase):
     created_at: datetime
     by_user: bool
 
+    @staticmethod
+    def serialize_row(
+        id: UUID,
+        post_id: UUID,
+        user_id: UUID,
+        author_username: str,
+        author_email: str,
+        content: str,
+        created_at: datetime,
+        by_user: bool,
+    ) -> dict[str, Any]:
+        """
+        Builds the camelCase JSON payload of a comment straight from trusted database
+        values, skipping validation. The result is the same as dumping a
+        `PostCommentRead` in JSON mode by alias.
+        """
+        return {
+            "content": content,
+            "id": str(id),
+            "postId": str(post_id),
+            "userId": str(user_id),
+            "authorUsername": author_username,
+            "authorEmail": author_email,
+            "createdAt": serialize_datetime(created_at),
+            "byUser": by_user,
+        }
+
 
 class PaginatedCommentsResponse(CamelModel):
     data: list[PostCommentRead]
@@ -1,11 +1,21 @@
+import asyncio
 import base64
 from io import BytesIO
 
 from huggingface_hub import InferenceClient
 from PIL.Image import Image
 
+from pixelgram.bulkhead import Bulkhead
 from pixelgram.settings import settings
 
+hf_bulkhead = Bulkhead(
+    "huggingface",
+    max_concurrent=settings.hf_max_concurrency,
+    max_queued=settings.hf_max_queued,
+    timeout=settings.hf_timeout_seconds,
+)
+"""Bulkhead bounding the concurrent calls to the Hugging Face API"""
+
 
 class HFClient:
     """
@@ -16,7 +26,9 @@ class HFClient:
 
     def __init__(self):
         self.client = InferenceClient(
-            provider="hf-inference", api_key=settings.hf_token
+            provider="hf-inference",
+            api_key=settings.hf_token,
+            timeout=settings.hf_timeout_seconds,
         )
         self.model = settings.hf_img2txt_model
 
@@ -40,12 +52,17 @@ class HFClient:
             }
         ]
 
-        completion = self.client.chat.completions.create(
-            model=self.model,
-            messages=messages,
-            temperature=0.5,
-            max_tokens=500,
-            top_p=0.7,
+        # The client is synchronous, so it runs in a thread to keep the event loop free.
+        # Its own timeout ends the thread, the bulkhead's only stops waiting for it.
+        completion = await hf_bulkhead.run(
+            lambda: asyncio.to_thread(
+                self.client.chat.completions.create,
+                model=self.model,
+                messages=messages,
+                temperature=0.5,
+                max_tokens=500,
+                top_p=0.7,
+            )
         )
 
         if not completion.choices or not completion.choices[0].message:
@@ -1,28 +1,86 @@
-from typing import Optional
+import asyncio
+import hashlib
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+from typing import Any, NamedTuple, Optional
+from uuid import UUID, uuid4
 
 from fastapi import Depends, HTTPException, status
+from PIL import Image as PILImage
 from PIL.Image import Image
 from pydantic import HttpUrl
-from sqlalchemy import func, select
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
-from pixelgram.db import get_async_session
+from pixelgram.bulkhead import DependencyUnavailableError
+from pixelgram.db import (
+    get_async_session,
+    get_read_session,
+    release_connection,
+    run_write,
+)
+from pixelgram.instrumentation import query_budget
+from pixelgram.invalidation import ENTITY_POST, invalidation_bus
+from pixelgram.jobs.outbox import enqueue_image_deletion, outbox_worker
 from pixelgram.models.post import Post
+from pixelgram.models.post_change import (
+    POST_COUNTERS_CHANGED,
+    POST_CREATED,
+    POST_DELETED,
+    PostChange,
+)
 from pixelgram.models.post_comment import PostComment
 from pixelgram.models.post_like import PostLike
 from pixelgram.models.post_saved import PostSaved
 from pixelgram.models.user import User
 from pixelgram.schemas.post import (
-    PaginatedPostsResponse,
+    PostCounters,
     PostCreate,
     PostRead,
     PostResponse,
 )
+from pixelgram.services.posts.change_log import record_post_change
 from pixelgram.services.supabase_client import (
     SupabaseStorageClient,
     get_supabase_client,
 )
+from pixelgram.settings import settings
+from pixelgram.utils.constants import REQUIRED_IMAGE_SIZE
+from pixelgram.utils.etag import make_weak_etag
+from pixelgram.utils.signing import (
+    PURPOSE_UPLOAD,
+    sign_payload,
+    verify_signed_payload,
+)
+
+
+class _PostInteractions(NamedTuple):
+    likes: dict[UUID, int]
+    liked: set[UUID]
+    comments: dict[UUID, int]
+    commented: set[UUID]
+    saved: set[UUID]
+
+
+def _verify_uploaded_image(data: bytes, size: int, sha256: str) -> Optional[str]:
+    """
+    Check an uploaded image against the size and hash announced when signing.
+    Returns:
+        Optional[str]: The reason the image is rejected, or None if it is valid.
+    """
+    if len(data) != size or hashlib.sha256(data).hexdigest() != sha256:
+        return "Uploaded image does not match the announced size and hash."
+    try:
+        image = PILImage.open(BytesIO(data))
+    except Exception:
+        return "Invalid or corrupted image file."
+    if image.size != REQUIRED_IMAGE_SIZE:
+        return (
+            f"Image must be {REQUIRED_IMAGE_SIZE[0]}x{REQUIRED_IMAGE_SIZE[1]} pixels."
+        )
+    return None
 
 
 class PostService:
@@ -30,15 +88,27 @@ class PostService:
     Service for managing posts.
     """
 
-    def __init__(self, db: AsyncSession, supabase: SupabaseStorageClient):
+    def __init__(
+        self,
+        db: AsyncSession,
+        supabase: SupabaseStorageClient,
+        read_db: Optional[AsyncSession] = None,
+    ):
         self.db = db
         self.supabase = supabase
+        self.read_db = read_db or db
 
     async def create_post(
         self, user: User, description: str, image: Image
     ) -> PostResponse:
         """
         Asynchronously creates a new post for a user, including image upload and database persistence.
+        The post id and the image path are picked up front, so the upload runs
+        concurrently with the insert of the post, committed hidden behind a
+        tombstone so no transaction stays open during the upload. The post is
+        published once the image is stored. If either fails, the other is undone:
+        the hidden post is deleted, and an uploaded image is deleted. Hidden posts
+        left behind by a crash are removed, with their image, by the purge job.
         Args:
             user (User): The user creating the post.
             description (str): The description of the post.
@@ -49,36 +119,183 @@ class PostService:
             PostResponse: The response object containing the created post's data.
         """
 
-        # Upload image to Supabase
+        object_path = self.supabase.new_object_path()
+        pc = self._validate_post(
+            user, description, self.supabase.public_url(object_path)
+        )
+        post_id = uuid4()
+
+        async def insert_hidden(session: AsyncSession) -> datetime:
+            return await self._insert_post(session, post_id, pc, hidden=True)
+
+        async def publish(session: AsyncSession) -> None:
+            await session.execute(
+                update(Post).where(Post.id == post_id).values(deleted_at=None)
+            )
+            await record_post_change(session, post_id, POST_CREATED)
+
+        upload, insert = await asyncio.gather(
+            self.supabase.upload(image, object_path),
+            run_write(self.db, insert_hidden),
+            return_exceptions=True,
+        )
+        if isinstance(insert, BaseException):
+            await self.db.rollback()
+        if isinstance(upload, BaseException):
+            if not isinstance(insert, BaseException):
+                await self._discard_hidden_post(post_id)
+            if isinstance(upload, DependencyUnavailableError):
+                raise upload
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Image upload failed: {str(upload)}",
+            )
+
         try:
-            image_url = await self.supabase.upload(image)
+            if isinstance(insert, BaseException):
+                raise insert
+            await run_write(self.db, publish)
         except Exception as e:
+            await self.db.rollback()
+            if not isinstance(insert, BaseException):
+                await self._discard_hidden_post(post_id)
+            await self._discard_image(pc.image_url)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Image upload failed: {str(e)}",
+                detail=f"Failed to save post: {str(e)}",
+            )
+
+        invalidation_bus.publish(ENTITY_POST, str(post_id))
+        return self._created_post_response(user, post_id, pc, insert)
+
+    async def create_upload(self, user: User, sha256: str, size: int) -> dict[str, Any]:
+        """
+        Issue a short-lived signed URL for uploading a post image straight to storage,
+        so the image bytes never go through the API.
+        Args:
+            user (User): The user who will create the post.
+            sha256 (str): The hex SHA-256 hash of the image that will be uploaded.
+            size (int): The size of the image in bytes.
+        Raises:
+            HTTPException: If the image is too large or the URL cannot be signed.
+        Returns:
+            dict[str, Any]: The JSON payload of a PostUploadResponse, with the URL to PUT
+                the image to and the token to finalize the post with.
+        """
+
+        if size > settings.max_img_mb_size * 1024 * 1024:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Image exceeds {settings.max_img_mb_size}MB size limit.",
             )
 
-        # Create a new post and save it to the database
+        object_path = self.supabase.new_object_path()
         try:
-            pc = PostCreate(
-                description=description,
-                image_url=image_url,
-                user_id=user.id,
+            upload_url = await self.supabase.create_signed_upload_url(object_path)
+        except DependencyUnavailableError:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Upload signing failed: {str(e)}",
             )
-        except ValueError as e:
+
+        # The token binds the object to the user and to the announced content
+        payload = {
+            "user_id": str(user.id),
+            "path": object_path,
+            "sha256": sha256.lower(),
+            "size": size,
+        }
+        upload_token = sign_payload(
+            payload, settings.secret, settings.upload_url_ttl_seconds, PURPOSE_UPLOAD
+        )
+        return {
+            "uploadUrl": upload_url,
+            "uploadToken": upload_token,
+            "expiresIn": settings.upload_url_ttl_seconds,
+        }
+
+    async def finalize_upload(
+        self, user: User, upload_token: str, description: str
+    ) -> PostResponse:
+        """
+        Create a post from an image uploaded with a signed URL, once the stored
+        object is verified to match the size and hash announced when signing,
+        and to have the required dimensions.
+        Args:
+            user (User): The user creating the post.
+            upload_token (str): The token returned along the signed upload URL.
+            description (str): The description of the post.
+        Raises:
+            HTTPException: If the token is invalid or expired, the image is missing or
+                does not match, the post already exists, or saving it fails.
+        Returns:
+            PostResponse: The response object containing the created post's data.
+        """
+
+        payload = verify_signed_payload(upload_token, settings.secret, PURPOSE_UPLOAD)
+        if payload is None or payload["user_id"] != str(user.id):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Invalid post data: {str(e)}",
+                detail="Invalid or expired upload token.",
             )
-        post = Post(
-            description=pc.description,
-            image_url=str(pc.image_url),
-            user_id=pc.user_id,
-        )
+        image_url = self.supabase.public_url(payload["path"])
+
+        # A token can only be finalized once, which the unique image URL enforces
+        # on concurrent calls, this check only avoids downloading the image again
+        stmt = select(Post.id).where(Post.image_url == str(image_url))
+        if (await self.db.execute(stmt)).first() is not None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT, detail="Post already created."
+            )
+
+        # Fetch the stored image, without holding a connection during the download
+        await release_connection(self.db)
+        try:
+            data = await self.supabase.download(payload["path"], payload["size"] + 1)
+        except DependencyUnavailableError:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Image download failed: {str(e)}",
+            )
+        if data is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Image was not uploaded.",
+            )
+
+        error = _verify_uploaded_image(data, payload["size"], payload["sha256"])
+        if error is not None:
+            # The object is useless, so it is removed right away
+            await self._discard_image(image_url)
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+
+        return await self._save_post(user, description, image_url)
+
+    async def _save_post(
+        self, user: User, description: str, image_url: HttpUrl
+    ) -> PostResponse:
+        """
+        Persist a new post whose image is already stored.
+        Raises:
+            HTTPException: If the post data is invalid, a post already uses the image,
+                or database operations fail.
+        """
+
+        pc = self._validate_post(user, description, image_url)
+        post_id = uuid4()
         try:
-            self.db.add(post)
+            created_at = await self._insert_post(self.db, post_id, pc)
             await self.db.commit()
-            await self.db.refresh(post)
+        except IntegrityError:
+            # A concurrent call finalized the same upload first
+            await self.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT, detail="Post already created."
+            )
         except Exception as e:
             await self.db.rollback()
             raise HTTPException(
@@ -86,16 +303,84 @@ class PostService:
                 detail=f"Failed to save post: {str(e)}",
             )
 
-        # Return the created post
+        invalidation_bus.publish(ENTITY_POST, str(post_id))
+        return self._created_post_response(user, post_id, pc, created_at)
+
+    @staticmethod
+    def _validate_post(user: User, description: str, image_url: HttpUrl) -> PostCreate:
+        try:
+            return PostCreate(
+                description=description,
+                image_url=image_url,
+                user_id=user.id,
+            )
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid post data: {str(e)}",
+            )
+
+    async def _insert_post(
+        self, session: AsyncSession, post_id: UUID, pc: PostCreate, hidden: bool = False
+    ) -> datetime:
+        """
+        Insert a post and its change log entry, without committing.
+        Args:
+            session (AsyncSession): The session to insert with.
+            post_id (UUID): The id of the post.
+            pc (PostCreate): The validated post data.
+            hidden (bool, optional): Whether to insert the post behind a tombstone,
+                without a change log entry, until it is published. Defaults to False.
+        Returns:
+            datetime: The creation date of the post, returned by the insert itself.
+        """
+        stmt = (
+            insert(Post)
+            .values(
+                id=post_id,
+                description=pc.description,
+                image_url=str(pc.image_url),
+                user_id=pc.user_id,
+                deleted_at=datetime.now(timezone.utc) if hidden else None,
+            )
+            .returning(Post.created_at)
+        )
+        created_at = (await session.execute(stmt)).scalar_one()
+        if not hidden:
+            await record_post_change(session, post_id, POST_CREATED)
+        return created_at
+
+    async def _discard_hidden_post(self, post_id: UUID) -> None:
+        """Delete a post that was never published, leaving failures to the purge job."""
+
+        async def discard(session: AsyncSession) -> None:
+            await session.execute(delete(Post).where(Post.id == post_id))
+
+        try:
+            await run_write(self.db, discard)
+        except Exception:
+            await self.db.rollback()
+
+    async def _discard_image(self, image_url: HttpUrl) -> None:
+        """Delete an image no post will reference, leaving failures to the reconciliation job."""
+        try:
+            await self.supabase.delete(image_url)
+        except Exception:
+            pass
+
+    @staticmethod
+    def _created_post_response(
+        user: User, post_id: UUID, pc: PostCreate, created_at: datetime
+    ) -> PostResponse:
         try:
             pr = PostRead(
-                id=post.id,
-                description=post.description,
-                image_url=HttpUrl(post.image_url),
-                user_id=post.user_id,
+                id=post_id,
+                description=pc.description,
+                image_url=pc.image_url,
+                user_id=pc.user_id,
                 author_username=user.username,
                 author_email=user.email,
-                created_at=post.created_at,
+                created_at=created_at,
                 likes_count=0,
                 liked_by_user=False,
                 comments_count=0,
@@ -110,13 +395,14 @@ class PostService:
 
         return PostResponse(post=pr)
 
+    @query_budget(statements=8, rows=1000)
     async def get_posts(
         self,
         user: User,
         page: int = 1,
         page_size: int = 10,
         user_id: Optional[str] = None,
-    ) -> PaginatedPostsResponse:
+    ) -> dict[str, Any]:
         """
         Retrieve paginated posts with additional metadata for the given user.
         Args:
@@ -125,8 +411,9 @@ class PostService:
             page_size (int, optional): The number of posts per page. Defaults to 10.
             user_id (Optional[str], optional): If provided, filters posts by this user ID.
         Returns:
-            PaginatedPostsResponse: An object containing the list of posts with metadata,
-                the next page number (if available), and the total number of posts.
+            dict[str, Any]: The JSON payload of a PaginatedPostsResponse, containing the list
+                of posts with metadata, the next page number (if available), and the total
+                number of posts. It is built from trusted rows without validation.
         The response includes, for each post:
             - Post details (id, description, image_url, user_id, author info, created_at)
             - Number of likes and comments
@@ -138,132 +425,322 @@ class PostService:
         # Get posts with pagination and filter by user_id if provided
         stmt = (
             select(Post)
+            .where(Post.deleted_at.is_(None))
             .order_by(Post.created_at.desc())
             .offset((page - 1) * page_size)
             .limit(page_size)
-            .options(selectinload(Post.author))
+            .options(selectinload(Post.author).load_only(User.username, User.email))
         )
         if user_id:
             stmt = stmt.where(Post.user_id == user_id)
-        result = await self.db.execute(stmt)
+        result = await self.read_db.execute(stmt)
         posts = result.scalars().all()
         post_ids = [post.id for post in posts]
 
         # Count total posts for pagination and determine next page
-        count_stmt = select(func.count(Post.id))
+        count_stmt = select(func.count(Post.id)).where(Post.deleted_at.is_(None))
         if user_id:
             count_stmt = count_stmt.where(Post.user_id == user_id)
-        total = (await self.db.execute(count_stmt)).scalar() or 0
+        total = (await self.read_db.execute(count_stmt)).scalar() or 0
         next_page = page + 1 if (page * page_size) < total else None
 
+        interactions = await self._fetch_interactions(user, post_ids)
+
+        # Construct the response
+        data = [self._serialize_post(post, interactions) for post in posts]
+        return {"data": data, "nextPage": next_page, "total": total}
+
+    @query_budget(statements=1)
+    async def get_posts_etag(
+        self,
+        user: User,
+        page: int = 1,
+        page_size: int = 10,
+        user_id: Optional[str] = None,
+    ) -> str:
+        """
+        Compute the ETag of a page of posts from cheap version stamps, without
+        building the page itself.
+        Args:
+            user (User): The current authenticated user requesting the posts.
+            page (int, optional): The page number for pagination. Defaults to 1.
+            page_size (int, optional): The number of posts per page. Defaults to 10.
+            user_id (Optional[str], optional): If provided, filters posts by this user ID.
+        Returns:
+            str: A weak ETag that changes whenever the page returned by `get_posts` would.
+        The stamps are the number and latest creation time of the filtered posts,
+        plus the number and latest timestamp of the likes, comments and saves of
+        the posts on the page, and the latest account update of their authors,
+        all fetched in a single round trip.
+        """
+
+        post_filter = [Post.deleted_at.is_(None)]
+        if user_id:
+            post_filter.append(Post.user_id == user_id)
+        page_ids = (
+            select(Post.id)
+            .where(*post_filter)
+            .order_by(Post.created_at.desc())
+            .offset((page - 1) * page_size)
+            .limit(page_size)
+            .subquery()
+        )
+        on_page = select(page_ids.c.id)
+
+        stmt = select(
+            select(func.count(Post.id)).where(*post_filter).scalar_subquery(),
+            select(func.max(Post.created_at)).where(*post_filter).scalar_subquery(),
+            select(func.count(PostLike.id))
+            .where(PostLike.post_id.in_(on_page))
+            .scalar_subquery(),
+            select(func.max(PostLike.liked_at))
+            .where(PostLike.post_id.in_(on_page))
+            .scalar_subquery(),
+            select(func.count(PostComment.id))
+            .where(PostComment.post_id.in_(on_page), PostComment.deleted_at.is_(None))
+            .scalar_subquery(),
+            select(func.max(PostComment.created_at))
+            .where(PostComment.post_id.in_(on_page), PostComment.deleted_at.is_(None))
+            .scalar_subquery(),
+            select(func.count(PostSaved.id))
+            .where(PostSaved.post_id.in_(on_page), PostSaved.user_id == user.id)
+            .scalar_subquery(),
+            select(func.max(PostSaved.saved_at))
+            .where(PostSaved.post_id.in_(on_page), PostSaved.user_id == user.id)
+            .scalar_subquery(),
+            select(func.max(User.updated_at))
+            .where(User.id.in_(select(Post.user_id).where(Post.id.in_(on_page))))
+            .scalar_subquery(),
+        )
+        stamps = (await self.read_db.execute(stmt)).one()
+
+        return make_weak_etag(user.id, user_id, page, page_size, *stamps)
+
+    @query_budget(statements=9, rows=4000)
+    async def get_changes(
+        self, user: User, since: Optional[int] = None, limit: int = 100
+    ) -> dict[str, Any]:
+        """
+        Retrieve the feed changes recorded in the post change log after a token.
+        Args:
+            user (User): The current authenticated user polling for changes.
+            since (Optional[int], optional): The token returned by the previous poll. When
+                omitted, no changes are returned, only the current token to start from.
+            limit (int, optional): The maximum number of log entries to read. Defaults to 100.
+        Returns:
+            dict[str, Any]: The JSON payload of a PostChangesResponse, containing the
+                created posts, the counters of updated posts, the ids of deleted posts,
+                the token to poll from next and whether more changes are pending.
+                Changes younger than `settings.post_changes_settle_seconds` are
+                returned again by the next poll.
+        """
+
+        # Ids are drawn when a change is written but only become visible when its
+        # transaction commits, possibly after a greater id. The token is only
+        # moved past changes older than the settle window, so one committed late
+        # is still read by the next poll, at the cost of re-reading recent ones.
+        settled_at = datetime.now(timezone.utc) - timedelta(
+            seconds=settings.post_changes_settle_seconds
+        )
+
+        if since is None:
+            latest_stmt = select(func.max(PostChange.id)).where(
+                PostChange.changed_at <= settled_at
+            )
+            latest = (await self.read_db.execute(latest_stmt)).scalar() or 0
+            return {
+                "created": [],
+                "updated": [],
+                "deleted": [],
+                "nextToken": latest,
+                "hasMore": False,
+            }
+
+        # Read one extra entry to know whether more changes are pending
+        stmt = (
+            select(
+                PostChange.id,
+                PostChange.post_id,
+                PostChange.kind,
+                (PostChange.changed_at <= settled_at).label("settled"),
+            )
+            .where(PostChange.id > since)
+            .order_by(PostChange.id)
+            .limit(limit + 1)
+        )
+        changes = (await self.read_db.execute(stmt)).all()
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+        next_token = since
+        for change in changes:
+            if not change.settled:
+                break
+            next_token = change.id
+        # Polling right away would only read the same unsettled changes again
+        has_more = has_more and bool(changes) and next_token == changes[-1].id
+
+        # Deletions win over creations, which already include the latest counters
+        kinds: dict[UUID, set[str]] = {}
+        for change in changes:
+            kinds.setdefault(change.post_id, set()).add(change.kind)
+        deleted_ids = [i for i, k in kinds.items() if POST_DELETED in k]
+        created_ids = [
+            i for i, k in kinds.items() if POST_CREATED in k and POST_DELETED not in k
+        ]
+        updated_ids = [i for i, k in kinds.items() if k == {POST_COUNTERS_CHANGED}]
+
+        # Posts deleted after the last entry read are skipped, their tombstone comes next
+        posts_stmt = (
+            select(Post)
+            .where(Post.id.in_(created_ids), Post.deleted_at.is_(None))
+            .order_by(Post.created_at.desc())
+            .options(selectinload(Post.author).load_only(User.username, User.email))
+        )
+        posts = (await self.read_db.execute(posts_stmt)).scalars().all()
+        interactions = await self._fetch_interactions(
+            user, [post.id for post in posts] + updated_ids
+        )
+
+        return {
+            "created": [self._serialize_post(post, interactions) for post in posts],
+            "updated": [
+                PostCounters.serialize_row(
+                    id=post_id,
+                    likes_count=interactions.likes.get(post_id, 0),
+                    liked_by_user=post_id in interactions.liked,
+                    comments_count=interactions.comments.get(post_id, 0),
+                    commented_by_user=post_id in interactions.commented,
+                )
+                for post_id in updated_ids
+            ],
+            "deleted": [str(post_id) for post_id in deleted_ids],
+            "nextToken": next_token,
+            "hasMore": has_more,
+        }
+
+    async def _fetch_interactions(
+        self, user: User, post_ids: list[UUID]
+    ) -> _PostInteractions:
+        """
+        Fetch the counters of the given posts and how the user interacted with them.
+        """
+
         # Fetch likes count for each post
         likes_stmt = (
             select(PostLike.post_id, func.count(PostLike.user_id))
             .where(PostLike.post_id.in_(post_ids))
             .group_by(PostLike.post_id)
         )
-        likes_result = await self.db.execute(likes_stmt)
+        likes_result = await self.read_db.execute(likes_stmt)
         likes_map = {post_id: count for post_id, count in likes_result.all()}
 
         # Fetch liked posts by the user
         liked_stmt = select(PostLike.post_id).where(
             PostLike.post_id.in_(post_ids), PostLike.user_id == user.id
         )
-        liked_result = await self.db.execute(liked_stmt)
+        liked_result = await self.read_db.execute(liked_stmt)
         liked_post_ids = {post_id for (post_id,) in liked_result.all()}
 
         # Fetch comments count for each post
         comments_stmt = (
             select(PostComment.post_id, func.count(PostComment.id))
-            .where(PostComment.post_id.in_(post_ids))
+            .where(PostComment.post_id.in_(post_ids), PostComment.deleted_at.is_(None))
             .group_by(PostComment.post_id)
         )
-        comments_result = await self.db.execute(comments_stmt)
+        comments_result = await self.read_db.execute(comments_stmt)
         comments_map = {post_id: count for post_id, count in comments_result.all()}
 
         # Fetch commented posts by the user
         commented_stmt = select(PostComment.post_id).where(
-            PostComment.post_id.in_(post_ids), PostComment.user_id == user.id
+            PostComment.post_id.in_(post_ids),
+            PostComment.user_id == user.id,
+            PostComment.deleted_at.is_(None),
         )
-        commented_result = await self.db.execute(commented_stmt)
+        commented_result = await self.read_db.execute(commented_stmt)
         commented_post_ids = {post_id for (post_id,) in commented_result.all()}
 
         # Fetch saved posts by the user
         saved_stmt = select(PostSaved.post_id).where(
             PostSaved.post_id.in_(post_ids), PostSaved.user_id == user.id
         )
-        saved_result = await self.db.execute(saved_stmt)
+        saved_result = await self.read_db.execute(saved_stmt)
         saved_post_ids = {post_id for (post_id,) in saved_result.all()}
 
-        # Construct the response
-        data = []
-        for post in posts:
-            pr = PostRead(
-                id=post.id,
-                description=post.description,
-                image_url=HttpUrl(post.image_url),
-                user_id=post.user_id,
-                author_username=post.author.username,
-                author_email=post.author.email,
-                created_at=post.created_at,
-                likes_count=likes_map.get(post.id, 0),
-                liked_by_user=post.id in liked_post_ids,
-                comments_count=comments_map.get(post.id, 0),
-                commented_by_user=post.id in commented_post_ids,
-                saved_by_user=post.id in saved_post_ids,
-            )
-            data.append(pr.model_dump(by_alias=True))
-        return PaginatedPostsResponse(data=data, nextPage=next_page, total=total)
+        return _PostInteractions(
+            likes=likes_map,
+            liked=liked_post_ids,
+            comments=comments_map,
+            commented=commented_post_ids,
+            saved=saved_post_ids,
+        )
+
+    @staticmethod
+    def _serialize_post(post: Post, interactions: _PostInteractions) -> dict[str, Any]:
+        return PostRead.serialize_row(
+            id=post.id,
+            description=post.description,
+            image_url=post.image_url,
+            user_id=post.user_id,
+            author_username=post.author.username,
+            author_email=post.author.email,
+            created_at=post.created_at,
+            likes_count=interactions.likes.get(post.id, 0),
+            liked_by_user=post.id in interactions.liked,
+            comments_count=interactions.comments.get(post.id, 0),
+            commented_by_user=post.id in interactions.commented,
+            saved_by_user=post.id in interactions.saved,
+        )
 
     async def delete_post(self, post: Post) -> None:
         """
-        Asynchronously deletes a post and its associated image.
-        This method performs the following actions:
-        1. Deletes the image associated with the given post from Supabase storage.
-        2. Deletes the post record from the database.
+        Asynchronously deletes a post, by setting its tombstone with a single UPDATE.
+        The post is hidden from every read right away, while its likes, comments,
+        saves and image are removed later, in batches, by the purge job.
         Args:
             post (Post): The post instance to be deleted.
-        Raises:
-            HTTPException: If image deletion from Supabase fails, raises an HTTP 500 error with details.
         """
-
-        # Delete the image from Supabase
-        try:
-            await self.supabase.delete(HttpUrl(post.image_url))
-        except Exception:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Image deletion from storage failed.",
-            )
-
-        # Delete the post from database
-        await self.db.delete(post)
+        await self.db.execute(
+            update(Post)
+            .where(Post.id == post.id)
+            .values(deleted_at=datetime.now(timezone.utc))
+        )
+        await record_post_change(self.db, post.id, POST_DELETED)
         await self.db.commit()
+        invalidation_bus.publish(ENTITY_POST, str(post.id))
 
     async def delete_all_from(self, user: User) -> None:
         """
         Asynchronously deletes all posts created by the specified user, including their associated images.
+        The posts are removed for good in a single transaction, as the user is being
+        deleted, and the deletion of their images is queued in the outbox.
         Args:
             user (User): The user whose posts are to be deleted.
         Returns:
             None
         """
 
-        # Fetch all posts by the user
+        # Fetch all posts by the user, tombstoned ones included
         stmt = select(Post).where(Post.user_id == user.id)
         result = await self.db.execute(stmt)
         posts = result.scalars().all()
 
-        # Delete each post and its associated image
+        # Delete each post and queue the deletion of its image
+        for post in posts:
+            await record_post_change(self.db, post.id, POST_DELETED)
+            await enqueue_image_deletion(self.db, post.image_url)
+            await self.db.delete(post)
+        await self.db.commit()
         for post in posts:
-            await self.delete_post(post)
+            invalidation_bus.publish(ENTITY_POST, str(post.id))
+        outbox_worker.wake()
 
 
 def get_post_service(
     db: AsyncSession = Depends(get_async_session),
     supabase_client: SupabaseStorageClient = Depends(get_supabase_client),
+    read_db: AsyncSession = Depends(get_read_session),
 ) -> PostService:
     """
     Dependency to get the PostService instance.
     """
-    return PostService(db, supabase_client)
+    return PostService(db, supabase_client, read_db)
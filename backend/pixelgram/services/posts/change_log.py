@@ -0,0 +1,32 @@
+from uuid import UUID
+
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from pixelgram.models.post_change import (
+    POST_COUNTERS_CHANGED,
+    POST_DELETED,
+    PostChange,
+)
+
+
+async def record_post_change(session: AsyncSession, post_id: UUID, kind: str) -> None:
+    """
+    Append an entry to the post change log, within the caller's transaction.
+    Older entries made redundant by the new one are dropped, so the log grows
+    with the number of posts rather than the number of likes and comments.
+    Args:
+        session (AsyncSession): The session the change is written with.
+        post_id (UUID): The post that changed.
+        kind (str): The kind of change, one of the `POST_*` constants.
+    """
+    if kind == POST_DELETED:
+        await session.execute(delete(PostChange).where(PostChange.post_id == post_id))
+    elif kind == POST_COUNTERS_CHANGED:
+        await session.execute(
+            delete(PostChange).where(
+                PostChange.post_id == post_id,
+                PostChange.kind == POST_COUNTERS_CHANGED,
+            )
+        )
+    session.add(PostChange(post_id=post_id, kind=kind))
@@ -1,18 +1,24 @@
+from datetime import datetime, timezone
+from typing import Any, Optional
 from uuid import UUID
 
 from fastapi import Depends, HTTPException, status
-from sqlalchemy import func, select
+from sqlalchemy import func, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
-from pixelgram.db import get_async_session
+from pixelgram.db import get_async_session, get_read_session, run_write
+from pixelgram.instrumentation import query_budget
+from pixelgram.invalidation import ENTITY_POST, invalidation_bus
+from pixelgram.models.post_change import POST_COUNTERS_CHANGED
 from pixelgram.models.post_comment import PostComment
 from pixelgram.models.user import User
 from pixelgram.schemas.post_comment import (
     CommentResponse,
-    PaginatedCommentsResponse,
     PostCommentRead,
 )
+from pixelgram.services.posts.change_log import record_post_change
+from pixelgram.utils.etag import make_weak_etag
 
 
 class CommentService:
@@ -20,12 +26,14 @@ class CommentService:
     Service for handling post comments.
     """
 
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: AsyncSession, read_db: Optional[AsyncSession] = None):
         self.db = db
+        self.read_db = read_db or db
 
+    @query_budget(statements=3, rows=1000)
     async def get_by_post_id(
         self, post_id: UUID, page: int, page_size: int, solicitor_id: UUID
-    ) -> PaginatedCommentsResponse:
+    ) -> dict[str, Any]:
         """
         Retrieve paginated comments for a specific post.
 
@@ -36,7 +44,7 @@ class CommentService:
             solicitor_id (UUID): The ID of the user making the request, used to determine comment ownership.
 
         Returns:
-            PaginatedCommentsResponse: An object containing the list of comments, the next page number (if any), and the total number of comments.
+            dict[str, Any]: The JSON payload of a PaginatedCommentsResponse, containing the list of comments, the next page number (if any), and the total number of comments. It is built from trusted rows without validation.
 
         Notes:
             - Comments are ordered by creation date in descending order (most recent first).
@@ -45,26 +53,27 @@ class CommentService:
 
         stmt = (
             select(PostComment)
-            .where(PostComment.post_id == post_id)
+            .where(PostComment.post_id == post_id, PostComment.deleted_at.is_(None))
             .order_by(PostComment.created_at.desc())
             .offset((page - 1) * page_size)
             .limit(page_size)
-            .options(selectinload(PostComment.user))
+            .options(
+                selectinload(PostComment.user).load_only(User.username, User.email)
+            )
         )
-        result = await self.db.execute(stmt)
+        result = await self.read_db.execute(stmt)
         comments = result.scalars().all()
 
         # Count total comments for pagination and determine next page
         count_stmt = select(func.count(PostComment.id)).where(
-            PostComment.post_id == post_id
+            PostComment.post_id == post_id, PostComment.deleted_at.is_(None)
         )
-        total = (await self.db.execute(count_stmt)).scalar() or 0
+        total = (await self.read_db.execute(count_stmt)).scalar() or 0
         next_page = page + 1 if (page * page_size) < total else None
 
         # Construct the response
-        data = []
-        for c in comments:
-            cr = PostCommentRead(
+        data = [
+            PostCommentRead.serialize_row(
                 id=c.id,
                 post_id=c.post_id,
                 user_id=c.user_id,
@@ -74,10 +83,47 @@ class CommentService:
                 created_at=c.created_at,
                 by_user=(c.user_id == solicitor_id),
             )
-            data.append(cr.model_dump(by_alias=True))
+            for c in comments
+        ]
 
-        return PaginatedCommentsResponse(data=data, nextPage=next_page, total=total)
+        return {"data": data, "nextPage": next_page, "total": total}
 
+    @query_budget(statements=1)
+    async def get_etag(
+        self, post_id: UUID, page: int, page_size: int, solicitor_id: UUID
+    ) -> str:
+        """
+        Compute the ETag of a page of comments from cheap version stamps, without
+        building the page itself.
+
+        Args:
+            post_id (UUID): The unique identifier of the post the comments belong to.
+            page (int): The current page number for pagination.
+            page_size (int): The number of comments per page.
+            solicitor_id (UUID): The ID of the user making the request.
+
+        Returns:
+            str: A weak ETag that changes whenever the page returned by `get_by_post_id` would.
+        """
+
+        comments = select(PostComment.user_id).where(
+            PostComment.post_id == post_id, PostComment.deleted_at.is_(None)
+        )
+        # Authors are shown along their comments, so their account updates count too
+        stmt = select(
+            func.count(PostComment.id),
+            func.max(PostComment.created_at),
+            select(func.max(User.updated_at))
+            .where(User.id.in_(comments))
+            .scalar_subquery(),
+        ).where(PostComment.post_id == post_id, PostComment.deleted_at.is_(None))
+        total, latest, authors_updated = (await self.read_db.execute(stmt)).one()
+
+        return make_weak_etag(
+            solicitor_id, post_id, page, page_size, total, latest, authors_updated
+        )
+
+    @query_budget(statements=3)
     async def post_comment(
         self, post_id: UUID, user: User, content: str
     ) -> CommentResponse:
@@ -105,9 +151,15 @@ class CommentService:
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Invalid comment data: {str(e)}",
             )
-        self.db.add(comment)
-        await self.db.commit()
-        await self.db.refresh(comment)
+
+        async def add(session: AsyncSession) -> None:
+            session.add(comment)
+            # Flush so the defaults (id, created_at) are populated
+            await session.flush()
+            await record_post_change(session, post_id, POST_COUNTERS_CHANGED)
+
+        await run_write(self.db, add)
+        invalidation_bus.publish(ENTITY_POST, str(post_id))
 
         # Return the created comment
         cr = PostCommentRead(
@@ -124,7 +176,8 @@ class CommentService:
 
     async def delete_comment(self, comment: PostComment) -> None:
         """
-        Asynchronously deletes a given comment from the database.
+        Asynchronously deletes a given comment, by setting its tombstone with a single
+        UPDATE. The row itself is removed later by the purge job.
         Args:
             comment (PostComment): The comment instance to be deleted.
         Returns:
@@ -132,14 +185,26 @@ class CommentService:
         """
 
         # Delete the comment
-        await self.db.delete(comment)
-        await self.db.commit()
+        comment_id = comment.id
+        post_id = comment.post_id
+
+        async def remove(session: AsyncSession) -> None:
+            await session.execute(
+                update(PostComment)
+                .where(PostComment.id == comment_id)
+                .values(deleted_at=datetime.now(timezone.utc))
+            )
+            await record_post_change(session, post_id, POST_COUNTERS_CHANGED)
+
+        await run_write(self.db, remove)
+        invalidation_bus.publish(ENTITY_POST, str(post_id))
 
 
 def get_comment_service(
     db: AsyncSession = Depends(get_async_session),
+    read_db: AsyncSession = Depends(get_read_session),
 ) -> CommentService:
     """
     Dependency to get the PostComment service.
     """
-    return CommentService(db)
+    return CommentService(db, read_db)
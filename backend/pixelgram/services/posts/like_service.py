@@ -4,8 +4,12 @@ from fastapi import Depends, HTTPException, status
 from sqlalchemy import delete, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from pixelgram.db import get_async_session
+from pixelgram.db import get_async_session, run_write
+from pixelgram.instrumentation import query_budget
+from pixelgram.invalidation import ENTITY_POST, invalidation_bus
+from pixelgram.models.post_change import POST_COUNTERS_CHANGED
 from pixelgram.models.post_like import PostLike
+from pixelgram.services.posts.change_log import record_post_change
 
 
 class LikeService:
@@ -16,6 +20,7 @@ class LikeService:
     def __init__(self, db: AsyncSession):
         self.db = db
 
+    @query_budget(statements=4)
     async def like_post(self, post_id: UUID, user_id: UUID) -> None:
         """
         Asynchronously likes a post on behalf of a user.
@@ -28,19 +33,24 @@ class LikeService:
             HTTPException: If the user has already liked the post (HTTP 409 Conflict).
         """
 
-        # Check if user has already liked the post
-        stmt = select(PostLike).where(
-            PostLike.post_id == post_id, PostLike.user_id == user_id
-        )
-        if (await self.db.execute(stmt)).scalar_one_or_none():
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT, detail="Post already liked"
+        async def like(session: AsyncSession) -> None:
+            # Check if user has already liked the post
+            stmt = select(PostLike).where(
+                PostLike.post_id == post_id, PostLike.user_id == user_id
             )
+            if (await session.execute(stmt)).scalar_one_or_none():
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT, detail="Post already liked"
+                )
 
-        # Add like
-        self.db.add(PostLike(post_id=post_id, user_id=user_id))
-        await self.db.commit()
+            # Add like
+            session.add(PostLike(post_id=post_id, user_id=user_id))
+            await record_post_change(session, post_id, POST_COUNTERS_CHANGED)
 
+        await run_write(self.db, like)
+        invalidation_bus.publish(ENTITY_POST, str(post_id))
+
+    @query_budget(statements=3)
     async def unlike_post(self, post_id: UUID, user_id: UUID) -> None:
         """
         Asynchronously removes a like from a post by a specific user.
@@ -53,19 +63,23 @@ class LikeService:
             None
         """
 
-        # Delete like
-        delete_stmt = (
-            delete(PostLike)
-            .where(PostLike.post_id == post_id, PostLike.user_id == user_id)
-            .execution_options(synchronize_session="fetch")
-        )
-        result = await self.db.execute(delete_stmt)
-        # If like was not deleted, it means the user didn't like the post in the first place
-        if result.rowcount == 0:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST, detail="Post not liked"
+        async def unlike(session: AsyncSession) -> None:
+            # Delete like
+            delete_stmt = (
+                delete(PostLike)
+                .where(PostLike.post_id == post_id, PostLike.user_id == user_id)
+                .execution_options(synchronize_session="fetch")
             )
-        await self.db.commit()
+            result = await session.execute(delete_stmt)
+            # If like was not deleted, it means the user didn't like the post in the first place
+            if result.rowcount == 0:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST, detail="Post not liked"
+                )
+            await record_post_change(session, post_id, POST_COUNTERS_CHANGED)
+
+        await run_write(self.db, unlike)
+        invalidation_bus.publish(ENTITY_POST, str(post_id))
 
 
 def get_like_service(db: AsyncSession = Depends(get_async_session)) -> LikeService:
@@ -0,0 +1,211 @@
+import asyncio
+import logging
+from collections.abc import AsyncGenerator, Iterable
+from contextlib import asynccontextmanager
+from typing import Any
+from uuid import UUID
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from pixelgram.db import async_session_maker
+from pixelgram.invalidation import ENTITY_POST, invalidation_bus
+from pixelgram.models.post_comment import PostComment
+from pixelgram.models.post_like import PostLike
+from pixelgram.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CounterSubscription:
+    """
+    The live counters of a set of posts, as seen by one subscriber.
+
+    Updates are coalesced per post: a subscriber that falls behind only ever
+    holds the latest counters of the posts it watches, so a slow client costs
+    a bounded amount of memory and never slows the hub down.
+    """
+
+    def __init__(self, post_ids: set[UUID]):
+        self.post_ids = post_ids
+        self._pending: dict[UUID, dict[str, Any]] = {}
+        self._ready = asyncio.Event()
+
+    def push(self, counters: dict[UUID, dict[str, Any]]) -> None:
+        """Merge the given counters into the pending updates, newest wins."""
+        for post_id, values in counters.items():
+            if post_id in self.post_ids:
+                self._pending[post_id] = values
+        if self._pending:
+            self._ready.set()
+
+    async def get(self, timeout: float) -> dict[UUID, dict[str, Any]]:
+        """
+        Wait for pending updates and take them.
+        Args:
+            timeout (float): The maximum number of seconds to wait.
+        Returns:
+            dict[UUID, dict[str, Any]]: The latest counters of every post that
+                changed, or an empty dict if nothing changed before the timeout.
+        """
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return {}
+        pending, self._pending = self._pending, {}
+        self._ready.clear()
+        return pending
+
+
+class LiveCounterHub:
+    """
+    In-process pub/sub hub for the likes and comments counters of posts.
+
+    Writers publish the ids of the posts they changed, through the invalidation
+    bus so changes made by other workers are streamed as well. Every `interval` seconds
+    the hub fetches the counters of the changed posts that someone watches, in
+    one round trip, and pushes them to the matching subscribers. A post thus
+    produces at most one update per interval, however busy it is.
+    """
+
+    def __init__(
+        self,
+        session_maker: async_sessionmaker[AsyncSession],
+        interval: float = 1.0,
+        max_subscribers: int = 1000,
+    ):
+        self.session_maker = session_maker
+        self.interval = interval
+        self.max_subscribers = max_subscribers
+        self._subscriptions: set[CounterSubscription] = set()
+        self._dirty: set[UUID] = set()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def full(self) -> bool:
+        """Whether the hub reached its maximum number of subscribers."""
+        return len(self._subscriptions) >= self.max_subscribers
+
+    def start(self) -> None:
+        """Start the flusher task on the running event loop."""
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flusher task."""
+        if not self.running:
+            return
+        self._task.cancel()  # type: ignore
+        try:
+            await self._task  # type: ignore
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def publish(self, post_id: UUID) -> None:
+        """
+        Signal that the counters of a post changed.
+        This is cheap and never blocks, the counters are fetched on the next flush.
+        Args:
+            post_id (UUID): The post whose likes or comments changed.
+        """
+        self._dirty.add(post_id)
+
+    def on_change(self, entity: str, entity_id: str) -> None:
+        """Invalidation bus handler publishing the posts changed by any worker."""
+        if entity == ENTITY_POST:
+            self.publish(UUID(entity_id))
+
+    @asynccontextmanager
+    async def subscribe(
+        self, post_ids: Iterable[UUID]
+    ) -> AsyncGenerator[CounterSubscription, None]:
+        """
+        Subscribe to the counters of the given posts.
+        The current counters are pushed right away, so subscribers start in sync.
+        Args:
+            post_ids (Iterable[UUID]): The posts to watch.
+        Yields:
+            CounterSubscription: The subscription, removed from the hub on exit.
+        """
+        subscription = CounterSubscription(set(post_ids))
+        self._subscriptions.add(subscription)
+        try:
+            subscription.push(await self.fetch_counters(subscription.post_ids))
+            yield subscription
+        finally:
+            self._subscriptions.discard(subscription)
+
+    async def flush(self) -> None:
+        """Push the counters of the posts changed since the last flush."""
+        dirty, self._dirty = self._dirty, set()
+        watched = set().union(*(s.post_ids for s in self._subscriptions))
+        changed = dirty & watched
+        if not changed:
+            return
+
+        try:
+            counters = await self.fetch_counters(changed)
+        except Exception:
+            # Keep the posts dirty so the next flush retries them
+            self._dirty |= changed
+            raise
+        for subscription in list(self._subscriptions):
+            subscription.push(counters)
+
+    async def fetch_counters(
+        self, post_ids: Iterable[UUID]
+    ) -> dict[UUID, dict[str, Any]]:
+        """
+        Fetch the likes and comments counters of the given posts.
+        Returns:
+            dict[UUID, dict[str, Any]]: The camelCase counters payload of each post.
+        """
+        post_ids = list(post_ids)
+        async with self.session_maker() as session:
+            likes_stmt = (
+                select(PostLike.post_id, func.count(PostLike.id))
+                .where(PostLike.post_id.in_(post_ids))
+                .group_by(PostLike.post_id)
+            )
+            likes = dict((await session.execute(likes_stmt)).tuples().all())
+            comments_stmt = (
+                select(PostComment.post_id, func.count(PostComment.id))
+                .where(
+                    PostComment.post_id.in_(post_ids), PostComment.deleted_at.is_(None)
+                )
+                .group_by(PostComment.post_id)
+            )
+            comments = dict((await session.execute(comments_stmt)).tuples().all())
+
+        return {
+            post_id: {
+                "id": str(post_id),
+                "likesCount": likes.get(post_id, 0),
+                "commentsCount": comments.get(post_id, 0),
+            }
+            for post_id in post_ids
+        }
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception:
+                # A failed flush must not stop the hub
+                logger.exception("Failed to flush the live counters")
+
+
+live_counter_hub = LiveCounterHub(
+    async_session_maker,
+    interval=settings.live_counters_interval_seconds,
+    max_subscribers=settings.live_counters_max_subscribers,
+)
+"""Hub for live post counters, started by the application"""
+
+invalidation_bus.subscribe(live_counter_hub.on_change)
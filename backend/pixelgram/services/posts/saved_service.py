@@ -1,23 +1,28 @@
+from typing import Any, Optional
 from uuid import UUID
 
 from fastapi import Depends, HTTPException, status
-from pydantic import HttpUrl
 from sqlalchemy import delete, func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
-from pixelgram.db import get_async_session
+from pixelgram.db import get_async_session, get_read_session, run_write
+from pixelgram.instrumentation import query_budget
+from pixelgram.invalidation import ENTITY_SAVED, invalidation_bus
 from pixelgram.models.post import Post
 from pixelgram.models.post_comment import PostComment
 from pixelgram.models.post_like import PostLike
 from pixelgram.models.post_saved import PostSaved
-from pixelgram.schemas.post import PaginatedPostsResponse, PostRead
+from pixelgram.models.user import User
+from pixelgram.schemas.post import PostRead
 
 
 class SavedService:
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: AsyncSession, read_db: Optional[AsyncSession] = None):
         self.db = db
+        self.read_db = read_db or db
 
+    @query_budget(statements=2)
     async def save_post(self, post_id: UUID, user_id: UUID) -> None:
         """
         Saves a post for a user if it has not already been saved.
@@ -30,20 +35,24 @@ class SavedService:
             None
         """
 
-        # Check if user has already saved the post
-        stmt = select(PostSaved).where(
-            PostSaved.post_id == post_id, PostSaved.user_id == user_id
-        )
-
-        if (await self.db.execute(stmt)).scalar_one_or_none():
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT, detail="Post already saved"
+        async def save(session: AsyncSession) -> None:
+            # Check if user has already saved the post
+            stmt = select(PostSaved).where(
+                PostSaved.post_id == post_id, PostSaved.user_id == user_id
             )
 
-        # Add save
-        self.db.add(PostSaved(post_id=post_id, user_id=user_id))
-        await self.db.commit()
+            if (await session.execute(stmt)).scalar_one_or_none():
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT, detail="Post already saved"
+                )
+
+            # Add save
+            session.add(PostSaved(post_id=post_id, user_id=user_id))
 
+        await run_write(self.db, save)
+        invalidation_bus.publish(ENTITY_SAVED, str(user_id))
+
+    @query_budget(statements=1)
     async def unsave_post(self, post_id: UUID, user_id: UUID) -> None:
         """
         Asynchronously removes a saved post for a given user.
@@ -56,23 +65,27 @@ class SavedService:
             None
         """
 
-        # Delete save
-        delete_stmt = (
-            delete(PostSaved)
-            .where(PostSaved.post_id == post_id, PostSaved.user_id == user_id)
-            .execution_options(synchronize_session="fetch")
-        )
-        result = await self.db.execute(delete_stmt)
-        # If save was not deleted, it means the user didn't save the post in the first place
-        if result.rowcount == 0:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST, detail="Post not saved"
+        async def unsave(session: AsyncSession) -> None:
+            # Delete save
+            delete_stmt = (
+                delete(PostSaved)
+                .where(PostSaved.post_id == post_id, PostSaved.user_id == user_id)
+                .execution_options(synchronize_session="fetch")
             )
-        await self.db.commit()
+            result = await session.execute(delete_stmt)
+            # If save was not deleted, it means the user didn't save the post in the first place
+            if result.rowcount == 0:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST, detail="Post not saved"
+                )
 
+        await run_write(self.db, unsave)
+        invalidation_bus.publish(ENTITY_SAVED, str(user_id))
+
+    @query_budget(statements=8, rows=1000)
     async def get_saved_posts(
         self, user_id: UUID, page: int = 1, page_size: int = 10
-    ) -> PaginatedPostsResponse:
+    ) -> dict[str, Any]:
         """
         Retrieve a paginated list of posts saved by a specific user, including metadata such as likes, comments, and user interactions.
         Args:
@@ -80,7 +93,7 @@ class SavedService:
             page (int, optional): The page number for pagination. Defaults to 1.
             page_size (int, optional): The number of posts per page. Defaults to 10.
         Returns:
-            PaginatedPostsResponse: An object containing the paginated list of saved posts, the next page number (if any), and the total count of saved posts.
+            dict[str, Any]: The JSON payload of a PaginatedPostsResponse, containing the paginated list of saved posts, the next page number (if any), and the total count of saved posts. It is built from trusted rows without validation.
         The response includes for each post:
             - Post details (id, description, image_url, user_id, author info, created_at)
             - Number of likes and comments
@@ -92,74 +105,80 @@ class SavedService:
         saved_posts_ids_stmt = select(PostSaved.post_id).where(
             PostSaved.user_id == user_id
         )
-        result = await self.db.execute(saved_posts_ids_stmt)
+        result = await self.read_db.execute(saved_posts_ids_stmt)
         saved_posts_ids = [row[0] for row in result.fetchall()]
 
         if not saved_posts_ids:
-            return PaginatedPostsResponse(data=[], nextPage=None, total=0)
+            return {"data": [], "nextPage": None, "total": 0}
 
         stmt = (
             select(Post)
-            .where(Post.id.in_(saved_posts_ids))
+            .where(Post.id.in_(saved_posts_ids), Post.deleted_at.is_(None))
             .order_by(Post.created_at.desc())
             .offset((page - 1) * page_size)
             .limit(page_size)
-            .options(
-                selectinload(Post.author),
-                selectinload(Post.post_likes),
-                selectinload(Post.post_comments),
-            )
+            .options(selectinload(Post.author).load_only(User.username, User.email))
         )
 
-        result = await self.db.execute(stmt)
+        result = await self.read_db.execute(stmt)
         saved_posts = result.scalars().all()
+        # The counters and interactions are only needed for the posts of the page
+        page_post_ids = [post.id for post in saved_posts]
 
         # Count total saved posts for pagination and determine next page
-        count_stmt = select(func.count(PostSaved.id))
+        count_stmt = (
+            select(func.count(PostSaved.id))
+            .join(Post, Post.id == PostSaved.post_id)
+            .where(Post.deleted_at.is_(None))
+        )
         if user_id:
             count_stmt = count_stmt.where(PostSaved.user_id == user_id)
-        total = (await self.db.execute(count_stmt)).scalar() or 0
+        total = (await self.read_db.execute(count_stmt)).scalar() or 0
         next_page = page + 1 if (page * page_size) < total else None
 
         # Fetch likes count for each post
         likes_stmt = (
             select(PostLike.post_id, func.count(PostLike.user_id))
-            .where(PostLike.post_id.in_(saved_posts_ids))
+            .where(PostLike.post_id.in_(page_post_ids))
             .group_by(PostLike.post_id)
         )
-        likes_result = await self.db.execute(likes_stmt)
+        likes_result = await self.read_db.execute(likes_stmt)
         likes_map = {post_id: count for post_id, count in likes_result.all()}
 
         # Fetch liked posts by the user
         liked_stmt = select(PostLike.post_id).where(
-            PostLike.post_id.in_(saved_posts_ids), PostLike.user_id == user_id
+            PostLike.post_id.in_(page_post_ids), PostLike.user_id == user_id
         )
-        liked_result = await self.db.execute(liked_stmt)
+        liked_result = await self.read_db.execute(liked_stmt)
         liked_post_ids = {post_id for (post_id,) in liked_result.all()}
 
         # Fetch comments count for each post
         comments_stmt = (
             select(PostComment.post_id, func.count(PostComment.id))
-            .where(PostComment.post_id.in_(saved_posts_ids))
+            .where(
+                PostComment.post_id.in_(page_post_ids),
+                PostComment.deleted_at.is_(None),
+            )
             .group_by(PostComment.post_id)
         )
-        comments_result = await self.db.execute(comments_stmt)
+        comments_result = await self.read_db.execute(comments_stmt)
         comments_map = {post_id: count for post_id, count in comments_result.all()}
 
         # Fetch commented posts by the user
         commented_stmt = select(PostComment.post_id).where(
-            PostComment.post_id.in_(saved_posts_ids), PostComment.user_id == user_id
+            PostComment.post_id.in_(page_post_ids),
+            PostComment.user_id == user_id,
+            PostComment.deleted_at.is_(None),
         )
-        commented_result = await self.db.execute(commented_stmt)
+        commented_result = await self.read_db.execute(commented_stmt)
         commented_post_ids = {post_id for (post_id,) in commented_result.all()}
 
         # Construct the response
-        data = []
-        for saved_post in saved_posts:
-            pr = PostRead(
+        data = [
+            PostRead.serialize_row(
                 id=saved_post.id,
                 description=saved_post.description,
-                image_url=HttpUrl(saved_post.image_url),
+                image_url=saved_post.image_url,
                 user_id=saved_post.user_id,
                 author_username=saved_post.author.username,
                 author_email=saved_post.author.email,
@@ -170,13 +189,17 @@ class SavedService:
                 commented_by_user=saved_post.id in commented_post_ids,
                 saved_by_user=True,
             )
-            data.append(pr.model_dump(by_alias=True))
+            for saved_post in saved_posts
+        ]
 
-        return PaginatedPostsResponse(data=data, nextPage=next_page, total=total)
+        return {"data": data, "nextPage": next_page, "total": total}
 
 
-def get_saved_service(db: AsyncSession = Depends(get_async_session)) -> SavedService:
+def get_saved_service(
+    db: AsyncSession = Depends(get_async_session),
+    read_db: AsyncSession = Depends(get_read_session),
+) -> SavedService:
     """
     Dependency to get the SavedService instance.
     """
-    return SavedService(db)
+    return SavedService(db, read_db)
@@ -1,12 +1,64 @@
+import time
+from collections.abc import Awaitable, Callable
 from io import BytesIO
+from typing import Any, Optional
 from uuid import uuid4
 
 import httpx
 from PIL.Image import Image
 from pydantic import HttpUrl
 
+from pixelgram.bulkhead import Bulkhead, DependencyUnavailableError
+from pixelgram.resilience import (
+    CircuitBreaker,
+    LatencyTracker,
+    hedged,
+    retry_with_backoff,
+)
 from pixelgram.settings import settings
 
+supabase_bulkhead = Bulkhead(
+    "supabase",
+    max_concurrent=settings.supabase_max_concurrency,
+    max_queued=settings.supabase_max_queued,
+    timeout=settings.supabase_timeout_seconds,
+)
+"""Bulkhead bounding the concurrent calls to Supabase Storage"""
+
+
+class TransientStorageError(Exception):
+    """Raised when Supabase Storage answers with an error worth retrying."""
+
+
+def is_transient_storage_error(e: BaseException) -> bool:
+    """Whether a storage failure may succeed on retry, timeouts excluded as they already waited."""
+    return isinstance(e, TransientStorageError) or (
+        isinstance(e, httpx.TransportError)
+        and not isinstance(e, httpx.TimeoutException)
+    )
+
+
+def is_storage_failure(e: BaseException) -> bool:
+    """Whether a failed storage call tells Supabase is down, rather than this worker saturated."""
+    if isinstance(e, DependencyUnavailableError):
+        # Only a call that got a slot and still timed out reached Supabase
+        return e.reason == "call timed out"
+    return isinstance(e, (TransientStorageError, httpx.TransportError))
+
+
+supabase_breaker = CircuitBreaker(
+    "supabase",
+    failure_rate_threshold=settings.supabase_breaker_failure_rate,
+    window_size=settings.supabase_breaker_window,
+    min_calls=settings.supabase_breaker_min_calls,
+    reset_timeout=settings.supabase_breaker_reset_seconds,
+    is_failure=is_storage_failure,
+)
+"""Circuit breaker failing storage calls fast during Supabase outages"""
+
+supabase_latency = LatencyTracker()
+"""Recent latencies of Supabase Storage, used to decide when to hedge uploads"""
+
 
 class SupabaseStorageClient:
     """Client for uploading images to Supabase Storage."""
@@ -15,33 +67,42 @@ class SupabaseStorageClient:
         self.url = settings.supabase_url
         self.api_key = settings.supabase_service_key
         self.bucket = settings.supabase_bucket
+        self.timeout = settings.supabase_timeout_seconds
         self.headers = {
             "apikey": self.api_key,
             "Authorization": f"Bearer {self.api_key}",
         }
 
-    async def upload(self, img: Image) -> HttpUrl:
+    async def upload(self, img: Image, object_path: Optional[str] = None) -> HttpUrl:
         """
         Uploads an image to Supabase storage and returns its URL.
 
         Args:
             img (Image): The image object to upload.
+            object_path (Optional[str]): The path to store the image at, within the
+                bucket. A fresh path is picked if omitted.
 
         Returns:
             str: The URL to access the uploaded image.
 
         Raises:
+            DependencyUnavailableError: If Supabase is saturated or too slow.
             Exception: If the upload or signing fails.
         """
         file_data = self._image_to_png_bytes(img)
-        file_id = f"{uuid4()}.png"
+        file_id = object_path or self.new_object_path()
         upload_url = f"{self.url}/storage/v1/object/{self.bucket}/{file_id}"
 
         headers = self.headers.copy()
         headers["Content-Type"] = "image/png"
+        # Overwriting makes the upload idempotent, so it can be retried and hedged
+        headers["x-upsert"] = "true"
 
-        async with httpx.AsyncClient() as client:
-            response = await client.put(upload_url, content=file_data, headers=headers)
+        async def put() -> httpx.Response:
+            async with httpx.AsyncClient(timeout=self.timeout) as client:
+                return await client.put(upload_url, content=file_data, headers=headers)
+
+        response = await self._send(put, hedge=settings.supabase_hedge_uploads)
 
         if response.status_code != 200:
             raise Exception(f"Upload failed: {response.text}")
@@ -61,6 +122,7 @@ class SupabaseStorageClient:
 
         Raises:
             ValueError: If the URL format is invalid.
+            DependencyUnavailableError: If Supabase is saturated or too slow.
             Exception: If the deletion fails with an error other than 404.
         """
         # Extract file_id from the URL
@@ -72,8 +134,11 @@ class SupabaseStorageClient:
 
         delete_url = f"{self.url}/storage/v1/object/{self.bucket}/{file_id}"
 
-        async with httpx.AsyncClient() as client:
-            response = await client.delete(delete_url, headers=self.headers)
+        async def delete() -> httpx.Response:
+            async with httpx.AsyncClient(timeout=self.timeout) as client:
+                return await client.delete(delete_url, headers=self.headers)
+
+        response = await self._send(delete)
 
         # 200 means successful deletion
         if response.status_code == 200:
@@ -85,6 +150,185 @@ class SupabaseStorageClient:
         else:
             raise Exception(f"Deletion failed: {response.text}")
 
+    def new_object_path(self) -> str:
+        """Pick a fresh path for a new image object."""
+        return f"{uuid4()}.png"
+
+    def public_url(self, object_path: str) -> HttpUrl:
+        """Get the public URL of an object of the bucket."""
+        return HttpUrl(
+            f"{self.url}/storage/v1/object/public/{self.bucket}/{object_path}"
+        )
+
+    async def create_signed_upload_url(self, object_path: str) -> str:
+        """
+        Create a URL that lets a client upload an object directly to Supabase storage.
+
+        Args:
+            object_path (str): The path of the object to upload, within the bucket.
+
+        Returns:
+            str: The signed URL the client must PUT the object to.
+
+        Raises:
+            DependencyUnavailableError: If Supabase is saturated or too slow.
+            Exception: If the signing fails.
+        """
+        sign_url = (
+            f"{self.url}/storage/v1/object/upload/sign/{self.bucket}/{object_path}"
+        )
+
+        async def sign() -> httpx.Response:
+            async with httpx.AsyncClient(timeout=self.timeout) as client:
+                return await client.post(sign_url, headers=self.headers)
+
+        response = await self._send(sign)
+
+        if response.status_code != 200:
+            raise Exception(f"Signing failed: {response.text}")
+
+        return f"{self.url}/storage/v1{response.json()['url']}"
+
+    async def download(self, object_path: str, max_bytes: int) -> bytes | None:
+        """
+        Download the first bytes of an object from Supabase storage.
+
+        Args:
+            object_path (str): The path of the object to download, within the bucket.
+            max_bytes (int): The maximum number of bytes to download.
+
+        Returns:
+            bytes | None: The content of the object, truncated to `max_bytes`, or
+                None if the object does not exist.
+
+        Raises:
+            DependencyUnavailableError: If Supabase is saturated or too slow.
+            Exception: If the download fails.
+        """
+        download_url = f"{self.url}/storage/v1/object/{self.bucket}/{object_path}"
+        headers = self.headers.copy()
+        headers["Range"] = f"bytes=0-{max_bytes - 1}"
+
+        async def get() -> httpx.Response:
+            async with httpx.AsyncClient(timeout=self.timeout) as client:
+                return await client.get(download_url, headers=headers)
+
+        response = await self._send(get)
+
+        if response.status_code in (400, 404):
+            return None
+        if response.status_code not in (200, 206):
+            raise Exception(f"Download failed: {response.text}")
+
+        return response.content[:max_bytes]
+
+    async def list_objects(self, limit: int, offset: int = 0) -> list[dict[str, Any]]:
+        """
+        List a page of the objects at the root of the bucket, sorted by name.
+
+        Args:
+            limit (int): The maximum number of objects to list.
+            offset (int, optional): The number of objects to skip. Defaults to 0.
+
+        Returns:
+            list[dict[str, Any]]: The objects, with their `name` and `created_at`.
+
+        Raises:
+            DependencyUnavailableError: If Supabase is saturated or too slow.
+            Exception: If the listing fails.
+        """
+        list_url = f"{self.url}/storage/v1/object/list/{self.bucket}"
+        body = {
+            "prefix": "",
+            "limit": limit,
+            "offset": offset,
+            "sortBy": {"column": "name", "order": "asc"},
+        }
+
+        async def post() -> httpx.Response:
+            async with httpx.AsyncClient(timeout=self.timeout) as client:
+                return await client.post(list_url, json=body, headers=self.headers)
+
+        response = await self._send(post)
+
+        if response.status_code != 200:
+            raise Exception(f"Listing failed: {response.text}")
+
+        return response.json()
+
+    async def delete_many(self, object_paths: list[str]) -> None:
+        """
+        Delete several objects from Supabase storage in a single request.
+        Missing objects are ignored.
+
+        Args:
+            object_paths (list[str]): The paths of the objects, within the bucket.
+
+        Raises:
+            DependencyUnavailableError: If Supabase is saturated or too slow.
+            Exception: If the deletion fails.
+        """
+        delete_url = f"{self.url}/storage/v1/object/{self.bucket}"
+
+        async def delete() -> httpx.Response:
+            async with httpx.AsyncClient(timeout=self.timeout) as client:
+                return await client.request(
+                    "DELETE",
+                    delete_url,
+                    json={"prefixes": object_paths},
+                    headers=self.headers,
+                )
+
+        response = await self._send(delete)
+
+        if response.status_code != 200:
+            raise Exception(f"Deletion failed: {response.text}")
+
+    async def _send(
+        self, request: Callable[[], Awaitable[httpx.Response]], hedge: bool = False
+    ) -> httpx.Response:
+        """
+        Send an idempotent request to Supabase Storage through the circuit breaker,
+        retrying transient failures, each request bounded by the bulkhead.
+        Args:
+            request (Callable[[], Awaitable[httpx.Response]]): A function sending the request.
+            hedge (bool, optional): Whether to send a second request when the first is
+                slower than the p95 latency. Defaults to False.
+        Returns:
+            httpx.Response: The response, which may still be a client error.
+        Raises:
+            DependencyUnavailableError: If the circuit is open, or Supabase is saturated or too slow.
+            TransientStorageError: If Supabase kept failing after all the retries.
+        """
+
+        async def timed_request() -> httpx.Response:
+            started = time.monotonic()
+            response = await request()
+            if response.status_code >= 500 or response.status_code == 429:
+                raise TransientStorageError(
+                    f"Supabase answered {response.status_code}: {response.text}"
+                )
+            supabase_latency.record(time.monotonic() - started)
+            return response
+
+        async def attempt() -> httpx.Response:
+            delay = supabase_latency.quantile(0.95) if hedge else None
+            # Each request takes its own slot, hedged ones included
+            return await hedged(
+                lambda: supabase_bulkhead.run(timed_request), "supabase", delay
+            )
+
+        return await supabase_breaker.call(
+            lambda: retry_with_backoff(
+                attempt,
+                "supabase",
+                attempts=settings.supabase_retry_attempts,
+                base_delay=settings.supabase_retry_base_delay_seconds,
+                max_delay=settings.supabase_retry_max_delay_seconds,
+                is_retryable=is_transient_storage_error,
+            )
+        )
+
     def _image_to_png_bytes(self, img: Image) -> bytes:
         """Convert a PIL Image object to PNG format bytes."""
         buffer = BytesIO()
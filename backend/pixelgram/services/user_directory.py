@@ -0,0 +1,79 @@
+from collections import OrderedDict
+from collections.abc import Iterable
+from uuid import UUID
+
+from pixelgram.invalidation import ENTITY_USER, invalidation_bus
+from pixelgram.settings import settings
+
+
+class UserDirectory:
+    """
+    In-memory LRU cache of the usernames of the users, by id.
+
+    Authors are looked up by every page of posts or comments the frontend
+    renders, and usernames rarely change, so most lookups are answered without
+    a query. Entries are dropped through the invalidation bus when a user is
+    updated or deleted, on every worker.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._usernames: OrderedDict[UUID, str] = OrderedDict()
+        self._generation = 0
+
+    @property
+    def generation(self) -> int:
+        """Counter bumped by every invalidation, to tell when a lookup raced one."""
+        return self._generation
+
+    def get_many(self, ids: Iterable[UUID]) -> tuple[dict[UUID, str], list[UUID]]:
+        """
+        Look up the usernames of several users.
+        Args:
+            ids (Iterable[UUID]): The ids of the users.
+        Returns:
+            tuple[dict[UUID, str], list[UUID]]: The usernames found, by id, and
+                the ids missing from the cache.
+        """
+        found = {}
+        missing = []
+        for id in ids:
+            username = self._usernames.get(id)
+            if username is None:
+                missing.append(id)
+            else:
+                self._usernames.move_to_end(id)
+                found[id] = username
+        return found, missing
+
+    def put_many(self, usernames: dict[UUID, str], generation: int) -> None:
+        """
+        Cache usernames loaded from the database.
+        Args:
+            usernames (dict[UUID, str]): The usernames, by user id.
+            generation (int): The `generation` read before loading them. Nothing
+                is cached if a user changed since, as the usernames may be stale.
+        """
+        if generation != self._generation:
+            return
+        for id, username in usernames.items():
+            self._usernames[id] = username
+            self._usernames.move_to_end(id)
+        while len(self._usernames) > self.capacity:
+            self._usernames.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop every cached username."""
+        self._usernames.clear()
+        self._generation += 1
+
+    def on_change(self, entity: str, entity_id: str) -> None:
+        """Invalidation bus handler dropping the users that changed."""
+        if entity == ENTITY_USER:
+            self._usernames.pop(UUID(entity_id), None)
+            self._generation += 1
+
+
+user_directory = UserDirectory(settings.user_directory_capacity)
+"""Cache of the usernames of the users"""
+invalidation_bus.subscribe(user_directory.on_change)
@@ -1,12 +1,16 @@
+import sys
 from uuid import UUID
 
 from fastapi import Depends, HTTPException
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from pixelgram.db import get_async_session
-from pixelgram.models.user import User
+from pixelgram.db import get_async_session, get_read_session
+from pixelgram.models.user import User, username_search_key
 from pixelgram.schemas.user import UserPublicInfo
+from pixelgram.services.user_directory import UserDirectory, user_directory
+from pixelgram.services.username_index import UsernameIndex, username_index
+from pixelgram.utils.etag import make_weak_etag
 
 
 class UserService:
@@ -14,8 +18,17 @@ class UserService:
     User service to handle custom user-related operations.
     """
 
-    def __init__(self, db: AsyncSession):
+    def __init__(
+        self,
+        db: AsyncSession,
+        read_db: AsyncSession | None = None,
+        directory: UserDirectory = user_directory,
+        index: UsernameIndex = username_index,
+    ):
         self.db = db
+        self.read_db = read_db or db
+        self.directory = directory
+        self.index = index
 
     async def get_username_by_id(
         self,
@@ -24,21 +37,109 @@ class UserService:
         """
         Get username by user ID.
         """
-        result = await self.db.execute(select(User).filter_by(id=id))
-        user_row = result.unique().scalar_one_or_none()
-        if not user_row:
+        users_info = await self.get_users_info([id])
+        if not users_info:
             raise HTTPException(status_code=404, detail="User not found.")
 
-        return UserPublicInfo(
-            id=user_row.id,
-            username=user_row.username,
+        return users_info[0]
+
+    async def get_users_info(self, ids: list[UUID]) -> list[UserPublicInfo]:
+        """
+        Get the public information of several users at once.
+        Usernames are served from the user directory, only the missing ones are
+        loaded, in a single query. They are loaded from the primary, as the cache
+        keeps them until they change: a lagging replica could return a username
+        older than the invalidation that dropped it.
+
+        Args:
+            ids (list[UUID]): The ids of the users.
+
+        Returns:
+            list[UserPublicInfo]: The information of the users found, in the
+                order of `ids`. Unknown ids are left out.
+        """
+        usernames, missing = self.directory.get_many(dict.fromkeys(ids))
+        if missing:
+            generation = self.directory.generation
+            result = await self.db.execute(
+                select(User.id, User.username).where(User.id.in_(missing))
+            )
+            loaded = {row.id: row.username for row in result}
+            self.directory.put_many(loaded, generation)
+            usernames.update(loaded)
+
+        return [
+            UserPublicInfo(id=id, username=usernames[id])
+            for id in dict.fromkeys(ids)
+            if id in usernames
+        ]
+
+    async def search_users(self, prefix: str, limit: int) -> list[UserPublicInfo]:
+        """
+        Search the users whose username starts with a prefix, e.g. for autocompletion.
+        Served from the username index, ignoring case. While the index is not
+        loaded, the usernames are searched in the database, as a range on the
+        index of their lowercased form, compared by code point like the index.
+
+        Args:
+            prefix (str): The start of the username.
+            limit (int): The maximum number of users to return.
+
+        Returns:
+            list[UserPublicInfo]: The users found, sorted by username.
+        """
+        if self.index.loaded:
+            await self.index.refresh()
+            return [
+                UserPublicInfo(id=id, username=username)
+                for id, username in self.index.search(prefix, limit)
+            ]
+
+        key = prefix.lower()
+        conditions = [username_search_key >= key]
+        upper_bound = _prefix_upper_bound(key)
+        if upper_bound is not None:
+            conditions.append(username_search_key < upper_bound)
+        result = await self.read_db.execute(
+            select(User.id, User.username)
+            .where(*conditions)
+            .order_by(username_search_key)
+            .limit(limit)
         )
+        return [UserPublicInfo(id=row.id, username=row.username) for row in result]
+
+    @staticmethod
+    def get_user_info_etag(info: UserPublicInfo) -> str:
+        """
+        Get the ETag of a user's public information.
+        The public row is its own version stamp, as it only holds the id and username.
+        """
+        return make_weak_etag(info.id, info.username)
+
+
+def _prefix_upper_bound(prefix: str) -> str | None:
+    """
+    Get the first string after every string starting with a prefix.
+    Returns:
+        str | None: The bound, or None if every string after the prefix starts with it.
+    """
+    # The last code point has no successor, and strings starting with the prefix
+    # also start with it once trailing ones are dropped
+    prefix = prefix.rstrip(chr(sys.maxunicode))
+    if not prefix:
+        return None
+    code_point = ord(prefix[-1]) + 1
+    if 0xD800 <= code_point <= 0xDFFF:
+        # Surrogates cannot be encoded, the next character is the first after them
+        code_point = 0xE000
+    return prefix[:-1] + chr(code_point)
 
 
 def get_user_service(
     db: AsyncSession = Depends(get_async_session),
+    read_db: AsyncSession = Depends(get_read_session),
 ) -> UserService:
     """
     Dependency to get the User service.
     """
-    return UserService(db)
+    return UserService(db, read_db)
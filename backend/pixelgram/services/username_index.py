@@ -0,0 +1,102 @@
+from bisect import bisect_left, insort
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from pixelgram.db import async_session_maker
+from pixelgram.invalidation import ENTITY_USER, invalidation_bus
+from pixelgram.models.user import User
+
+
+class UsernameIndex:
+    """
+    In-memory sorted index of the usernames, for prefix searches.
+
+    Usernames are kept lowercased in a sorted list, so a search is a binary
+    search followed by a scan of the matches, without touching the database.
+    The index is built once at startup, then kept up to date incrementally:
+    users registered, updated or deleted on any worker are marked stale
+    through the invalidation bus, and reloaded in a single query by the next
+    search.
+    """
+
+    def __init__(self, session_maker: async_sessionmaker[AsyncSession]):
+        self.session_maker = session_maker
+        self.loaded = False
+        self._entries: list[tuple[str, UUID]] = []
+        self._usernames: dict[UUID, str] = {}
+        self._stale: set[UUID] = set()
+
+    async def load(self) -> None:
+        """Build the index from the users table, e.g. when a worker starts."""
+        self._stale = set()
+        async with self.session_maker() as session:
+            rows = (await session.execute(select(User.id, User.username))).all()
+        self._usernames = {id: username for id, username in rows}
+        self._entries = sorted(
+            (username.lower(), id) for id, username in self._usernames.items()
+        )
+        self.loaded = True
+
+    def clear(self) -> None:
+        """Drop the index, searches fall back to the database until it is loaded."""
+        self.loaded = False
+        self._entries = []
+        self._usernames = {}
+        self._stale = set()
+
+    async def refresh(self) -> None:
+        """Reload the users marked stale since the last refresh, if any."""
+        if not self._stale:
+            return
+        stale, self._stale = self._stale, set()
+        try:
+            async with self.session_maker() as session:
+                rows = await session.execute(
+                    select(User.id, User.username).where(User.id.in_(stale))
+                )
+                usernames = {id: username for id, username in rows}
+        except Exception:
+            self._stale |= stale
+            raise
+        for id in stale:
+            self._put(id, usernames.get(id))
+
+    def search(self, prefix: str, limit: int) -> list[tuple[UUID, str]]:
+        """
+        Find the users whose username starts with a prefix, ignoring case.
+        Args:
+            prefix (str): The start of the username.
+            limit (int): The maximum number of users to return.
+        Returns:
+            list[tuple[UUID, str]]: The ids and usernames of the users, sorted
+                by username.
+        """
+        key = prefix.lower()
+        start = bisect_left(self._entries, (key,))
+        matches = []
+        for username, id in self._entries[start : start + limit]:
+            if not username.startswith(key):
+                break
+            matches.append((id, self._usernames[id]))
+        return matches
+
+    def on_change(self, entity: str, entity_id: str) -> None:
+        """Invalidation bus handler marking the users that changed as stale."""
+        if entity == ENTITY_USER and self.loaded:
+            self._stale.add(UUID(entity_id))
+
+    def _put(self, id: UUID, username: str | None) -> None:
+        previous = self._usernames.pop(id, None)
+        if previous is not None:
+            index = bisect_left(self._entries, (previous.lower(), id))
+            del self._entries[index]
+        if username is not None:
+            self._usernames[id] = username
+            insort(self._entries, (username.lower(), id))
+
+
+username_index = UsernameIndex(async_session_maker)
+"""Index of the usernames of the users"""
+invalidation_bus.subscribe(username_index.on_change)
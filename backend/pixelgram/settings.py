@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings
 
 
@@ -5,16 +7,88 @@ class Settings(BaseSettings):
     """Application settings"""
 
     db_uri: str = ""
+    db_replica_uris: list[str] = []
+    db_replica_selection: Literal["round_robin", "least_busy"] = "round_robin"
+    db_read_your_writes_seconds: float = 5
+    db_read_your_writes_cookie_name: str = "pixelgramprimary"
+    db_sqlite_profile: bool = False
+    db_sqlite_mmap_size: int = 256 * 1024 * 1024
+    db_sqlite_busy_timeout_ms: int = 5000
+    db_sqlite_write_batch_size: int = 64
     secret: str = ""
+    password_hasher: Literal["argon2", "bcrypt"] = "argon2"
+    password_bcrypt_rounds: int = 12
+    password_hash_max_workers: int = 2
+    auth_strategy: Literal["database", "signed"] = "database"
+    auth_token_lifetime_seconds: int = 14 * 24 * 60 * 60
+    auth_access_token_ttl_seconds: int = 5 * 60
+    token_reaper_enabled: bool = True
+    token_reaper_interval_seconds: float = 60 * 60
+    token_reaper_batch_size: int = 1000
     google_auth_client_id: str = ""
     google_oauth_client_secret: str = ""
     frontend_base_url: str = ""
+    auth_cookie_name: str = "fastapiusersauth"
     hf_token: str = ""
     hf_img2txt_model: str = ""
+    hf_max_concurrency: int = 4
+    hf_max_queued: int = 8
+    hf_timeout_seconds: float = 30
     supabase_url: str = ""
     supabase_service_key: str = ""
     supabase_bucket: str = ""
+    supabase_max_concurrency: int = 16
+    supabase_max_queued: int = 32
+    supabase_timeout_seconds: float = 10
+    supabase_retry_attempts: int = 3
+    supabase_retry_base_delay_seconds: float = 0.1
+    supabase_retry_max_delay_seconds: float = 2
+    supabase_hedge_uploads: bool = False
+    supabase_breaker_failure_rate: float = 0.5
+    supabase_breaker_window: int = 20
+    supabase_breaker_min_calls: int = 10
+    supabase_breaker_reset_seconds: float = 30
     max_img_mb_size: float = 5
+    upload_url_ttl_seconds: int = 300
+    compression_minimum_size: int = 1024
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4
+    user_info_max_age_seconds: int = 60
+    user_info_max_ids: int = 100
+    user_directory_capacity: int = 10_000
+    username_index_enabled: bool = True
+    post_changes_settle_seconds: float = 5
+    live_counters_interval_seconds: float = 1
+    live_counters_max_subscribers: int = 1000
+    live_counters_max_posts: int = 100
+    live_counters_keepalive_seconds: float = 15
+    invalidation_bus: Literal["local", "sqlite"] = "local"
+    invalidation_bus_path: str = "/tmp/pixelgram-invalidation.db"
+    invalidation_bus_poll_interval_seconds: float = 0.5
+    metrics_enabled: bool = True
+    metrics_token: str = ""
+    metrics_aggregation: Literal["local", "sqlite"] = "local"
+    metrics_sqlite_path: str = "/tmp/pixelgram-metrics.db"
+    metrics_publish_interval_seconds: float = 5
+    query_budget_mode: Literal["off", "warn", "raise"] = "warn"
+    query_budget_request_statements: int = 20
+    query_budget_request_rows: int = 5000
+    rate_limit_storage: Literal["memory", "sqlite", "redis"] = "memory"
+    rate_limit_sqlite_path: str = "/tmp/pixelgram-rate-limit.db"
+    rate_limit_redis_url: str = "redis://localhost:6379/0"
+    caption_rate_limit_capacity: int = 30
+    caption_rate_limit_period_seconds: float = 15 * 60
+    outbox_worker_enabled: bool = True
+    outbox_batch_size: int = 32
+    outbox_poll_interval_seconds: float = 5
+    outbox_max_attempts: int = 8
+    outbox_lease_seconds: float = 60
+    purge_enabled: bool = True
+    purge_hours: list[int] = []
+    purge_interval_seconds: float = 15 * 60
+    purge_grace_seconds: float = 60 * 60
+    purge_batch_size: int = 100
+    purge_batch_pause_seconds: float = 1
 
 
 settings = Settings()
@@ -1 +1,2 @@
 REQUIRED_IMAGE_SIZE = (128, 128)  # Required image size in pixels
+REVALIDATE_CACHE_CONTROL = "private, no-cache"  # Cache per user, revalidate each use
@@ -0,0 +1,63 @@
+import hashlib
+
+from fastapi import Request, Response, status
+
+
+def make_weak_etag(*parts: object) -> str:
+    """
+    Builds a weak ETag from the version stamps of a resource.
+
+    Args:
+        parts: Values that change whenever the representation changes.
+
+    Returns:
+        The weak ETag, e.g. `W/"1f2e3d..."`.
+    """
+
+    digest = hashlib.blake2b(
+        "|".join(str(part) for part in parts).encode(), digest_size=12
+    ).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """
+    Checks the If-None-Match header of a request against an ETag.
+    Weak comparison is used, as conditional GETs allow.
+
+    Args:
+        request: The incoming request.
+        etag: The current ETag of the requested resource.
+
+    Returns:
+        Whether the client already holds the current representation.
+    """
+
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == opaque
+        for candidate in header.split(",")
+    )
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    """
+    Builds the `304 Not Modified` response for a conditional GET.
+
+    Args:
+        etag: The current ETag of the requested resource.
+        cache_control: The Cache-Control header the full response would carry.
+
+    Returns:
+        An empty response repeating the validator and caching headers.
+    """
+
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={"ETag": etag, "Cache-Control": cache_control},
+    )
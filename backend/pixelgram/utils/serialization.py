@@ -0,0 +1,18 @@
+from datetime import datetime
+
+
+def serialize_datetime(value: datetime) -> str:
+    """
+    Serializes a datetime the same way Pydantic does in JSON mode.
+
+    Args:
+        value: The datetime to serialize.
+
+    Returns:
+        The ISO 8601 representation, using `Z` for UTC.
+    """
+
+    iso = value.isoformat()
+    if iso.endswith("+00:00"):
+        return iso[:-6] + "Z"
+    return iso
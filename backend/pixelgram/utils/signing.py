@@ -0,0 +1,72 @@
+import base64
+import hashlib
+import hmac
+import time
+from typing import Any, Optional
+
+import orjson
+
+PURPOSE_AUTH = "auth"
+"""Purpose of the signed access tokens of the auth cookie"""
+
+PURPOSE_UPLOAD = "upload"
+"""Purpose of the tokens returned along a signed upload URL"""
+
+PURPOSE_PRIMARY_PIN = "primary_pin"
+"""Purpose of the tokens keeping clients that just wrote on the primary database"""
+
+
+def sign_payload(
+    payload: dict[str, Any], secret: str, ttl_seconds: float, purpose: str
+) -> str:
+    """
+    Signs a payload into a URL-safe token that expires after `ttl_seconds`.
+
+    Args:
+        payload: The JSON-serializable values to sign.
+        secret: The secret key of the signature.
+        ttl_seconds: The lifetime of the token.
+        purpose: What the token is for, so it is refused anywhere else.
+
+    Returns:
+        The token, made of the encoded payload and its HMAC-SHA256 signature.
+    """
+
+    body = {**payload, "exp": time.time() + ttl_seconds, "typ": purpose}
+    encoded = base64.urlsafe_b64encode(orjson.dumps(body)).rstrip(b"=")
+    signature = hmac.new(secret.encode(), encoded, hashlib.sha256).digest()
+    return (encoded + b"." + base64.urlsafe_b64encode(signature).rstrip(b"=")).decode()
+
+
+def verify_signed_payload(
+    token: str, secret: str, purpose: str
+) -> Optional[dict[str, Any]]:
+    """
+    Verifies a token made by `sign_payload` and returns its payload.
+
+    Args:
+        token: The token to verify.
+        secret: The secret key of the signature.
+        purpose: The purpose the token must have been signed for.
+
+    Returns:
+        The signed payload, or None if the token is malformed, forged, expired
+        or signed for another purpose.
+    """
+
+    encoded, _, signature = token.encode().partition(b".")
+    expected = hmac.new(secret.encode(), encoded, hashlib.sha256).digest()
+    try:
+        valid = hmac.compare_digest(_b64decode(signature), expected)
+        payload = orjson.loads(_b64decode(encoded)) if valid else None
+    except ValueError:
+        return None
+    if not isinstance(payload, dict) or payload.pop("exp", 0) < time.time():
+        return None
+    if payload.pop("typ", None) != purpose:
+        return None
+    return payload
+
+
+def _b64decode(data: bytes) -> bytes:
+    return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
@@ -2,15 +2,28 @@ from pixelgram.models.base import Base
 from pixelgram.settings import settings
 
 settings.db_uri = "sqlite+aiosqlite:///./test.db"
+# Tests run the background jobs explicitly
+settings.outbox_worker_enabled = False
+settings.purge_enabled = False
+settings.token_reaper_enabled = False
+# Services over their query budget fail the tests
+settings.query_budget_mode = "raise"
+# Change tokens move past the changes as soon as they are read
+settings.post_changes_settle_seconds = 0
 
 
+from contextlib import contextmanager  # noqa: E402
+
 import pytest  # noqa: E402
 
 from pixelgram.__main__ import app  # noqa: E402
 from pixelgram.auth import current_active_user  # noqa: E402
 from pixelgram.db import engine  # noqa: E402
+from pixelgram.instrumentation import track_queries  # noqa: E402
 from pixelgram.services.hf_client import get_hf_client  # noqa: E402
 from pixelgram.services.supabase_client import get_supabase_client  # noqa: E402
+from pixelgram.services.user_directory import user_directory  # noqa: E402
+from pixelgram.services.username_index import username_index  # noqa: E402
 from tests.overrides import (  # noqa: E402
     override_current_user,
     override_hf_client,
@@ -32,5 +45,28 @@ async def reset_test_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
         await conn.run_sync(Base.metadata.create_all)
+    user_directory.clear()
+    username_index.clear()
 
     yield
+
+
+@pytest.fixture
+def query_budget():
+    """
+    Assert that a block stays within a query budget, e.g.
+    `with query_budget(statements=3, rows=10): ...`
+    """
+
+    @contextmanager
+    def assert_within(statements: int, rows: int | None = None):
+        with track_queries() as stats:
+            yield stats
+        assert stats.statements <= statements, (
+            f"{stats.statements} statements run, over the budget of {statements}"
+        )
+        assert rows is None or stats.rows <= rows, (
+            f"{stats.rows} rows fetched, over the budget of {rows}"
+        )
+
+    return assert_within
@@ -1,3 +1,5 @@
+from uuid import uuid4
+
 from pixelgram.models.user import User
 from pixelgram.settings import Settings, settings
 from tests.utils import get_test_user
@@ -32,8 +34,15 @@ def override_fail_hf_client():
 
 
 class MockSupabaseClient:
-    async def upload(self, img):
-        return "https://mockstorage.com/image.png"
+    def new_object_path(self) -> str:
+        # Paths are unique, as every post references its own image
+        return f"{uuid4()}.png"
+
+    def public_url(self, object_path: str) -> str:
+        return f"https://mockstorage.com/{object_path}"
+
+    async def upload(self, img, object_path=None):
+        return self.public_url(object_path or self.new_object_path())
 
     async def delete(self, file_id: str) -> None:
         pass
@@ -1,17 +1,26 @@
+import asyncio
 from io import BytesIO
+from uuid import UUID
 
 import pytest
 from httpx import ASGITransport, AsyncClient
+from sqlalchemy import delete, func, select
 
 from pixelgram.__main__ import app
 from pixelgram.auth import current_active_user  # noqa: E402
-from pixelgram.settings import get_settings
-from tests.overrides import override_small_image_size_settings
+from pixelgram.db import async_session_maker, write_queue
+from pixelgram.models.post import Post
+from pixelgram.models.post_change import PostChange
+from pixelgram.services.post_service import PostService
+from pixelgram.services.supabase_client import get_supabase_client
+from pixelgram.settings import get_settings, settings
+from tests.overrides import MockSupabaseClient, override_small_image_size_settings
 from tests.utils import (
     create_test_image,
     create_test_post,
     create_test_user,
     get_test_user,
+    rename_test_user,
 )
 
 
@@ -503,3 +512,277 @@ async def test_delete_post_cascades_comments_likes_saved():
             # Verify that the like is deleted
             unsave_resp = await ac.delete(f"/posts/{post_id}/save/")
             assert unsave_resp.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_get_posts_conditional():
+    async with app.router.lifespan_context(app):
+        await create_test_user()
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as ac:
+            post_id = await create_test_post(content="ETag post", client=ac)
+
+            response = await ac.get("/posts/")
+            assert response.status_code == 200
+            etag = response.headers["etag"]
+            assert etag.startswith('W/"')
+            assert response.headers["cache-control"] == "private, no-cache"
+
+            # Nothing changed, so the cached page is still valid
+            response = await ac.get("/posts/", headers={"If-None-Match": etag})
+            assert response.status_code == 304
+            assert response.content == b""
+            assert response.headers["etag"] == etag
+
+            # A like on a post of the page invalidates it
+            await ac.post(f"/posts/{post_id}/like/")
+            response = await ac.get("/posts/", headers={"If-None-Match": etag})
+            assert response.status_code == 200
+            assert response.headers["etag"] != etag
+            assert response.json()["data"][0]["likesCount"] == 1
+            etag = response.headers["etag"]
+
+            # So does a change of the author's username
+            await rename_test_user("renamed")
+            response = await ac.get("/posts/", headers={"If-None-Match": etag})
+            assert response.status_code == 200
+            assert response.json()["data"][0]["authorUsername"] == "renamed"
+
+
+@pytest.mark.asyncio
+async def test_get_post_changes():
+    async with app.router.lifespan_context(app):
+        await create_test_user()
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as ac:
+            liked_id = await create_test_post(content="Liked post", client=ac)
+            deleted_id = await create_test_post(content="Deleted post", client=ac)
+
+            # Without a token, only the current one is returned
+            response = await ac.get("/posts/changes")
+            assert response.status_code == 200
+            token = response.json()["nextToken"]
+            assert response.json()["created"] == []
+
+            created_id = await create_test_post(content="New post", client=ac)
+            await ac.post(f"/posts/{liked_id}/like/")
+            await ac.delete(f"/posts/{deleted_id}/")
+
+            response = await ac.get(f"/posts/changes?since={token}")
+            assert response.status_code == 200
+            changes = response.json()
+            assert [p["id"] for p in changes["created"]] == [created_id]
+            assert changes["updated"] == [
+                {
+                    "id": liked_id,
+                    "likesCount": 1,
+                    "likedByUser": True,
+                    "commentsCount": 0,
+                    "commentedByUser": False,
+                }
+            ]
+            assert changes["deleted"] == [deleted_id]
+            assert changes["hasMore"] is False
+
+            # Polling again from the new token returns nothing
+            response = await ac.get(f"/posts/changes?since={changes['nextToken']}")
+            assert response.json()["created"] == []
+            assert response.json()["updated"] == []
+            assert response.json()["deleted"] == []
+
+
+@pytest.mark.asyncio
+async def test_get_post_changes_paginates():
+    async with app.router.lifespan_context(app):
+        await create_test_user()
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as ac:
+            first_id = await create_test_post(content="First post", client=ac)
+            second_id = await create_test_post(content="Second post", client=ac)
+
+            response = await ac.get("/posts/changes?since=0&limit=1")
+            changes = response.json()
+            assert [p["id"] for p in changes["created"]] == [first_id]
+            assert changes["hasMore"] is True
+
+            response = await ac.get(
+                f"/posts/changes?since={changes['nextToken']}&limit=1"
+            )
+            assert [p["id"] for p in response.json()["created"]] == [second_id]
+            assert response.json()["hasMore"] is False
+
+
+@pytest.mark.asyncio
+async def test_get_post_changes_waits_for_late_commits(monkeypatch):
+    monkeypatch.setattr(settings, "post_changes_settle_seconds", 60)
+    async with app.router.lifespan_context(app):
+        await create_test_user()
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as ac:
+            first_id = await create_test_post(content="First post", client=ac)
+            second_id = await create_test_post(content="Second post", client=ac)
+
+            # The transaction of the first post drew its change id first but
+            # commits last: until then, only the change of the second is visible
+            async with async_session_maker() as session:
+                late_change = (
+                    await session.execute(
+                        select(PostChange).where(PostChange.post_id == UUID(first_id))
+                    )
+                ).scalar_one()
+                await session.execute(
+                    delete(PostChange).where(PostChange.id == late_change.id)
+                )
+                await session.commit()
+
+            response = await ac.get("/posts/changes?since=0")
+            changes = response.json()
+            assert [p["id"] for p in changes["created"]] == [second_id]
+            assert changes["nextToken"] == 0
+
+            async with async_session_maker() as session:
+                session.add(
+                    PostChange(
+                        id=late_change.id,
+                        post_id=late_change.post_id,
+                        kind=late_change.kind,
+                        changed_at=late_change.changed_at,
+                    )
+                )
+                await session.commit()
+
+            # The late change is read by the next poll, along with the recent ones
+            response = await ac.get(f"/posts/changes?since={changes['nextToken']}")
+            assert {p["id"] for p in response.json()["created"]} == {
+                first_id,
+                second_id,
+            }
+
+            # Once the changes settle, the token moves past them
+            monkeypatch.setattr(settings, "post_changes_settle_seconds", 0)
+            response = await ac.get(f"/posts/changes?since={changes['nextToken']}")
+            token = response.json()["nextToken"]
+            response = await ac.get(f"/posts/changes?since={token}")
+            assert response.json()["created"] == []
+
+
+class CompensatingSupabaseClient(MockSupabaseClient):
+    """Storage double recording the images uploaded and deleted."""
+
+    uploaded: list[str] = []
+    deleted: list[str] = []
+
+    def new_object_path(self) -> str:
+        return "image.png"
+
+    async def upload(self, img, object_path=None):
+        self.uploaded.append(object_path)
+        return self.public_url(object_path)
+
+    async def delete(self, file_url) -> bool:
+        self.deleted.append(str(file_url))
+        return True
+
+
+@pytest.fixture
+def compensating_storage():
+    CompensatingSupabaseClient.uploaded = []
+    CompensatingSupabaseClient.deleted = []
+    app.dependency_overrides[get_supabase_client] = CompensatingSupabaseClient
+    return CompensatingSupabaseClient
+
+
+@pytest.mark.asyncio
+async def test_create_post_deletes_image_when_insert_fails(
+    compensating_storage, monkeypatch
+):
+    async def failing_insert(self, session, post_id, pc, hidden=False):
+        raise RuntimeError("database down")
+
+    monkeypatch.setattr(PostService, "_insert_post", failing_insert)
+    async with app.router.lifespan_context(app):
+        await create_test_user()
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as ac:
+            files = {"file": ("valid.png", create_test_image(), "image/png")}
+            response = await ac.post(
+                "/posts/", files=files, data={"description": "Lost post"}
+            )
+
+    assert response.status_code == 500
+    assert compensating_storage.uploaded == ["image.png"]
+    assert compensating_storage.deleted == ["https://mockstorage.com/image.png"]
+
+
+@pytest.mark.asyncio
+async def test_create_post_rolls_back_insert_when_upload_fails(
+    compensating_storage, monkeypatch
+):
+    async def failing_upload(self, img, object_path=None):
+        raise RuntimeError("storage down")
+
+    monkeypatch.setattr(compensating_storage, "upload", failing_upload)
+    async with app.router.lifespan_context(app):
+        await create_test_user()
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as ac:
+            files = {"file": ("valid.png", create_test_image(), "image/png")}
+            response = await ac.post(
+                "/posts/", files=files, data={"description": "Lost post"}
+            )
+            assert response.status_code == 500
+            assert response.json()["detail"] == "Image upload failed: storage down"
+
+            posts = await ac.get("/posts/")
+            assert posts.json()["total"] == 0
+
+    # The hidden post inserted during the upload is deleted too
+    async with async_session_maker() as session:
+        assert (await session.execute(select(func.count(Post.id)))).scalar() == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("queued", [False, True])
+async def test_create_post_stays_hidden_until_uploaded(
+    queued, compensating_storage, monkeypatch
+):
+    hidden_during_upload = []
+    upload = compensating_storage.upload
+
+    async def slow_upload(self, img, object_path=None):
+        # The post is committed, hidden, while the image is being uploaded
+        post = None
+        for _ in range(100):
+            async with async_session_maker() as session:
+                post = (await session.execute(select(Post))).scalar_one_or_none()
+            if post is not None:
+                break
+            await asyncio.sleep(0.01)
+        hidden_during_upload.append(post is not None and post.deleted_at is not None)
+        return await upload(self, img, object_path)
+
+    monkeypatch.setattr(compensating_storage, "upload", slow_upload)
+    async with app.router.lifespan_context(app):
+        await create_test_user()
+        # As under the SQLite profile, where writes go through the writer task
+        if queued:
+            write_queue.start()
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as ac:
+            files = {"file": ("valid.png", create_test_image(), "image/png")}
+            response = await ac.post(
+                "/posts/", files=files, data={"description": "Slow post"}
+            )
+            await write_queue.stop()
+            assert response.status_code == 201
+            assert hidden_during_upload == [True]
+
+            posts = await ac.get("/posts/")
+            assert posts.json()["total"] == 1
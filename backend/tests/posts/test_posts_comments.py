@@ -7,6 +7,7 @@ from tests.utils import (
     create_test_post,
     create_test_user,
     get_test_user,
+    rename_test_user,
 )
 
 
@@ -321,3 +322,34 @@ async def test_delete_comment_not_authorized():
 
             delete_resp = await ac.delete(f"/posts/{post_id}/comments/{comment_id}/")
             assert delete_resp.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_get_comments_conditional():
+    async with app.router.lifespan_context(app):
+        await create_test_user()
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as ac:
+            post_id = await create_test_post(content="ETag post", client=ac)
+            url = f"/posts/{post_id}/comments/"
+
+            response = await ac.get(url)
+            assert response.status_code == 200
+            etag = response.headers["etag"]
+
+            response = await ac.get(url, headers={"If-None-Match": etag})
+            assert response.status_code == 304
+
+            # A new comment invalidates the page
+            await ac.post(url, json={"content": "New comment"})
+            response = await ac.get(url, headers={"If-None-Match": etag})
+            assert response.status_code == 200
+            assert response.json()["total"] == 1
+            etag = response.headers["etag"]
+
+            # So does a change of a commenter's username
+            await rename_test_user("renamed")
+            response = await ac.get(url, headers={"If-None-Match": etag})
+            assert response.status_code == 200
+            assert response.json()["data"][0]["authorUsername"] == "renamed"
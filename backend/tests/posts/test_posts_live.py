@@ -0,0 +1,53 @@
+from uuid import UUID
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from pixelgram.__main__ import app
+from pixelgram.services.posts.live_counters import live_counter_hub
+from tests.utils import create_test_post, create_test_user
+
+
+@pytest.mark.asyncio
+async def test_live_counters_coalesced_updates():
+    async with app.router.lifespan_context(app):
+        await create_test_user()
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as ac:
+            post_id = await create_test_post(content="Live post", client=ac)
+            other_id = await create_test_post(content="Other post", client=ac)
+
+            async with live_counter_hub.subscribe([UUID(post_id)]) as subscription:
+                # The current counters are sent first
+                initial = await subscription.get(timeout=1)
+                assert initial[UUID(post_id)]["likesCount"] == 0
+
+                # Several changes within an interval produce a single update
+                await ac.post(f"/posts/{post_id}/like/")
+                await ac.post(f"/posts/{post_id}/comments/", json={"content": "Hi"})
+                await ac.post(f"/posts/{other_id}/like/")
+                await live_counter_hub.flush()
+
+                updates = await subscription.get(timeout=1)
+                assert updates == {
+                    UUID(post_id): {
+                        "id": post_id,
+                        "likesCount": 1,
+                        "commentsCount": 1,
+                    }
+                }
+
+                # Nothing changed since
+                await live_counter_hub.flush()
+                assert await subscription.get(timeout=0.01) == {}
+
+
+@pytest.mark.asyncio
+async def test_live_counters_too_many_posts():
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        ids = "&".join(f"ids=00000000-0000-0000-0000-{i:012d}" for i in range(1, 102))
+        response = await ac.get(f"/posts/live?{ids}")
+        assert response.status_code == 400
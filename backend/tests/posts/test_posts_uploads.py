@@ -0,0 +1,156 @@
+import asyncio
+import hashlib
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from pydantic import HttpUrl
+
+from pixelgram.__main__ import app
+from pixelgram.services.supabase_client import get_supabase_client
+from pixelgram.settings import settings
+from pixelgram.utils.signing import PURPOSE_AUTH, sign_payload
+from tests.utils import create_test_image, create_test_user
+
+
+class SignedUploadSupabaseClient:
+    """Storage double where signed uploads land in `objects`."""
+
+    objects: dict[str, bytes] = {}
+    deleted: list[str] = []
+
+    def new_object_path(self) -> str:
+        return "uploaded.png"
+
+    def public_url(self, object_path: str) -> HttpUrl:
+        return HttpUrl(f"https://mockstorage.com/public/{object_path}")
+
+    async def create_signed_upload_url(self, object_path: str) -> str:
+        return f"https://mockstorage.com/upload/sign/{object_path}?token=abc"
+
+    async def download(self, object_path: str, max_bytes: int) -> bytes | None:
+        data = self.objects.get(object_path)
+        return None if data is None else data[:max_bytes]
+
+    async def delete(self, file_url: HttpUrl) -> bool:
+        self.deleted.append(str(file_url))
+        return True
+
+
+@pytest.fixture
+def storage():
+    SignedUploadSupabaseClient.objects = {}
+    SignedUploadSupabaseClient.deleted = []
+    app.dependency_overrides[get_supabase_client] = SignedUploadSupabaseClient
+    return SignedUploadSupabaseClient
+
+
+def announce(data: bytes) -> dict:
+    return {"sha256": hashlib.sha256(data).hexdigest(), "size": len(data)}
+
+
+@pytest.mark.asyncio
+async def test_signed_upload_creates_post(storage):
+    image = create_test_image().getvalue()
+    async with app.router.lifespan_context(app):
+        await create_test_user()
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as ac:
+            response = await ac.post("/posts/uploads", json=announce(image))
+            assert response.status_code == 201
+            upload = response.json()
+            assert upload["uploadUrl"].startswith("https://mockstorage.com/upload/")
+
+            # The client uploads straight to storage
+            storage.objects["uploaded.png"] = image
+
+            finalize = {"uploadToken": upload["uploadToken"], "description": "Direct"}
+            response = await ac.post("/posts/uploads/finalize", json=finalize)
+            assert response.status_code == 201
+            post = response.json()["post"]
+            assert post["description"] == "Direct"
+            assert post["imageUrl"] == "https://mockstorage.com/public/uploaded.png"
+
+            # A token only creates one post
+            response = await ac.post("/posts/uploads/finalize", json=finalize)
+            assert response.status_code == 409
+
+
+@pytest.mark.asyncio
+async def test_concurrent_finalizes_create_one_post(storage):
+    image = create_test_image().getvalue()
+    async with app.router.lifespan_context(app):
+        await create_test_user()
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as ac:
+            response = await ac.post("/posts/uploads", json=announce(image))
+            storage.objects["uploaded.png"] = image
+
+            # Both calls pass the existence check before either inserts
+            token = response.json()["uploadToken"]
+            finalize = {"uploadToken": token, "description": "Direct"}
+            responses = await asyncio.gather(
+                ac.post("/posts/uploads/finalize", json=finalize),
+                ac.post("/posts/uploads/finalize", json=finalize),
+            )
+            assert sorted(r.status_code for r in responses) == [201, 409]
+            assert len((await ac.get("/posts/")).json()["data"]) == 1
+
+
+@pytest.mark.asyncio
+async def test_signed_upload_rejects_mismatching_image(storage):
+    announced = create_test_image().getvalue()
+    async with app.router.lifespan_context(app):
+        await create_test_user()
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as ac:
+            response = await ac.post("/posts/uploads", json=announce(announced))
+            token = response.json()["uploadToken"]
+
+            # Not uploaded yet
+            finalize = {"uploadToken": token, "description": "Direct"}
+            response = await ac.post("/posts/uploads/finalize", json=finalize)
+            assert response.status_code == 400
+
+            # Another image than the announced one is rejected and removed
+            storage.objects["uploaded.png"] = create_test_image(color="red").getvalue()
+            response = await ac.post("/posts/uploads/finalize", json=finalize)
+            assert response.status_code == 400
+            assert "does not match" in response.json()["detail"]
+            assert storage.deleted == ["https://mockstorage.com/public/uploaded.png"]
+
+
+@pytest.mark.asyncio
+async def test_signed_upload_rejects_invalid_token(storage):
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        finalize = {"uploadToken": "forged.token", "description": "Direct"}
+        response = await ac.post("/posts/uploads/finalize", json=finalize)
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Invalid or expired upload token."
+
+
+@pytest.mark.asyncio
+async def test_signed_upload_rejects_auth_tokens(storage):
+    image = create_test_image().getvalue()
+    async with app.router.lifespan_context(app):
+        await create_test_user()
+        storage.objects["uploaded.png"] = image
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as ac:
+            # Access tokens are signed with the same secret, but for another purpose
+            user_id = "00000000-0000-0000-0000-000000000001"
+            auth_token = sign_payload(
+                {"sub": user_id, "sid": "session", "user_id": user_id},
+                settings.secret,
+                60,
+                PURPOSE_AUTH,
+            )
+            finalize = {"uploadToken": auth_token, "description": "Direct"}
+            response = await ac.post("/posts/uploads/finalize", json=finalize)
+            assert response.status_code == 400
+            assert response.json()["detail"] == "Invalid or expired upload token."
@@ -0,0 +1,327 @@
+import threading
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from pwdlib import PasswordHash
+from pwdlib.hashers.bcrypt import BcryptHasher
+from sqlalchemy import event, select, update
+
+from pixelgram.__main__ import app
+from pixelgram.auth import UserManager
+from pixelgram.db import UserDatabase, async_session_maker, engine, write_queue
+from pixelgram.jobs.tokens import TokenReaper
+from pixelgram.metrics import metrics
+from pixelgram.models.access_token import AccessToken
+from pixelgram.models.oauth_account import OAuthAccount
+from pixelgram.models.user import User
+from pixelgram.passwords import UNUSABLE_PASSWORD, ThreadedPasswordHelper
+from pixelgram.settings import settings
+from pixelgram.utils.signing import PURPOSE_UPLOAD, sign_payload
+from tests.utils import create_test_user
+
+TEST_USER_ID = UUID("00000000-0000-0000-0000-000000000001")
+
+
+async def register_and_login(ac: AsyncClient, password: str):
+    await ac.post(
+        "/auth/register",
+        json={
+            "email": "alice@example.com",
+            "username": "alice",
+            "password": "s3cret-pw",
+        },
+    )
+    return await ac.post(
+        "/auth/login", data={"username": "alice@example.com", "password": password}
+    )
+
+
+@pytest.mark.asyncio
+async def test_register_and_login():
+    async with app.router.lifespan_context(app):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as ac:
+            response = await register_and_login(ac, "s3cret-pw")
+            assert response.status_code == 204
+
+            response = await ac.post(
+                "/auth/login",
+                data={"username": "alice@example.com", "password": "wrong-pw"},
+            )
+            assert response.status_code == 400
+
+    histogram = metrics.get_histogram("password_hash_seconds", operation="verify")
+    assert histogram is not None and histogram.count >= 2
+
+
+@pytest.mark.asyncio
+async def test_user_without_password_cannot_log_in():
+    await create_test_user(email="oauth@example.com", hashed_password=UNUSABLE_PASSWORD)
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        response = await ac.post(
+            "/auth/login", data={"username": "oauth@example.com", "password": "!"}
+        )
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_password_helper_hashes_off_the_event_loop():
+    hasher = BcryptHasher(rounds=4)
+    threads = []
+    original_hash = hasher.hash
+
+    def hash(password, *args, **kwargs):
+        threads.append(threading.current_thread())
+        return original_hash(password, *args, **kwargs)
+
+    hasher.hash = hash
+    helper = ThreadedPasswordHelper(PasswordHash((hasher,)), max_workers=1)
+
+    hashed = await helper.hash_async("password")
+
+    assert threads and threads[0] is not threading.current_thread()
+    assert hashed.startswith("$2b$04$")
+    assert await helper.verify_and_update_async("password", hashed) == (True, None)
+    assert (await helper.verify_and_update_async("other", hashed))[0] is False
+
+    # Hashing synchronously would block the event loop
+    with pytest.raises(RuntimeError):
+        helper.hash("password")
+    with pytest.raises(RuntimeError):
+        helper.verify_and_update("password", hashed)
+
+
+@pytest.mark.asyncio
+async def test_password_is_reset_off_the_event_loop(monkeypatch):
+    tokens = []
+
+    async def on_after_forgot_password(self, user, token, request=None):
+        tokens.append(token)
+
+    monkeypatch.setattr(
+        UserManager, "on_after_forgot_password", on_after_forgot_password
+    )
+    async with app.router.lifespan_context(app):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="https://test"
+        ) as ac:
+            assert (await register_and_login(ac, "s3cret-pw")).status_code == 204
+            response = await ac.post(
+                "/auth/forgot-password", json={"email": "alice@example.com"}
+            )
+            assert response.status_code == 202 and len(tokens) == 1
+
+            reset = {"token": tokens[0], "password": "n3w-secret"}
+            assert (
+                await ac.post("/auth/reset-password", json=reset)
+            ).status_code == 200
+            # The token is bound to the old password, so it only works once
+            response = await ac.post("/auth/reset-password", json=reset)
+            assert response.status_code == 400
+
+            assert (await register_and_login(ac, "n3w-secret")).status_code == 204
+
+
+async def set_token_expiry(expires_at: datetime) -> None:
+    async with async_session_maker() as session:
+        await session.execute(update(AccessToken).values(expires_at=expires_at))
+        await session.commit()
+
+
+async def get_token_expiry() -> datetime:
+    async with async_session_maker() as session:
+        return (await session.scalars(select(AccessToken.expires_at))).one()
+
+
+@pytest.mark.asyncio
+async def test_token_is_renewed_while_used_and_expires_when_unused():
+    lifetime = timedelta(seconds=settings.auth_token_lifetime_seconds)
+    async with app.router.lifespan_context(app):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="https://test"
+        ) as ac:
+            assert (await register_and_login(ac, "s3cret-pw")).status_code == 204
+            now = datetime.now(timezone.utc)
+            assert await get_token_expiry() > now + lifetime * 0.99
+
+            # Used with less than half of its lifetime left, the token is renewed
+            await set_token_expiry(now + lifetime * 0.4)
+            assert (await ac.get("/users/me")).status_code == 200
+            assert await get_token_expiry() > now + lifetime * 0.99
+
+            await set_token_expiry(now - timedelta(seconds=1))
+            assert (await ac.get("/users/me")).status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_account_writes_go_through_the_write_queue(monkeypatch):
+    queued = []
+    submit = write_queue.submit
+
+    async def record_submit(operation):
+        queued.append(operation.__name__)
+        return await submit(operation)
+
+    monkeypatch.setattr(write_queue, "submit", record_submit)
+    lifetime = timedelta(seconds=settings.auth_token_lifetime_seconds)
+    async with app.router.lifespan_context(app):
+        # As under the SQLite profile, where writes go through the writer task
+        write_queue.start()
+        try:
+            async with AsyncClient(
+                transport=ASGITransport(app=app), base_url="https://test"
+            ) as ac:
+                assert (await register_and_login(ac, "s3cret-pw")).status_code == 204
+                assert queued == ["insert_user", "insert_token"]
+
+                await set_token_expiry(datetime.now(timezone.utc) + lifetime * 0.4)
+                patch = await ac.patch("/users/me", json={"username": "alice2"})
+                assert patch.status_code == 200
+                assert patch.json()["username"] == "alice2"
+                assert queued[2:] == ["update_token", "update_user"]
+
+                assert (await ac.post("/auth/logout")).status_code == 204
+                assert queued[4:] == ["delete_token"]
+                assert (await ac.get("/users/me")).status_code == 401
+        finally:
+            await write_queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_reaper_deletes_expired_tokens():
+    await create_test_user()
+    now = datetime.now(timezone.utc)
+    async with async_session_maker() as session:
+        session.add_all(
+            [
+                AccessToken(
+                    token="live",
+                    user_id=TEST_USER_ID,
+                    expires_at=now + timedelta(hours=1),
+                ),
+                AccessToken(token="expired", user_id=TEST_USER_ID, expires_at=now),
+                AccessToken(
+                    token="legacy",
+                    user_id=TEST_USER_ID,
+                    created_at=now - timedelta(days=30),
+                ),
+            ]
+        )
+        await session.commit()
+
+    reaper = TokenReaper(async_session_maker, lifetime_seconds=86400, batch_size=1)
+
+    assert await reaper.reap() == 2
+    async with async_session_maker() as session:
+        assert list(await session.scalars(select(AccessToken.token))) == ["live"]
+    assert metrics.get("access_tokens") == 1
+
+
+@pytest.mark.asyncio
+async def test_signed_tokens_are_checked_without_the_database(monkeypatch):
+    monkeypatch.setattr(settings, "auth_strategy", "signed")
+    async with app.router.lifespan_context(app):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="https://test"
+        ) as ac:
+            assert (await register_and_login(ac, "s3cret-pw")).status_code == 204
+            me = await ac.get("/users/me")
+            assert me.status_code == 200
+            assert me.json()["username"] == "alice"
+
+            # A fresh access token does not need its refresh token
+            await set_token_expiry(datetime.now(timezone.utc) - timedelta(seconds=1))
+            assert (await ac.get("/users/me")).status_code == 200
+
+            # A stale one is refreshed from it
+            monkeypatch.setattr(settings, "auth_access_token_ttl_seconds", 0)
+            assert (await ac.get("/users/me")).status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_signed_tokens_are_refreshed_and_revoked(monkeypatch):
+    monkeypatch.setattr(settings, "auth_strategy", "signed")
+    async with app.router.lifespan_context(app):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="https://test"
+        ) as ac:
+            assert (await register_and_login(ac, "s3cret-pw")).status_code == 204
+            first_token = ac.cookies[settings.auth_cookie_name]
+
+            monkeypatch.setattr(settings, "auth_access_token_ttl_seconds", 0)
+            me = await ac.get("/users/me")
+            assert me.status_code == 200
+            assert settings.auth_cookie_name in me.headers["set-cookie"]
+            assert ac.cookies[settings.auth_cookie_name] != first_token
+
+            # Account changes are seen right away, through a refresh
+            monkeypatch.setattr(settings, "auth_access_token_ttl_seconds", 300)
+            patch = await ac.patch("/users/me", json={"username": "alice2"})
+            assert patch.status_code == 200
+            assert (await ac.get("/users/me")).json()["username"] == "alice2"
+
+            # After logout, the access tokens of the session are rejected right away
+            assert (await ac.post("/auth/logout")).status_code == 204
+            ac.cookies.set(settings.auth_cookie_name, first_token)
+            assert (await ac.get("/users/me")).status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_signed_tokens_reject_upload_tokens(monkeypatch):
+    monkeypatch.setattr(settings, "auth_strategy", "signed")
+    async with app.router.lifespan_context(app):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="https://test"
+        ) as ac:
+            assert (await register_and_login(ac, "s3cret-pw")).status_code == 204
+            user_id = (await ac.get("/users/me")).json()["id"]
+
+            # Upload tokens are signed with the same secret, but for another purpose
+            upload_token = sign_payload(
+                {"user_id": user_id, "path": "a.png", "sha256": "0" * 64, "size": 1},
+                settings.secret,
+                60,
+                PURPOSE_UPLOAD,
+            )
+            ac.cookies.set(settings.auth_cookie_name, upload_token)
+            assert (await ac.get("/users/me")).status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_oauth_callback_creates_then_updates_the_account():
+    async with async_session_maker() as session:
+        user_manager = UserManager(UserDatabase(session, User, OAuthAccount), None)
+        created = await user_manager.oauth_callback(
+            "google", "access-1", "google-id", "bob@example.com"
+        )
+        updated = await user_manager.oauth_callback(
+            "google", "access-2", "google-id", "bob@example.com"
+        )
+
+    assert updated.id == created.id
+    assert [account.access_token for account in updated.oauth_accounts] == ["access-2"]
+
+
+@pytest.mark.asyncio
+async def test_user_loads_skip_the_oauth_accounts():
+    await create_test_user()
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        async with async_session_maker() as session:
+            loaded = await UserDatabase(session, User, OAuthAccount).get(TEST_USER_ID)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+    assert loaded is not None
+    assert len(statements) == 1
+    assert "oauth_account" not in statements[0]
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from pixelgram.__main__ import app
+from pixelgram.bulkhead import Bulkhead, DependencyUnavailableError
+from pixelgram.metrics import metrics
+from pixelgram.services.supabase_client import get_supabase_client
+from tests.overrides import MockSupabaseClient
+from tests.utils import create_test_image, create_test_user
+
+
+@pytest.mark.asyncio
+async def test_bulkhead_bounds_concurrency_and_queue():
+    bulkhead = Bulkhead("test-bounds", max_concurrent=2, max_queued=1, timeout=1)
+    release = asyncio.Event()
+    running = 0
+    peak = 0
+
+    async def call():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await release.wait()
+        running -= 1
+        return "done"
+
+    # Two calls run, one waits for a slot
+    tasks = [asyncio.create_task(bulkhead.run(call)) for _ in range(3)]
+    await asyncio.sleep(0)
+
+    # The queue is full, so further calls are rejected right away
+    with pytest.raises(DependencyUnavailableError):
+        await bulkhead.run(call)
+    assert metrics.get(
+        "bulkhead_rejections_total", dependency="test-bounds", reason="saturated"
+    )
+
+    release.set()
+    assert await asyncio.gather(*tasks) == ["done"] * 3
+    assert peak == 2
+    histogram = metrics.get_histogram(
+        "bulkhead_queue_wait_seconds", dependency="test-bounds"
+    )
+    assert histogram is not None and histogram.count == 3
+
+
+@pytest.mark.asyncio
+async def test_bulkhead_times_out_slow_calls():
+    bulkhead = Bulkhead("test-timeout", max_concurrent=1, max_queued=1, timeout=0.05)
+
+    with pytest.raises(DependencyUnavailableError):
+        await bulkhead.run(lambda: asyncio.sleep(1))
+
+    # The slot is released after a timeout
+    assert await bulkhead.run(lambda: asyncio.sleep(0, "ok")) == "ok"
+
+
+class SaturatedSupabaseClient(MockSupabaseClient):
+    async def upload(self, img, object_path=None):
+        raise DependencyUnavailableError("supabase", "too many pending calls")
+
+
+@pytest.mark.asyncio
+async def test_saturated_dependency_returns_503():
+    app.dependency_overrides[get_supabase_client] = SaturatedSupabaseClient
+    async with app.router.lifespan_context(app):
+        await create_test_user()
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as ac:
+            files = {"file": ("test.png", create_test_image(), "image/png")}
+            response = await ac.post("/posts/", files=files, data={"description": "d"})
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
@@ -0,0 +1,58 @@
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from pixelgram.__main__ import app
+from pixelgram.compression import negotiate_encoding
+from tests.utils import create_test_post, create_test_user
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, expected",
+    [
+        ("gzip, deflate, br", "br"),
+        ("gzip", "gzip"),
+        ("br;q=0.5, gzip;q=0.8", "gzip"),
+        ("br;q=0, gzip;q=0", None),
+        ("*", "br"),
+        ("identity", None),
+        ("", None),
+    ],
+)
+def test_negotiate_encoding(accept_encoding, expected):
+    assert negotiate_encoding(accept_encoding) == expected
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("encoding", ["br", "gzip"])
+async def test_large_responses_are_compressed(encoding):
+    async with app.router.lifespan_context(app):
+        await create_test_user()
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as ac:
+            for i in range(10):
+                await create_test_post(content=f"Post number {i + 1}", client=ac)
+
+            response = await ac.get(
+                "/posts/",
+                params={"page_size": 100},
+                headers={"Accept-Encoding": encoding},
+            )
+
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == encoding
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert int(response.headers["content-length"]) < len(response.content)
+    assert len(response.json()["data"]) == 10
+
+
+@pytest.mark.asyncio
+async def test_small_responses_are_not_compressed():
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        response = await ac.get("/health", headers={"Accept-Encoding": "br, gzip"})
+
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+    assert response.json() == {"status": "ok"}
@@ -0,0 +1,261 @@
+import asyncio
+from datetime import datetime, timezone
+from uuid import uuid4
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import func, insert, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from pixelgram.__main__ import app
+from pixelgram.db import (
+    ReadReplicaRouter,
+    WriteQueue,
+    async_session_maker,
+    configure_sqlite_engine,
+    engine,
+    read_replica_router,
+    release_connection,
+)
+from pixelgram.migrations import upgrade_schema
+from pixelgram.models.base import Base
+from pixelgram.models.post import Post
+from pixelgram.models.post_like import PostLike
+from pixelgram.models.user import User
+from pixelgram.settings import settings
+
+
+def test_read_replica_router_round_robin():
+    router = ReadReplicaRouter(["a", "b", "c"], selection="round_robin")  # type: ignore
+
+    assert [router.pick() for _ in range(4)] == [0, 1, 2, 0]
+
+
+def test_read_replica_router_least_busy():
+    router = ReadReplicaRouter(["a", "b", "c"], selection="least_busy")  # type: ignore
+    router._in_flight = [2, 0, 1]
+
+    assert router.pick() == 1
+    router._in_flight = [0, 0, 0]
+    assert router.pick() == 2
+
+
+def test_read_replica_router_read_your_writes():
+    router = ReadReplicaRouter(["a"], read_your_writes_seconds=60)  # type: ignore
+
+    assert router.must_read_primary(None) is False
+    pin_token = router.pin_token()
+    assert router.must_read_primary(pin_token) is True
+    # The pin is signed, so the routers of the other workers honor it too
+    other = ReadReplicaRouter(["b"], read_your_writes_seconds=60)  # type: ignore
+    assert other.must_read_primary(pin_token) is True
+    assert router.must_read_primary("forged.token") is False
+
+
+def test_read_replica_router_disabled_without_replicas():
+    router = ReadReplicaRouter([])
+
+    assert router.enabled is False
+    assert router.pin_token() is None
+
+
+async def test_writers_are_pinned_to_the_primary_by_cookie(monkeypatch):
+    replica_sessions = []
+
+    def replica_session_maker():
+        replica_sessions.append(True)
+        return async_session_maker()
+
+    monkeypatch.setattr(read_replica_router, "replicas", [engine])
+    monkeypatch.setattr(read_replica_router, "_session_makers", [replica_session_maker])
+    monkeypatch.setattr(read_replica_router, "_in_flight", [0])
+    async with app.router.lifespan_context(app):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="https://test"
+        ) as ac:
+            response = await ac.post(
+                "/auth/register",
+                json={
+                    "email": "alice@example.com",
+                    "username": "alice",
+                    "password": "s3cret-pw",
+                },
+            )
+            assert response.status_code == 201
+            assert settings.db_read_your_writes_cookie_name in ac.cookies
+            replica_sessions.clear()
+
+            # Any worker reads the writer's next requests from the primary
+            response = await ac.get("/users/search", params={"prefix": "al"})
+            assert response.status_code == 200 and replica_sessions == []
+
+            ac.cookies.delete(settings.db_read_your_writes_cookie_name)
+            response = await ac.get("/users/search", params={"prefix": "al"})
+            assert response.status_code == 200 and replica_sessions == [True]
+
+
+async def test_write_queue_batches_and_isolates_failures(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'queue.db'}")
+    configure_sqlite_engine(engine, begin="BEGIN IMMEDIATE")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(
+            insert(User).values(
+                id=uuid4(), email="test@example.com", hashed_password="x", username="t"
+            )
+        )
+    queue = WriteQueue(async_sessionmaker(engine, expire_on_commit=False))
+    queue.start()
+
+    async def add_user(session: AsyncSession) -> str:
+        user = User(email=f"{uuid4()}@example.com", hashed_password="x", username="u")
+        session.add(user)
+        await session.flush()
+        return user.email
+
+    async def fail(session: AsyncSession) -> None:
+        await add_user(session)
+        raise ValueError("boom")
+
+    results = await asyncio.gather(
+        *(queue.submit(add_user) for _ in range(5)),
+        queue.submit(fail),
+        return_exceptions=True,
+    )
+    await queue.stop()
+
+    assert all(isinstance(result, str) for result in results[:5])
+    assert isinstance(results[5], ValueError)
+    async with engine.connect() as conn:
+        pragmas = (await conn.exec_driver_sql("PRAGMA journal_mode")).scalar()
+        count = (await conn.execute(select(func.count(User.id)))).scalar()
+    assert pragmas == "wal"
+    assert count == 6
+    await engine.dispose()
+
+
+async def test_release_connection_returns_connection_to_pool():
+    async with async_session_maker() as session:
+        checked_out = engine.pool.checkedout()  # type: ignore
+        await session.execute(select(User))
+        assert engine.pool.checkedout() == checked_out + 1  # type: ignore
+
+        await release_connection(session)
+        assert engine.pool.checkedout() == checked_out  # type: ignore
+
+        # The session keeps working and checks out a connection again
+        await session.execute(select(User))
+        assert engine.pool.checkedout() == checked_out + 1  # type: ignore
+
+
+async def test_release_connection_never_commits():
+    async with async_session_maker() as session:
+        await session.execute(select(User))
+        session.add(User(email="a@example.com", hashed_password="x", username="a"))
+        await session.flush()
+
+        # Flushed writes are no longer pending, yet they must not be committed
+        await release_connection(session)
+        assert session.in_transaction()
+
+    async with async_session_maker() as session:
+        users = await session.execute(select(User).where(User.username == "a"))
+        assert users.first() is None
+
+
+async def test_release_connection_keeps_pending_changes():
+    async with async_session_maker() as session:
+        await session.execute(select(User))
+        session.add(User(email="a@example.com", hashed_password="x", username="a"))
+
+        await release_connection(session)
+        assert session.in_transaction()
+        assert session.new
+
+
+async def test_release_connection_keeps_loaded_objects():
+    async with async_session_maker() as session:
+        session.add(User(email="a@example.com", hashed_password="x", username="a"))
+        await session.commit()
+
+    async with async_session_maker() as session:
+        user = (await session.execute(select(User))).scalar_one()
+        await release_connection(session)
+        assert not session.in_transaction()
+
+        # The user is still attached, and changing it is written on commit
+        assert user in session and user.username == "a"
+        user.username = "b"
+        await session.commit()
+
+    async with async_session_maker() as session:
+        assert (await session.execute(select(User.username))).scalar_one() == "b"
+
+
+async def test_upgrade_schema_adds_missing_columns(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'old.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        # A database from before comments could be deleted
+        await conn.exec_driver_sql("DROP INDEX ix_post_comment_deleted_at")
+        await conn.exec_driver_sql("ALTER TABLE post_comment DROP COLUMN deleted_at")
+        # And from before tokens expired
+        await conn.exec_driver_sql("DROP INDEX ix_accesstoken_expires_at")
+        await conn.exec_driver_sql("ALTER TABLE accesstoken DROP COLUMN expires_at")
+
+    async with engine.begin() as conn:
+        await conn.run_sync(upgrade_schema)
+        # Upgrading an up-to-date database changes nothing
+        await conn.run_sync(upgrade_schema)
+
+        def inspect_table(conn, table):
+            inspector = inspect(conn)
+            columns = [c["name"] for c in inspector.get_columns(table)]
+            indexes = [i["name"] for i in inspector.get_indexes(table)]
+            return columns, indexes
+
+        columns, indexes = await conn.run_sync(inspect_table, "post_comment")
+        assert "deleted_at" in columns
+        assert "ix_post_comment_deleted_at" in indexes
+        columns, indexes = await conn.run_sync(inspect_table, "accesstoken")
+        assert "expires_at" in columns
+        assert "ix_accesstoken_expires_at" in indexes
+    await engine.dispose()
+
+
+async def test_upgrade_schema_removes_duplicate_images(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'old.db'}")
+    user_id, first, second = uuid4(), uuid4(), uuid4()
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        # A database from before image URLs were unique
+        await conn.exec_driver_sql("DROP INDEX ix_post_image_url")
+        await conn.exec_driver_sql("CREATE INDEX ix_post_image_url ON post (image_url)")
+        await conn.execute(
+            insert(User).values(
+                id=user_id, email="test@example.com", hashed_password="x", username="t"
+            )
+        )
+        for day, post_id in enumerate((first, second), start=1):
+            await conn.execute(
+                insert(Post).values(
+                    id=post_id,
+                    description="Twice",
+                    image_url="a.png",
+                    created_at=datetime(2024, 1, day, tzinfo=timezone.utc),
+                    user_id=user_id,
+                )
+            )
+            await conn.execute(
+                insert(PostLike).values(post_id=post_id, user_id=user_id)
+            )
+
+    async with engine.begin() as conn:
+        await conn.run_sync(upgrade_schema)
+
+        posts = (await conn.execute(select(Post.id))).scalars().all()
+        likes = (await conn.execute(select(PostLike.post_id))).scalars().all()
+        indexes = await conn.run_sync(lambda conn: inspect(conn).get_indexes("post"))
+    assert posts == [first]
+    assert likes == [first]
+    assert any(i["name"] == "ix_post_image_url" and i["unique"] for i in indexes)
+    await engine.dispose()
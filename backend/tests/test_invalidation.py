@@ -0,0 +1,92 @@
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+
+from pixelgram.invalidation import (
+    ENTITY_POST,
+    ENTITY_USER,
+    LocalInvalidationBus,
+    SqliteInvalidationBus,
+)
+
+
+def test_local_bus_dispatches_to_subscribers():
+    bus = LocalInvalidationBus()
+    received = []
+    bus.subscribe(lambda entity, entity_id: received.append((entity, entity_id)))
+
+    bus.publish(ENTITY_POST, "1")
+
+    assert received == [(ENTITY_POST, "1")]
+
+
+@pytest.mark.asyncio
+async def test_sqlite_bus_reaches_other_workers(tmp_path):
+    path = str(tmp_path / "invalidation.db")
+    first, second = SqliteInvalidationBus(path), SqliteInvalidationBus(path)
+    first_received, second_received = [], []
+    first.subscribe(lambda *change: first_received.append(change))
+    second.subscribe(lambda *change: second_received.append(change))
+    first.open()
+
+    # Changes made before a worker joins are not replayed to it
+    first.publish(ENTITY_POST, "old")
+    await first.sync()
+    second.open()
+
+    first.publish(ENTITY_POST, "1")
+    first.publish(ENTITY_USER, "2")
+    assert first_received == [
+        (ENTITY_POST, "old"),
+        (ENTITY_POST, "1"),
+        (ENTITY_USER, "2"),
+    ]
+    assert second_received == []
+
+    await first.sync()
+    await second.sync()
+    assert second_received == [(ENTITY_POST, "1"), (ENTITY_USER, "2")]
+
+    # A worker never receives its own changes back
+    await first.sync()
+    assert len(first_received) == 3
+
+    first.close()
+    second.close()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_bus_stops_after_the_sync_in_flight(tmp_path):
+    path = str(tmp_path / "invalidation.db")
+    bus = SqliteInvalidationBus(path, poll_interval=0)
+    exchanging, release = threading.Event(), threading.Event()
+    exchange = bus._exchange
+    overlaps = []
+
+    def slow_exchange(outbox):
+        overlaps.append(exchanging.is_set())
+        exchanging.set()
+        release.wait()
+        try:
+            return exchange(outbox)
+        finally:
+            exchanging.clear()
+
+    bus._exchange = slow_exchange  # type: ignore
+    bus.start()
+    await asyncio.to_thread(exchanging.wait)
+    bus.publish(ENTITY_POST, "1")
+
+    # The final sync waits for the poller's exchange to release the connection
+    stopping = asyncio.create_task(bus.stop())
+    await asyncio.sleep(0.05)
+    assert not stopping.done()
+    release.set()
+    await stopping
+    assert overlaps == [False, False]
+
+    with sqlite3.connect(path) as connection:
+        rows = connection.execute("SELECT entity_id FROM entity_change").fetchall()
+    assert rows == [("1",)]
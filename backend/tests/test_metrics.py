@@ -0,0 +1,102 @@
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from pixelgram.__main__ import app
+from pixelgram.instrumentation import SqliteMetricsExporter
+from pixelgram.metrics import MetricsRegistry, metrics, render_prometheus
+from pixelgram.settings import settings
+from tests.utils import create_test_user
+
+
+def test_render_prometheus():
+    registry = MetricsRegistry()
+    registry.increment("requests_total", 2, route='/a"b')
+    registry.set_gauge("in_flight", 1.5)
+    registry.observe("duration_seconds", 0.2, buckets=(0.1, 1))
+    registry.observe("duration_seconds", 3, buckets=(0.1, 1))
+
+    assert render_prometheus(registry).splitlines() == [
+        "# TYPE requests_total counter",
+        'requests_total{route="/a\\"b"} 2',
+        "# TYPE in_flight gauge",
+        "in_flight 1.5",
+        "# TYPE duration_seconds histogram",
+        'duration_seconds_bucket{le="0.1"} 0',
+        'duration_seconds_bucket{le="1"} 1',
+        'duration_seconds_bucket{le="+Inf"} 2',
+        "duration_seconds_sum 3.2",
+        "duration_seconds_count 2",
+    ]
+
+
+def test_registries_merge_from_snapshots():
+    first, second = MetricsRegistry(), MetricsRegistry()
+    for registry in (first, second):
+        registry.increment("requests_total", route="/a")
+        registry.observe("duration_seconds", 0.2)
+    second.increment("requests_total", route="/b")
+
+    merged = MetricsRegistry()
+    merged.merge(first.snapshot())
+    merged.merge(second.snapshot())
+
+    assert merged.get("requests_total", route="/a") == 2
+    assert merged.get("requests_total", route="/b") == 1
+    histogram = merged.get_histogram("duration_seconds")
+    assert histogram is not None and histogram.count == 2
+
+
+@pytest.mark.asyncio
+async def test_requests_are_measured_by_route(monkeypatch):
+    monkeypatch.setattr(settings, "metrics_token", "scraper-token")
+    await create_test_user()
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        assert (await ac.get("/users/search", params={"prefix": "te"})).json()
+        response = await ac.get(
+            "/metrics", headers={"Authorization": "Bearer scraper-token"}
+        )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert metrics.get(
+        "http_requests_total", method="GET", route="/users/search", status=200
+    )
+    queries = metrics.get_histogram(
+        "http_request_db_queries", method="GET", route="/users/search"
+    )
+    assert queries is not None and queries.sum >= 1
+    assert 'route="/users/search"' in response.text
+
+
+@pytest.mark.asyncio
+async def test_metrics_require_the_token(monkeypatch):
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        # Not exposed at all while no token is configured
+        assert (await ac.get("/metrics")).status_code == 404
+
+        monkeypatch.setattr(settings, "metrics_token", "scraper-token")
+        assert (await ac.get("/metrics")).status_code == 401
+        response = await ac.get("/metrics", headers={"Authorization": "Bearer wrong"})
+        assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_sqlite_exporter_sums_the_workers(tmp_path):
+    metrics.increment("test_exported_total")
+    path = str(tmp_path / "metrics.db")
+    first, second = SqliteMetricsExporter(path), SqliteMetricsExporter(path)
+    first.open()
+    await first.publish()
+
+    # Both workers share the registry here, so its series are counted twice
+    registry = await second.collect()
+    assert registry.get("test_exported_total") == 2 * metrics.get("test_exported_total")
+
+    await first.stop()
+    registry = await second.collect()
+    assert registry.get("test_exported_total") == metrics.get("test_exported_total")
+    await second.stop()
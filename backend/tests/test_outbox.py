@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+from pixelgram.db import async_session_maker
+from pixelgram.jobs.outbox import OutboxWorker, enqueue
+from pixelgram.models.outbox import OutboxMessage
+
+
+async def get_messages() -> list[OutboxMessage]:
+    async with async_session_maker() as session:
+        result = await session.scalars(select(OutboxMessage).order_by(OutboxMessage.id))
+        return list(result.all())
+
+
+async def enqueue_messages(*keys: str) -> None:
+    async with async_session_maker() as session:
+        for key in keys:
+            await enqueue(session, "test", {"key": key}, idempotency_key=key)
+        await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_enqueue_is_idempotent():
+    await enqueue_messages("a", "a")
+    await enqueue_messages("a")
+
+    assert [m.idempotency_key for m in await get_messages()] == ["a"]
+
+
+@pytest.mark.asyncio
+async def test_worker_handles_messages_in_batches():
+    handled = []
+
+    async def handler(payload):
+        handled.append(payload["key"])
+
+    await enqueue_messages("a", "b", "c")
+    worker = OutboxWorker(async_session_maker, {"test": handler}, batch_size=2)
+
+    assert await worker.run_once() == 2
+    assert await worker.drain() == 1
+    assert sorted(handled) == ["a", "b", "c"]
+    assert all(m.processed_at is not None for m in await get_messages())
+
+    # Handled messages are not delivered again
+    assert await worker.run_once() == 0
+    assert len(handled) == 3
+
+
+@pytest.mark.asyncio
+async def test_claimed_messages_are_not_handled_by_other_workers():
+    await enqueue_messages("a")
+    first = OutboxWorker(async_session_maker, {}, lease_seconds=60)
+    second = OutboxWorker(async_session_maker, {})
+
+    assert len(await first._claim()) == 1
+    assert await second._claim() == []
+
+
+@pytest.mark.asyncio
+async def test_worker_retries_failed_messages_up_to_max_attempts():
+    async def handler(payload):
+        raise RuntimeError("storage down")
+
+    await enqueue_messages("a")
+    worker = OutboxWorker(
+        async_session_maker,
+        {"test": handler},
+        max_attempts=2,
+        retry_base_delay=0,
+    )
+
+    assert await worker.run_once() == 1
+    [message] = await get_messages()
+    assert message.attempts == 1
+    assert message.processed_at is None
+    assert message.last_error == "RuntimeError: storage down"
+
+    # The second failure exhausts the attempts, the message is left for inspection
+    assert await worker.run_once() == 1
+    assert await worker.run_once() == 0
+    [message] = await get_messages()
+    assert message.attempts == 2
+    assert message.processed_at is None
+
+
+@pytest.mark.asyncio
+async def test_worker_runs_in_background_when_woken():
+    handled = []
+
+    async def handler(payload):
+        handled.append(payload["key"])
+
+    worker = OutboxWorker(async_session_maker, {"test": handler}, poll_interval=60)
+    worker.start()
+    try:
+        await enqueue_messages("a")
+        worker.wake()
+        for _ in range(100):
+            if handled:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        await worker.stop()
+
+    assert handled == ["a"]
@@ -0,0 +1,108 @@
+from datetime import datetime, timezone
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import func, select
+
+from pixelgram.__main__ import app
+from pixelgram.db import async_session_maker
+from pixelgram.jobs.purge import TombstonePurger
+from pixelgram.models.outbox import OutboxMessage
+from pixelgram.models.post import Post
+from pixelgram.models.post_comment import PostComment
+from pixelgram.models.post_like import PostLike
+from tests.utils import create_test_post, create_test_user
+
+
+async def count_rows(model) -> int:
+    async with async_session_maker() as session:
+        return await session.scalar(select(func.count()).select_from(model))
+
+
+@pytest.mark.asyncio
+async def test_deleted_post_is_purged_with_its_interactions():
+    async with app.router.lifespan_context(app):
+        await create_test_user()
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as ac:
+            post_id = await create_test_post(client=ac)
+            await ac.post(f"/posts/{post_id}/like/")
+            await ac.post(f"/posts/{post_id}/comments/", json={"content": "Nice"})
+
+            delete_resp = await ac.delete(f"/posts/{post_id}/")
+            assert delete_resp.status_code == 204
+            assert (await ac.get("/posts/")).json()["total"] == 0
+            assert (await ac.get(f"/posts/{post_id}/comments/")).status_code == 404
+
+    # The delete only sets the tombstone
+    async with async_session_maker() as session:
+        post = (await session.scalars(select(Post))).one()
+        assert post.deleted_at is not None
+    assert await count_rows(PostLike) == 1
+    assert await count_rows(OutboxMessage) == 0
+
+    # Rows within the grace period are kept
+    assert await TombstonePurger(async_session_maker, grace_seconds=3600).purge() == 0
+
+    assert await TombstonePurger(async_session_maker, grace_seconds=0).purge() == 1
+    assert await count_rows(Post) == 0
+    assert await count_rows(PostLike) == 0
+    assert await count_rows(PostComment) == 0
+    async with async_session_maker() as session:
+        message = (await session.scalars(select(OutboxMessage))).one()
+    assert message.payload == {"image_url": post.image_url}
+
+
+@pytest.mark.asyncio
+async def test_deleted_comment_is_hidden_then_purged():
+    async with app.router.lifespan_context(app):
+        await create_test_user()
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as ac:
+            post_id = await create_test_post(client=ac)
+            comment_resp = await ac.post(
+                f"/posts/{post_id}/comments/", json={"content": "Oops"}
+            )
+            comment_id = comment_resp.json()["comment"]["id"]
+
+            delete_resp = await ac.delete(f"/posts/{post_id}/comments/{comment_id}/")
+            assert delete_resp.status_code == 204
+
+            comments = (await ac.get(f"/posts/{post_id}/comments/")).json()
+            assert comments["total"] == 0
+            assert (await ac.get("/posts/")).json()["data"][0]["commentsCount"] == 0
+
+            # A tombstoned comment cannot be deleted again
+            delete_resp = await ac.delete(f"/posts/{post_id}/comments/{comment_id}/")
+            assert delete_resp.status_code == 404
+
+    assert await count_rows(PostComment) == 1
+    assert await TombstonePurger(async_session_maker, grace_seconds=0).purge() == 1
+    assert await count_rows(PostComment) == 0
+
+
+@pytest.mark.asyncio
+async def test_purge_runs_in_batches():
+    await create_test_user()
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        for _ in range(5):
+            post_id = await create_test_post(client=ac)
+            await ac.delete(f"/posts/{post_id}/")
+
+    purger = TombstonePurger(
+        async_session_maker, grace_seconds=0, batch_size=2, batch_pause=0
+    )
+    assert await purger.purge() == 5
+    assert await count_rows(Post) == 0
+
+
+def test_purge_only_runs_during_configured_hours():
+    purger = TombstonePurger(async_session_maker, hours=[2, 3])
+
+    assert purger.is_purge_time(datetime(2024, 1, 1, 2, 30, tzinfo=timezone.utc))
+    assert not purger.is_purge_time(datetime(2024, 1, 1, 12, tzinfo=timezone.utc))
+    assert TombstonePurger(async_session_maker).is_purge_time(datetime.now())
@@ -0,0 +1,105 @@
+import logging
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from pixelgram.__main__ import app
+from pixelgram.db import write_queue
+from pixelgram.instrumentation import (
+    QueryBudgetExceeded,
+    QueryStats,
+    check_query_budget,
+    track_queries,
+)
+from pixelgram.metrics import metrics
+from tests.utils import create_test_post, create_test_user
+
+
+async def create_interacted_posts(ac: AsyncClient, count: int) -> list[str]:
+    """Create posts, each liked, saved and commented by the test user."""
+    post_ids = [await create_test_post(client=ac) for _ in range(count)]
+    for post_id in post_ids:
+        await ac.post(f"/posts/{post_id}/like/")
+        await ac.post(f"/posts/{post_id}/save/")
+        await ac.post(f"/posts/{post_id}/comments/", json={"content": "Nice"})
+    return post_ids
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("count", [2, 12])
+async def test_reads_stay_within_budget(count, query_budget):
+    """Test that the reads run as many statements however many posts they show."""
+    await create_test_user()
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        post_ids = await create_interacted_posts(ac, count)
+
+        with query_budget(statements=9, rows=70) as stats:
+            assert (await ac.get("/posts/")).status_code == 200
+        # Every post of the page is fetched, along with its counters
+        assert stats.rows >= count
+        with query_budget(statements=8, rows=70):
+            assert (await ac.get("/posts/saved/")).status_code == 200
+        with query_budget(statements=5, rows=10):
+            response = await ac.get(f"/posts/{post_ids[0]}/comments/")
+            assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_mutations_stay_within_budget(query_budget):
+    """Test that likes and saves run a fixed number of statements."""
+    await create_test_user()
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        post_id = await create_test_post(client=ac)
+
+        with query_budget(statements=5, rows=2):
+            assert (await ac.post(f"/posts/{post_id}/like/")).status_code == 204
+        with query_budget(statements=4, rows=2):
+            assert (await ac.delete(f"/posts/{post_id}/like/")).status_code == 204
+        with query_budget(statements=3, rows=2):
+            assert (await ac.post(f"/posts/{post_id}/save/")).status_code == 204
+        with query_budget(statements=2, rows=2):
+            assert (await ac.delete(f"/posts/{post_id}/save/")).status_code == 204
+
+
+@pytest.mark.asyncio
+async def test_queued_writes_count_towards_their_caller():
+    """Test that the statements run by the writer task are credited to the request."""
+    await create_test_user()
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        first_id = await create_test_post(client=ac)
+        second_id = await create_test_post(client=ac)
+        with track_queries() as direct:
+            assert (await ac.post(f"/posts/{first_id}/like/")).status_code == 204
+
+        # As under the SQLite profile, where writes go through the writer task
+        write_queue.start()
+        try:
+            with track_queries() as queued:
+                response = await ac.post(f"/posts/{second_id}/like/")
+                assert response.status_code == 204
+        finally:
+            await write_queue.stop()
+
+    assert queued.statements == direct.statements
+
+
+def test_over_budget_calls_are_reported(caplog):
+    stats = QueryStats()
+    stats.statements = 3
+    stats.rows = 10
+
+    assert check_query_budget("within", stats, statements=3, rows=10)
+
+    with caplog.at_level(logging.WARNING, logger="pixelgram.instrumentation"):
+        assert not check_query_budget("over", stats, statements=2)
+    assert "over ran 3 statements fetching 10 rows" in caplog.text
+    assert metrics.get("query_budget_exceeded_total", call="over") >= 1
+
+    with pytest.raises(QueryBudgetExceeded):
+        check_query_budget("strict", stats, statements=3, rows=5, strict=True)
@@ -1,42 +1,79 @@
+import sqlite3
+
 import pytest
-from fastapi import APIRouter, Request
 from httpx import ASGITransport, AsyncClient
 
 from pixelgram.__main__ import app
-from pixelgram.limiter import limiter
+from pixelgram import limiter as limiter_module
+from pixelgram.limiter import MemoryBucketStorage, SqliteBucketStorage
+from pixelgram.settings import settings
+from tests.utils import create_test_image
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("storage", ["memory", "sqlite"])
+async def test_token_bucket_storage(storage, tmp_path):
+    bucket_storage = (
+        MemoryBucketStorage()
+        if storage == "memory"
+        else SqliteBucketStorage(str(tmp_path / "buckets.db"))
+    )
+
+    # The bucket starts full, allowing a burst up to its capacity
+    for _ in range(3):
+        allowed, _ = await bucket_storage.take("user", rate=0.5, capacity=3)
+        assert allowed
 
+    allowed, retry_after = await bucket_storage.take("user", rate=0.5, capacity=3)
+    assert not allowed
+    assert 0 < retry_after <= 2
 
-@pytest.fixture
-def mount_rate_limit_test_route():
-    rate_limit_router = APIRouter()
+    # Buckets are per key
+    allowed, _ = await bucket_storage.take("other", rate=0.5, capacity=3)
+    assert allowed
 
-    @rate_limit_router.get("/rate-limit-test")
-    @limiter.limit("3/minute")
-    async def rate_limited_route(request: Request):
-        return {"message": "Success"}
 
-    app.include_router(rate_limit_router)
+@pytest.mark.asyncio
+async def test_memory_storage_prunes_full_buckets_by_their_own_limits():
+    bucket_storage = MemoryBucketStorage(max_buckets=1)
+    await bucket_storage.take("slow", rate=0.001, capacity=1)
+
+    # A faster limit pruning the map must not refill the slow bucket
+    await bucket_storage.take("fast", rate=1000, capacity=1)
+    allowed, _ = await bucket_storage.take("slow", rate=0.001, capacity=1)
+    assert not allowed
 
-    yield
 
-    app.router.routes = [
-        route
-        for route in app.router.routes
-        if getattr(route, "path", None) != "/rate-limit-test"
-    ]
+@pytest.mark.asyncio
+async def test_sqlite_storage_prunes_full_buckets(tmp_path):
+    path = str(tmp_path / "buckets.db")
+    bucket_storage = SqliteBucketStorage(path, prune_interval_seconds=0)
+    await bucket_storage.take("slow", rate=0.001, capacity=1)
+    await bucket_storage.take("fast", rate=1_000_000, capacity=1)
+
+    # The fast bucket is full again by the next take, which prunes it
+    await bucket_storage.take("other", rate=0.001, capacity=1)
+    with sqlite3.connect(path) as connection:
+        keys = connection.execute("SELECT key FROM token_bucket ORDER BY key")
+        assert [key for (key,) in keys] == ["other", "slow"]
+    allowed, _ = await bucket_storage.take("slow", rate=0.001, capacity=1)
+    assert not allowed
 
 
 @pytest.mark.asyncio
-async def test_rate_limiter_blocks_after_limit(mount_rate_limit_test_route):
+async def test_caption_rate_limit_per_user(monkeypatch):
+    monkeypatch.setattr(limiter_module, "bucket_storage", MemoryBucketStorage())
+    capacity = settings.caption_rate_limit_capacity
+
     async with AsyncClient(
         transport=ASGITransport(app=app), base_url="http://test"
     ) as ac:
-        # Send 3 requests within the limit
-        for _ in range(3):
-            response = await ac.get("/rate-limit-test")
+        for _ in range(capacity):
+            files = {"file": ("test.png", create_test_image(), "image/png")}
+            response = await ac.post("/captions/", files=files)
             assert response.status_code == 200
 
-        # This request should exceed the limit
-        response = await ac.get("/rate-limit-test")
+        files = {"file": ("test.png", create_test_image(), "image/png")}
+        response = await ac.post("/captions/", files=files)
         assert response.status_code == 429
-        assert "rate limit exceeded" in response.text.lower()
+        assert int(response.headers["retry-after"]) > 0
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+
+import pytest
+
+from pixelgram.db import async_session_maker
+from pixelgram.jobs.reconcile import reconcile_images
+from pixelgram.models.post import Post
+from tests.utils import create_test_user
+
+OLD = (datetime.now(timezone.utc) - timedelta(days=1)).isoformat()
+RECENT = datetime.now(timezone.utc).isoformat()
+
+
+class FakeStorage:
+    def __init__(self, objects: dict[str, str]):
+        self.objects = objects
+        self.delete_requests: list[list[str]] = []
+
+    def public_url(self, path: str) -> str:
+        return f"https://storage.test/public/bucket/{path}"
+
+    async def list_objects(self, limit: int, offset: int = 0) -> list[dict]:
+        names = sorted(self.objects)[offset : offset + limit]
+        return [
+            {"id": name, "name": name, "created_at": self.objects[name]}
+            for name in names
+        ]
+
+    async def delete_many(self, paths: list[str]) -> None:
+        self.delete_requests.append(paths)
+        for path in paths:
+            del self.objects[path]
+
+
+async def create_posts(storage: FakeStorage, *paths: str) -> None:
+    await create_test_user()
+    async with async_session_maker() as session:
+        for path in paths:
+            session.add(
+                Post(
+                    user_id=UUID("00000000-0000-0000-0000-000000000001"),
+                    image_url=storage.public_url(path),
+                    description=path,
+                )
+            )
+        await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_reconcile_dry_run_reports_orphans():
+    storage = FakeStorage({"a.png": OLD, "b.png": OLD, "c.png": OLD, "d.png": RECENT})
+    await create_posts(storage, "b.png")
+    found = []
+
+    report = await reconcile_images(
+        async_session_maker, storage, page_size=2, on_orphan=found.append
+    )
+
+    # Recent objects may belong to a post being created
+    assert found == ["a.png", "c.png"]
+    assert report == (4, 2, 0)
+    assert len(storage.objects) == 4
+
+
+@pytest.mark.asyncio
+async def test_reconcile_deletes_orphans_page_by_page():
+    names = [f"{i:02}.png" for i in range(7)]
+    storage = FakeStorage({name: OLD for name in names})
+    await create_posts(storage, "01.png", "04.png")
+
+    report = await reconcile_images(
+        async_session_maker, storage, page_size=3, delete=True
+    )
+
+    assert report == (7, 5, 5)
+    assert sorted(storage.objects) == ["01.png", "04.png"]
+    assert all(len(paths) <= 3 for paths in storage.delete_requests)
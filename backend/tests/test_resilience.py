@@ -0,0 +1,137 @@
+import asyncio
+
+import httpx
+import pytest
+
+from pixelgram.bulkhead import Bulkhead, DependencyUnavailableError
+from pixelgram.metrics import metrics
+from pixelgram.resilience import (
+    CIRCUIT_CLOSED,
+    CIRCUIT_HALF_OPEN,
+    CIRCUIT_OPEN,
+    CircuitBreaker,
+    LatencyTracker,
+    hedged,
+    retry_with_backoff,
+)
+from pixelgram.services import supabase_client
+from pixelgram.services.supabase_client import (
+    SupabaseStorageClient,
+    is_storage_failure,
+)
+
+
+async def fail():
+    raise ConnectionError("down")
+
+
+async def succeed():
+    return "ok"
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_opens_and_recovers():
+    breaker = CircuitBreaker(
+        "test-breaker",
+        failure_rate_threshold=0.5,
+        window_size=4,
+        min_calls=4,
+        reset_timeout=0.05,
+    )
+
+    for call in (succeed, fail, succeed, fail):
+        try:
+            await breaker.call(call)
+        except ConnectionError:
+            pass
+    assert breaker.state == CIRCUIT_OPEN
+
+    # Calls fail fast while the circuit is open
+    with pytest.raises(DependencyUnavailableError):
+        await breaker.call(succeed)
+    assert metrics.get("circuit_rejections_total", dependency="test-breaker") == 1
+
+    # A successful trial call closes the circuit
+    await asyncio.sleep(0.05)
+    assert breaker.state == CIRCUIT_HALF_OPEN
+    assert await breaker.call(succeed) == "ok"
+    assert breaker.state == CIRCUIT_CLOSED
+
+
+@pytest.mark.asyncio
+async def test_retry_with_backoff_retries_transient_failures():
+    attempts = 0
+
+    async def flaky():
+        nonlocal attempts
+        attempts += 1
+        if attempts < 3:
+            raise ConnectionError("flaky")
+        return "ok"
+
+    result = await retry_with_backoff(flaky, "test-retry", attempts=3, base_delay=0)
+    assert result == "ok"
+    assert metrics.get("dependency_retries_total", dependency="test-retry") == 2
+
+    # Failures that are not retryable are raised right away
+    with pytest.raises(ConnectionError):
+        await retry_with_backoff(
+            fail, "test-retry", attempts=3, is_retryable=lambda e: False
+        )
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_wins_over_slow_one():
+    calls = 0
+
+    async def first_slow():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(1 if calls == 1 else 0)
+        return calls
+
+    assert await hedged(first_slow, "test-hedge", delay=0.01) == 2
+    assert metrics.get("dependency_hedge_wins_total", dependency="test-hedge") == 1
+
+
+@pytest.mark.asyncio
+async def test_hedged_storage_requests_take_their_own_slot(monkeypatch):
+    bulkhead = Bulkhead("test-hedge-slots", max_concurrent=1, max_queued=0, timeout=1)
+    monkeypatch.setattr(supabase_client, "supabase_bulkhead", bulkhead)
+    monkeypatch.setattr(supabase_client.supabase_latency, "quantile", lambda q: 0.01)
+
+    async def slow_request():
+        await asyncio.sleep(0.1)
+        return httpx.Response(200)
+
+    # The hedged request finds the only slot taken, the first one still answers
+    response = await SupabaseStorageClient()._send(slow_request, hedge=True)
+    assert response.status_code == 200
+    assert (
+        metrics.get(
+            "bulkhead_rejections_total",
+            dependency="test-hedge-slots",
+            reason="saturated",
+        )
+        == 1
+    )
+
+
+def test_storage_saturation_is_not_a_failure():
+    assert is_storage_failure(httpx.ConnectError("down"))
+    assert is_storage_failure(DependencyUnavailableError("supabase", "call timed out"))
+    assert not is_storage_failure(
+        DependencyUnavailableError("supabase", "too many pending calls")
+    )
+    assert not is_storage_failure(
+        DependencyUnavailableError("supabase", "timed out waiting for a slot")
+    )
+
+
+def test_latency_tracker_quantile():
+    tracker = LatencyTracker(size=100, min_samples=10)
+    assert tracker.quantile(0.95) is None
+
+    for i in range(1, 101):
+        tracker.record(i / 100)
+    assert tracker.quantile(0.95) == pytest.approx(0.96)
@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+import pytest
+from pydantic import HttpUrl
+
+from pixelgram.schemas.post import PostRead
+from pixelgram.schemas.post_comment import PostCommentRead
+
+
+@pytest.mark.parametrize(
+    "created_at",
+    [
+        datetime(2025, 5, 5, 9, 34, 49, 976543, tzinfo=timezone.utc),
+        datetime(2025, 5, 5, 9, 34, 49, tzinfo=timezone(timedelta(hours=2))),
+        datetime(2025, 5, 5, 9, 34, 49, 976543),
+    ],
+)
+def test_post_serialize_row_matches_model_dump(created_at):
+    fields = dict(
+        id=uuid4(),
+        description="A cat sitting on a chair",
+        image_url="https://example.com/image.png",
+        user_id=uuid4(),
+        author_username="catlover123",
+        author_email="catlover123@example.com",
+        created_at=created_at,
+        likes_count=23,
+        liked_by_user=True,
+        comments_count=5,
+        commented_by_user=False,
+        saved_by_user=True,
+    )
+    expected = PostRead(**{**fields, "image_url": HttpUrl(fields["image_url"])})
+
+    assert PostRead.serialize_row(**fields) == expected.model_dump(
+        mode="json", by_alias=True
+    )
+
+
+def test_comment_serialize_row_matches_model_dump():
+    fields = dict(
+        id=uuid4(),
+        post_id=uuid4(),
+        user_id=uuid4(),
+        author_username="catlover123",
+        author_email="catlover123@example.com",
+        content="So cute!",
+        created_at=datetime.now(timezone.utc),
+        by_user=True,
+    )
+
+    assert PostCommentRead.serialize_row(**fields) == PostCommentRead(
+        **fields
+    ).model_dump(mode="json", by_alias=True)
@@ -1,8 +1,18 @@
+from uuid import UUID, uuid4
+
 import pytest
 from httpx import ASGITransport, AsyncClient
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
 
 from pixelgram.__main__ import app
 from pixelgram.auth import current_active_user  # noqa: E402
+from pixelgram.db import get_read_session
+from pixelgram.models.user import User, username_search_key
+from pixelgram.services.user_directory import user_directory
+from pixelgram.services.username_index import username_index
+from pixelgram.settings import settings
 from tests.utils import create_test_post, create_test_user, get_test_user
 
 
@@ -27,6 +37,29 @@ async def test_get_username_by_id_success():
             assert user_data["username"] == username
 
 
+@pytest.mark.asyncio
+async def test_get_username_by_id_conditional():
+    """Test that unchanged user info is answered with 304 Not Modified."""
+    user_id = "00000000-0000-0000-0000-000000000001"
+
+    async with app.router.lifespan_context(app):
+        await create_test_user(id=user_id)
+
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as ac:
+            response = await ac.get(f"/users/{user_id}/info")
+            assert response.status_code == 200
+            etag = response.headers["etag"]
+            assert response.headers["cache-control"].startswith("private, max-age=")
+
+            response = await ac.get(
+                f"/users/{user_id}/info", headers={"If-None-Match": etag}
+            )
+            assert response.status_code == 304
+            assert response.headers["etag"] == etag
+
+
 @pytest.mark.asyncio
 async def test_get_username_by_id_not_found():
     """Test retrieving a non-existent user returns 404."""
@@ -99,3 +132,194 @@ async def test_delete_me_unauthorized():
         app.dependency_overrides.clear()  # Clear any overrides to simulate unauthenticated state
         response = await ac.delete("/users/me")
         assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_get_users_info_in_bulk():
+    """Test retrieving the info of several users at once, from the cache once loaded."""
+    first_id = "00000000-0000-0000-0000-000000000001"
+    second_id = "00000000-0000-0000-0000-000000000002"
+    unknown_id = "00000000-0000-0000-0000-000000000999"
+
+    async with app.router.lifespan_context(app):
+        await create_test_user(id=first_id, username="first")
+        await create_test_user(id=second_id, username="second", email="2@example.com")
+
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as ac:
+            ids = [second_id, unknown_id, first_id, second_id]
+            response = await ac.get("/users/info", params={"ids": ids})
+            assert response.status_code == 200
+            assert response.json() == [
+                {"id": second_id, "username": "second"},
+                {"id": first_id, "username": "first"},
+            ]
+
+            found, missing = user_directory.get_many([UUID(first_id), UUID(second_id)])
+            assert not missing and found[UUID(first_id)] == "first"
+
+
+@pytest.mark.asyncio
+async def test_get_users_info_loads_from_the_primary():
+    """Test that the usernames cached by the directory are never read from a replica."""
+    user_id = "00000000-0000-0000-0000-000000000001"
+
+    class LaggingReplica:
+        async def execute(self, statement):
+            raise AssertionError("A replica may return an outdated username")
+
+    async def override_read_session():
+        yield LaggingReplica()
+
+    async with app.router.lifespan_context(app):
+        await create_test_user(id=user_id, username="current")
+        app.dependency_overrides[get_read_session] = override_read_session
+
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as ac:
+            response = await ac.get("/users/info", params={"ids": [user_id]})
+            assert response.status_code == 200
+            assert response.json() == [{"id": user_id, "username": "current"}]
+
+
+@pytest.mark.asyncio
+async def test_get_users_info_sees_username_updates():
+    """Test that a username update drops the cached username."""
+    async with app.router.lifespan_context(app):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="https://test"
+        ) as ac:
+            response = await ac.post(
+                "/auth/register",
+                json={
+                    "email": "alice@example.com",
+                    "username": "before",
+                    "password": "s3cret-pw",
+                },
+            )
+            user_id = response.json()["id"]
+            await ac.post(
+                "/auth/login",
+                data={"username": "alice@example.com", "password": "s3cret-pw"},
+            )
+
+            response = await ac.get("/users/info", params={"ids": [user_id]})
+            assert response.json()[0]["username"] == "before"
+
+            response = await ac.patch("/users/me", json={"username": "after"})
+            assert response.status_code == 200
+
+            response = await ac.get("/users/info", params={"ids": [user_id]})
+            assert response.json()[0]["username"] == "after"
+
+
+@pytest.mark.asyncio
+async def test_get_users_info_too_many_ids():
+    """Test that requesting too many users at once is rejected."""
+    ids = [str(uuid4()) for _ in range(settings.user_info_max_ids + 1)]
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        response = await ac.get("/users/info", params={"ids": ids})
+
+    assert response.status_code == 400
+
+
+async def search_users(ac: AsyncClient, prefix: str) -> list[str]:
+    response = await ac.get("/users/search", params={"prefix": prefix})
+    assert response.status_code == 200
+    return [user["username"] for user in response.json()]
+
+
+@pytest.mark.asyncio
+async def test_search_users_from_the_index():
+    """Test that the username index answers searches and follows user changes."""
+    async with app.router.lifespan_context(app):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="https://test"
+        ) as ac:
+            for username in ("bob", "Alice", "albert", "alfred"):
+                response = await ac.post(
+                    "/auth/register",
+                    json={
+                        "email": f"{username}@example.com",
+                        "username": username,
+                        "password": "s3cret-pw",
+                    },
+                )
+            alfred_id = response.json()["id"]
+            assert username_index.loaded
+            assert await search_users(ac, "AL") == ["albert", "alfred", "Alice"]
+
+            await ac.post(
+                "/auth/login",
+                data={"username": "alfred@example.com", "password": "s3cret-pw"},
+            )
+            response = await ac.patch("/users/me", json={"username": "fred"})
+            assert response.status_code == 200
+            assert await search_users(ac, "al") == ["albert", "Alice"]
+            assert await search_users(ac, "fr") == ["fred"]
+
+            app.dependency_overrides[current_active_user] = lambda: get_test_user(
+                id=alfred_id, username="fred", email="alfred@example.com"
+            )
+            assert (await ac.delete("/users/me")).status_code == 204
+            assert await search_users(ac, "fr") == []
+
+
+@pytest.mark.asyncio
+async def test_search_users_from_the_database():
+    """Test that searches fall back to the database while the index is not loaded."""
+    await create_test_user(id="00000000-0000-0000-0000-000000000001", username="alice")
+    await create_test_user(
+        id="00000000-0000-0000-0000-000000000002",
+        username="Bob",
+        email="bob@example.com",
+    )
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        assert await search_users(ac, "al") == ["alice"]
+        # Like the index, the database search ignores case
+        assert await search_users(ac, "AL") == ["alice"]
+        assert await search_users(ac, "bo") == ["Bob"]
+        # Prefixes ending with the last code point have no successor
+        assert await search_users(ac, "a\U0010ffff") == []
+        assert await search_users(ac, "\U0010ffff") == []
+        assert await search_users(ac, "\ud7ff") == []
+
+
+@pytest.mark.asyncio
+async def test_search_users_from_the_database_by_code_point():
+    """Test that database searches order punctuation by code point, like the index."""
+    for i, username in enumerate(("a~z", "AZ", "ab", "A_c", "a.d", "a-b", "b")):
+        await create_test_user(
+            id=f"00000000-0000-0000-0000-00000000000{i}",
+            username=username,
+            email=f"user{i}@example.com",
+        )
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        expected = ["a-b", "a.d", "A_c", "ab", "AZ", "a~z"]
+        assert await search_users(ac, "A") == expected
+        assert await search_users(ac, "a-") == ["a-b"]
+        assert await search_users(ac, "a_") == ["A_c"]
+
+        # The index orders the usernames the same way
+        await username_index.load()
+        assert await search_users(ac, "A") == expected
+
+
+def test_username_search_keys_use_the_c_collation():
+    """Test that the search keys do not follow the collation of PostgreSQL."""
+    index = next(
+        i for i in User.__table__.indexes if i.name == "ix_user_username_lower"
+    )
+    query = select(User.id).where(username_search_key >= "a")
+
+    dialect = postgresql.dialect()
+    assert 'COLLATE "C"' in str(CreateIndex(index).compile(dialect=dialect))
+    assert 'COLLATE "C"' in str(query.compile(dialect=dialect))
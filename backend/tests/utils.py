@@ -1,5 +1,6 @@
 from io import BytesIO
 from typing import Optional
+from uuid import UUID
 
 from PIL import Image
 
@@ -44,6 +45,15 @@ async def create_test_user(
             await session.commit()
 
 
+async def rename_test_user(
+    username: str, id: str = "00000000-0000-0000-0000-000000000001"
+):
+    async for session in get_async_session():
+        user = await session.get(User, UUID(id))
+        user.username = username
+        await session.commit()
+
+
 async def create_test_post(
     user_id: str = "00000000-0000-0000-0000-000000000001",
     content: str = "Test post",